@@ -3,6 +3,10 @@
 # Copyright (c) 2018 Scriptim
 # This code is licensed under the MIT License, see LICENSE.md
 
+import collections.abc
+import random
+import types
+
 rows = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I']
 diagonals = ['1', '2', '3', '4', '5', '6', '7', '8', '9']
 
@@ -18,11 +22,423 @@ spaces = [
     'I5', 'I6', 'I7', 'I8', 'I9'
 ]
 
+# Sentinel of the index-based API for positions off the board. It is one past
+# the last valid index, so it can never be mistaken for a space.
+OFF_BOARD = len(spaces)
+
+# Maps the standard notation of a space to its index in ``spaces``.
+_space_indices = {space: index for index, space in enumerate(spaces)}
+
+
+def _build_neighbors():
+    """Compute the adjacency table of the board.
+
+    :return: a tuple holding for each space index a tuple of the indices of
+             its six neighbors, ordered by direction
+    :rtype: tuple[tuple[int]]
+    """
+
+    # (row delta, diagonal delta) for the directions 1 to 6
+    deltas = [(1, 1), (0, 1), (-1, 0), (-1, -1), (0, -1), (1, 0)]
+
+    table = []
+    for space in spaces:
+        row = rows.index(space[0])
+        diagonal = diagonals.index(space[1])
+        adjacent = []
+        for delta_row, delta_diagonal in deltas:
+            neighbor_row = row + delta_row
+            neighbor_diagonal = diagonal + delta_diagonal
+            if (0 <= neighbor_row < len(rows) and
+                    0 <= neighbor_diagonal < len(diagonals)):
+                adjacent.append(_space_indices.get(
+                    rows[neighbor_row] + diagonals[neighbor_diagonal],
+                    OFF_BOARD))
+            else:
+                adjacent.append(OFF_BOARD)
+        table.append(tuple(adjacent))
+
+    return tuple(table)
+
+
+# ``neighbors[index][direction - 1]`` is the index of the space adjacent to the
+# space ``index`` in ``direction`` or ``OFF_BOARD``. The table is built once at
+# import time, see :func:`neighbor_index`.
+neighbors = _build_neighbors()
+
+
+def _build_straight_lines():
+    """Enumerate all straight lines of one to three spaces.
+
+    :return: a dict mapping the sorted indices of the spaces of each line to
+             its entry, see ``straight_lines``
+    :rtype: dict[tuple[int], tuple]
+    """
+
+    table = {}
+    for index in range(len(spaces)):
+        table[(index,)] = (0, (False,) * 7, ((index,),) * 7)
+        for axis in [1, 2, 6]:
+            line = [index]
+            for length in [2, 3]:
+                next_space = neighbors[line[-1]][axis - 1]
+                if next_space == OFF_BOARD:
+                    break
+                line.append(next_space)
+
+                in_line = [False] * 7
+                ordered = [tuple(sorted(line))] * 7
+                # Moving in ``axis``, the last space is the head. Moving in the
+                # opposite direction, the first one is.
+                in_line[axis] = True
+                ordered[axis] = tuple(reversed(line))
+                in_line[axis % 6 + 3] = True
+                ordered[axis % 6 + 3] = tuple(line)
+                table[tuple(sorted(line))] = (axis, tuple(in_line),
+                                              tuple(ordered))
+
+    return table
+
+
+# ``straight_lines`` maps the sorted indices of the spaces of every straight
+# line of one to three spaces to a tuple ``(axis, in_line, ordered)``:
+#
+# - ``axis`` is the direction (1, 2 or 6) in which the line extends or 0 for a
+#   single space.
+# - ``in_line[direction]`` is whether moving the line in ``direction`` is an
+#   in-line move rather than a broadside move.
+# - ``ordered[direction]`` are the indices of the spaces, sorted from head to
+#   tail for in-line moves in ``direction``.
+#
+# There are only a few hundred lines, so the table is built once at import
+# time and is read-only.
+straight_lines = types.MappingProxyType(_build_straight_lines())
+
+
+def _build_centre_distances():
+    """Compute the distance of each space to the centre of the board (E5).
+
+    :return: the number of moves from each space to E5, indexed like
+             ``spaces``
+    :rtype: tuple[int]
+    """
+
+    centre = (rows.index('E'), diagonals.index('5'))
+    distances = []
+    for space in spaces:
+        delta_row = rows.index(space[0]) - centre[0]
+        delta_diagonal = diagonals.index(space[1]) - centre[1]
+        # Moving along direction 1 (or 4) changes row and diagonal at once.
+        if delta_row * delta_diagonal > 0:
+            distances.append(max(abs(delta_row), abs(delta_diagonal)))
+        else:
+            distances.append(abs(delta_row) + abs(delta_diagonal))
+
+    return tuple(distances)
+
+
+# ``centre_distances[index]`` is the number of moves from the space ``index``
+# to E5, from 0 for E5 to ``EDGE_DISTANCE`` for the edge of the board.
+centre_distances = _build_centre_distances()
+EDGE_DISTANCE = 4
+
+# ``_adjacent[index]`` are the indices of the neighbors of the space ``index``
+# that are on the board.
+_adjacent = tuple(tuple(index for index in adjacent if index != OFF_BOARD)
+                  for adjacent in neighbors)
+
+
+def _build_danger_lines():
+    """Find the lines along which a marble can be pushed off the board.
+
+    :return: for each space index a tuple of pairs of indices, see
+             ``_danger_lines``
+    :rtype: tuple[tuple[tuple(int, int)]]
+    """
+
+    table = []
+    for index in range(len(spaces)):
+        lines = []
+        for direction in range(1, 7):
+            if neighbors[index][direction - 1] != OFF_BOARD:
+                continue
+            # ``neighbors`` is indexed by direction - 1.
+            opposite = (direction + 2) % 6
+            first = neighbors[index][opposite]
+            if first == OFF_BOARD:
+                continue
+            second = neighbors[first][opposite]
+            if second != OFF_BOARD:
+                lines.append((first, second))
+        table.append(tuple(lines))
+
+    return tuple(table)
+
+
+# ``_danger_lines[index]`` holds a pair of spaces for each direction in which
+# the space ``index`` is at the edge of the board: the two spaces behind it,
+# seen from the edge. Two marbles of the opponent there can push a single
+# marble in ``index`` off the board.
+_danger_lines = _build_danger_lines()
+
+# ``_danger_watchers[index]`` are the spaces whose danger depends on the
+# contents of the space ``index``, including ``index`` itself.
+_danger_watchers = tuple(
+    tuple(watcher for watcher in range(len(spaces))
+          if any(watcher == index or index in line
+                 for line in _danger_lines[watcher]))
+    for index in range(len(spaces)))
+
+# Random keys for Zobrist hashing, see :attr:`Game.zobrist`.
+# ``_zobrist_keys[player][index]`` is the key of a marble of ``player`` (1/2)
+# in the space ``index``, the keys of empty spaces are 0. The generator is
+# seeded, so the keys and hence the hashes are the same in every process.
+_zobrist_random = random.Random(2018)
+_zobrist_keys = ((0,) * len(spaces),
+                 tuple(_zobrist_random.getrandbits(64) for space in spaces),
+                 tuple(_zobrist_random.getrandbits(64) for space in spaces))
+# ``_zobrist_players[player]`` is the key of the current player.
+_zobrist_players = (0, 0, _zobrist_random.getrandbits(64))
+
+
+def _hash_cells(cells):
+    """Compute the Zobrist hash of the cells of a game.
+
+    :param cells: the cells, indexed like ``spaces``
+    :type cells: bytearray
+    :return: the hash, not including the current player
+    :rtype: int
+    """
+
+    zobrist = 0
+    for index, player in enumerate(cells):
+        zobrist = zobrist ^ _zobrist_keys[player][index]
+
+    return zobrist
+
+
+def _build_initial_cells():
+    """Compute the cells of the `default initial position
+    <https://en.wikipedia.org/wiki/File:Abalone_standard.svg>`_.
+
+    :return: the player (1/2) to own each space or 0 if it is empty, indexed
+             like ``spaces``
+    :rtype: bytes
+    """
+
+    cells = bytearray(len(spaces))
+
+    for row in rows:
+        row_index = rows.index(row)
+
+        diagonals_for_row = (diagonals[0:5 + row_index] if
+                             row_index <= 4 else diagonals[row_index - 4:])
+
+        for diagonal in diagonals_for_row:
+            if (row in ['A', 'B'] or
+                    (row == 'C' and diagonal in ['3', '4', '5'])):
+                cells[_space_indices[row + diagonal]] = 1  # black
+            elif (row in ['H', 'I'] or
+                  (row == 'G' and diagonal in ['5', '6', '7'])):
+                cells[_space_indices[row + diagonal]] = 2  # white
+
+    return bytes(cells)
+
+
+# The initial position is computed once, so that creating a game only copies
+# it. Like the other tables above it is immutable and shared by all games.
+_initial_cells = _build_initial_cells()
+_initial_zobrist = _hash_cells(_initial_cells)
+
+# number of bits of a move packed by :func:`encode_move`
+_MOVE_BITS = 21
+
+
+class Board(collections.abc.MutableMapping):
+    """Dict-compatible view of the cells of a :class:`Game`.
+
+    The view maps the standard notation of a space to the player (1/2) to own
+    it or 0 if the space is empty, just like a plain dict would. Reads and
+    writes go straight through to the ``cells`` of the game, so no state is
+    duplicated.
+    """
+
+    __slots__ = ('game',)
+
+    def __init__(self, game):
+        """Initialize the view.
+
+        :param game: the game whose cells are viewed
+        :type game: Game
+        """
+
+        self.game = game
+
+    def __delitem__(self, space):
+        raise TypeError('Spaces cannot be removed from the board')
+
+    def __getitem__(self, space):
+        return self.game.cells[_space_indices[space]]
+
+    def __iter__(self):
+        return iter(spaces)
+
+    def __len__(self):
+        return len(spaces)
+
+    def __repr__(self):
+        return repr(self.copy())
+
+    def __setitem__(self, space, player):
+        game = self.game
+        index = _space_indices[space]
+        game._zobrist = (game._zobrist ^
+                         _zobrist_keys[game.cells[index]][index] ^
+                         _zobrist_keys[player][index])
+        if game.features is None:
+            game.cells[index] = player
+        else:
+            game.features.set(game.cells, index, player)
+
+    def copy(self):
+        """Make a snapshot of the board as a plain dict.
+
+        :return: a dict mapping each space to its current value
+        :rtype: dict[str, int]
+        """
+
+        return dict(zip(spaces, self.game.cells))
+
+
+class Features:
+    """Running sums of evaluation features of the cells of a :class:`Game`.
+
+    Each feature is a list indexed by player (1/2), index 0 being unused:
+
+    - ``material``: the number of marbles on the board
+    - ``centre``: the summed distance of the marbles to the centre, see
+      ``centre_distances``
+    - ``edge``: the number of marbles on the edge of the board
+    - ``cohesion``: the number of pairs of adjacent marbles
+    - ``danger``: the number of marbles on the edge with two marbles of the
+      opponent behind them, which could push them off the board
+
+    The sums are updated with :func:`set` whenever a cell changes, which only
+    looks at the cell and its surroundings, so reading them costs O(1).
+    """
+
+    __slots__ = ('material', 'centre', 'edge', 'cohesion', 'danger')
+
+    def __init__(self, cells):
+        """Compute the features of cells from scratch.
+
+        :param cells: the cells, indexed like ``spaces``
+        :type cells: bytearray
+        """
+
+        self.material = [0, 0, 0]
+        self.centre = [0, 0, 0]
+        self.edge = [0, 0, 0]
+        self.cohesion = [0, 0, 0]
+        self.danger = [0, 0, 0]
+
+        for index, player in enumerate(cells):
+            if player == 0:
+                continue
+            self.material[player] = self.material[player] + 1
+            self.centre[player] = (self.centre[player] +
+                                   centre_distances[index])
+            if centre_distances[index] == EDGE_DISTANCE:
+                self.edge[player] = self.edge[player] + 1
+            for adjacent in _adjacent[index]:
+                # Count each pair of adjacent marbles once.
+                if adjacent > index and cells[adjacent] == player:
+                    self.cohesion[player] = self.cohesion[player] + 1
+            if _in_danger(cells, index):
+                self.danger[player] = self.danger[player] + 1
+
+    def __eq__(self, other):
+        return (isinstance(other, Features) and
+                all(getattr(self, name) == getattr(other, name)
+                    for name in Features.__slots__))
+
+    def __repr__(self):
+        return 'Features(' + ', '.join(
+            f'{name}={getattr(self, name)[1:]}'
+            for name in Features.__slots__) + ')'
+
+    def copy(self):
+        """Make a clone of the features.
+
+        :return: the clone
+        :rtype: Features
+        """
+
+        features_copy = Features.__new__(Features)
+        for name in Features.__slots__:
+            setattr(features_copy, name, getattr(self, name)[:])
+
+        return features_copy
+
+    def set(self, cells, index, player):
+        """Change a cell and update the features accordingly.
+
+        :param cells: the cells the features are computed of
+        :type cells: bytearray
+        :param index: the index of the cell
+        :type index: int
+        :param player: the player (1/2) to own the cell or 0 if it becomes
+                       empty
+        :type player: int
+        """
+
+        # The danger of the watchers is recounted around the change.
+        danger = self.danger
+        watchers = _danger_watchers[index]
+        for watcher in watchers:
+            owner = cells[watcher]
+            if owner != 0:
+                for first, second in _danger_lines[watcher]:
+                    if cells[first] == cells[second] == 3 - owner:
+                        danger[owner] = danger[owner] - 1
+                        break
+
+        distance = centre_distances[index]
+        previous = cells[index]
+        if previous != 0:
+            self.material[previous] = self.material[previous] - 1
+            self.centre[previous] = self.centre[previous] - distance
+            if distance == EDGE_DISTANCE:
+                self.edge[previous] = self.edge[previous] - 1
+            for adjacent in _adjacent[index]:
+                if cells[adjacent] == previous:
+                    self.cohesion[previous] = self.cohesion[previous] - 1
+        cells[index] = player
+        if player != 0:
+            self.material[player] = self.material[player] + 1
+            self.centre[player] = self.centre[player] + distance
+            if distance == EDGE_DISTANCE:
+                self.edge[player] = self.edge[player] + 1
+            for adjacent in _adjacent[index]:
+                if cells[adjacent] == player:
+                    self.cohesion[player] = self.cohesion[player] + 1
+
+        for watcher in watchers:
+            owner = cells[watcher]
+            if owner != 0:
+                for first, second in _danger_lines[watcher]:
+                    if cells[first] == cells[second] == 3 - owner:
+                        danger[owner] = danger[owner] + 1
+                        break
+
 
 class Game:
     """Representation of an Abalone game.
     """
 
+    __slots__ = ('current_player', 'cells', 'score', 'features', '_journal',
+                 '_zobrist')
+
     def __init__(self):
         """Initialize the game.
         """
@@ -32,16 +448,28 @@ class Game:
         # represented by 1 and the opponent's marbles by -1.
         self.current_player = 1
 
-        # Maps a space of the board to the player (1/2) to own it or 0 if the
-        # space is empty. See the documentation for information on how the
-        # spaces are denoted.
-        self.board = {}
+        # Holds for each space (indexed like ``spaces``) the player (1/2) to
+        # own it or 0 if the space is empty. The ``board`` property provides a
+        # dict-like view on it.
+        self.cells = bytearray(len(spaces))
+
+        # Zobrist hash of the cells, maintained incrementally whenever a cell
+        # changes. See :attr:`zobrist`.
+        self._zobrist = 0
+
+        # Running sums of evaluation features of the cells, ``None`` unless
+        # enabled by :func:`track_features`.
+        self.features = None
 
         self.fill_board()
         # The score of a player decrements whenever a marble is pushed off the
         # board by the opponent.
         self.score = {'p1': 6, 'p2': 6}
 
+        # Collects the moved marbles and the owners of pushed off marbles
+        # while a move that returns an undo record is performed.
+        self._journal = None
+
     def broadside(self, marbles, direction):
         """Perform a broadside move.
 
@@ -60,7 +488,39 @@ class Game:
         """
 
         for marble in marbles:
-            self.move([marble], direction)
+            self._move_marble(space_to_index(marble), direction)
+
+    @property
+    def board(self):
+        """Maps a space of the board to the player (1/2) to own it or 0 if the
+        space is empty. See the documentation for information on how the
+        spaces are denoted.
+
+        Assigning a mapping replaces the contents of the whole board.
+
+        :rtype: Board
+        """
+
+        return Board(self)
+
+    @board.setter
+    def board(self, board):
+        for space in spaces:
+            self.cells[_space_indices[space]] = board[space]
+        self._zobrist = _hash_cells(self.cells)
+        if self.features is not None:
+            self.features = Features(self.cells)
+
+    def compute_zobrist(self):
+        """Compute the Zobrist hash of the position from scratch.
+
+        This is meant to verify the incrementally maintained :attr:`zobrist`.
+
+        :return: the hash
+        :rtype: int
+        """
+
+        return _hash_cells(self.cells) ^ _zobrist_players[self.current_player]
 
     def copy(self):
         """Make a clone of the current state of the game.
@@ -69,10 +529,16 @@ class Game:
         :rtype: Game
         """
 
-        game_copy = Game()
+        # Bypass __init__, as the initial position would be overwritten
+        # anyway.
+        game_copy = Game.__new__(Game)
         game_copy.current_player = self.current_player
-        game_copy.board = self.board.copy()
+        game_copy.cells = self.cells[:]
         game_copy.score = self.score.copy()
+        game_copy.features = (None if self.features is None else
+                              self.features.copy())
+        game_copy._journal = None
+        game_copy._zobrist = self._zobrist
 
         return game_copy
 
@@ -81,23 +547,10 @@ class Game:
         <https://en.wikipedia.org/wiki/File:Abalone_standard.svg>`_.
         """
 
-        global rows
-        global diagonals
-
-        for row in rows:
-            row_index = rows.index(row)
-
-            diagonals_for_row = (diagonals[0:5 + row_index] if
-                                 row_index <= 4 else diagonals[row_index - 4:])
-
-            for diagonal in diagonals_for_row:
-                self.board[row + diagonal] = 0  # empty
-                if (row in ['A', 'B'] or
-                        (row == 'C' and diagonal in ['3', '4', '5'])):
-                    self.board[row + diagonal] = 1  # black
-                elif (row in ['H', 'I'] or
-                      (row == 'G' and diagonal in ['5', '6', '7'])):
-                    self.board[row + diagonal] = 2  # white
+        self.cells[:] = _initial_cells
+        self._zobrist = _initial_zobrist
+        if self.features is not None:
+            self.features = Features(self.cells)
 
     def in_line(self, marbles, direction):
         """Perform an in-line move, sumito if applicable.
@@ -123,22 +576,31 @@ class Game:
         if the move cannot be made due to too few marbles
         """
 
-        head = from_head_to_tail(marbles, direction)[0]
+        cells = self.cells
+        opponent = 2 if self.current_player == 1 else 1
+
+        ordered = [space_to_index(marble)
+                   for marble in from_head_to_tail(marbles, direction)]
+        head = ordered[0]
+        destination = neighbor_index(head, direction)
 
         # destination: opponent -> sumito
         opponent_marbles = []
-        if self.is_opponent(neighbor(head, direction)):
-            opponent_head = neighbor(head, direction)
+        if destination != OFF_BOARD and cells[destination] == opponent:
+            opponent_head = destination
             opponent_marbles = [opponent_head]
             while True:
-                next_marble = neighbor(opponent_head, direction)
-                if self.is_opponent(next_marble):
+                next_marble = neighbor_index(opponent_head, direction)
+                if next_marble == OFF_BOARD:
+                    break
+                if cells[next_marble] == opponent:
                     opponent_head = next_marble
                     opponent_marbles.append(next_marble)
-                elif self.is_current_player(next_marble):
+                elif cells[next_marble] == self.current_player:
                     # The space after the opponent's line of marbles is already
                     # owned by the player, hence not empty.
-                    raise IllegalMoveException(f'{next_marble} is not empty')
+                    raise IllegalMoveException(f'{spaces[next_marble]} is not '
+                                               'empty')
                 else:
                     break
 
@@ -152,16 +614,16 @@ class Game:
         # marbles which must be moved last.
         opponent_marbles.reverse()
         for opponent_marble in opponent_marbles:
-            self.move([opponent_marble], direction)
+            self._move_marble(opponent_marble, direction)
 
         # destination: current player
-        if self.is_current_player(neighbor(head, direction)):
-            raise IllegalMoveException(f'{neighbor(head, direction)} is not '
-                                       'empty')
+        if (destination != OFF_BOARD and
+                cells[destination] == self.current_player):
+            raise IllegalMoveException(f'{spaces[destination]} is not empty')
 
         # destination: empty
-        for marble in from_head_to_tail(marbles, direction):
-            self.move([marble], direction)
+        for marble in ordered:
+            self._move_marble(marble, direction)
 
     def is_current_player(self, space):
         """Check if a space is owned by the current player.
@@ -174,7 +636,7 @@ class Game:
 
         if space == 0:
             return False
-        return self.board[parse_space(space)] == self.current_player
+        return self.cells[space_to_index(space)] == self.current_player
 
     def is_empty(self, space):
         """Check if a space is empty.
@@ -187,9 +649,58 @@ class Game:
 
         if space == 0:
             return False
-        empty = self.board[parse_space(space)] == 0
+        empty = self.cells[space_to_index(space)] == 0
         return empty
 
+    def _is_legal(self, line, axis, direction):
+        """Check if the current player can move a line of their marbles.
+
+        .. seealso:: :func:`legal_moves`
+
+        :param line: the indices of the marbles, ordered in ``axis``
+        :type line: tuple[int]
+        :param axis: the direction (``1``, ``2`` or ``6``) in which the line
+                     extends | ``0`` for a single marble
+        :type axis: int
+        :param direction: the direction of movement
+        :type direction: int
+        :return: whether the move is legal
+        :rtype: bool
+        """
+
+        cells = self.cells
+
+        for marble in line:
+            destination = neighbors[marble][direction - 1]
+            if destination == OFF_BOARD:
+                return False  # moving own marble off the board
+
+        # single and broadside: all destinations must be empty
+        if axis == 0 or direction != axis and direction != axis % 6 + 3:
+            for marble in line:
+                if cells[neighbors[marble][direction - 1]] != 0:
+                    return False
+            return True
+
+        # in-line
+        head = line[-1] if direction == axis else line[0]
+        destination = neighbors[head][direction - 1]
+        if cells[destination] == 0:
+            return True
+        if cells[destination] == self.current_player:
+            return False
+
+        # sumito
+        pushed = 1
+        next_marble = neighbors[destination][direction - 1]
+        while next_marble != OFF_BOARD and cells[next_marble] != 0:
+            if cells[next_marble] == self.current_player:
+                return False
+            pushed = pushed + 1
+            next_marble = neighbors[next_marble][direction - 1]
+
+        return pushed < len(line)
+
     def is_opponent(self, space):
         """Check if a space is owned by the opponent player.
 
@@ -201,11 +712,70 @@ class Game:
 
         if space == 0:
             return False
-        return (self.board[parse_space(space)] == 2 if
+        return (self.cells[space_to_index(space)] == 2 if
                 self.current_player == 1 else
-                self.board[parse_space(space)] == 1)
+                self.cells[space_to_index(space)] == 1)
+
+    def legal_moves(self, sumito_only=False):
+        """List all legal moves of the current player.
+
+        These are all single, in-line (including sumito) and broadside moves
+        that :func:`move` accepts, except for those that would move one of the
+        player's own marbles off the board. The moves are generated directly
+        from the cells, without copying the game or raising exceptions.
+
+        The order is canonical: lines are ordered by the index of their first
+        marble, then by length and by the direction (``1``, ``2``, ``6``) in
+        which they extend from that marble; the moves of each line are ordered
+        by direction.
+
+        :param sumito_only: whether to list only the in-line moves that push
+                            marbles of the opponent
+        :type sumito_only: bool
+        :return: the moves in the format returned by the players' ``turn``
+                 functions
+        :rtype: list[tuple(list[str], int)]
+        """
+
+        cells = self.cells
+        player = self.current_player
+        moves = []
+
+        for marble in range(len(spaces)):
+            if cells[marble] != player:
+                continue
+
+            lines = [((marble,), 0)]
+            for axis in [1, 2, 6]:
+                neighbor1 = neighbors[marble][axis - 1]
+                if neighbor1 == OFF_BOARD or cells[neighbor1] != player:
+                    continue
+                lines.append(((marble, neighbor1), axis))
+                neighbor2 = neighbors[neighbor1][axis - 1]
+                if neighbor2 != OFF_BOARD and cells[neighbor2] == player:
+                    lines.append(((marble, neighbor1, neighbor2), axis))
+
+            for line, axis in lines:
+                if not sumito_only:
+                    directions = range(1, 7)
+                elif axis != 0:
+                    directions = sorted([axis, axis % 6 + 3])
+                else:
+                    continue
+
+                for direction in directions:
+                    if sumito_only:
+                        head = line[-1] if direction == axis else line[0]
+                        front = neighbors[head][direction - 1]
+                        if front == OFF_BOARD or cells[front] in [0, player]:
+                            continue
+                    if self._is_legal(line, axis, direction):
+                        moves.append(([spaces[index] for index in line],
+                                      direction))
 
-    def move(self, marbles, direction):
+        return moves
+
+    def move(self, marbles, direction, undo=False):
         """Perform a move in a specific direction.
 
         :param marbles: the marbles to be moved
@@ -226,41 +796,101 @@ class Game:
         6. northwest
 
         :type direction: int
+        :param undo: whether to return an undo record for :func:`unmove`. If
+                     set, a move that fails leaves the game unchanged.
+        :type undo: bool
         :raises IllegalMoveException: Moving *n* marbles
 
         if the number of marbles is not between ``1`` and ``3`` (inclusive)
 
         :raises IllegalMoveException: Marbles are not in a straight line
         :raises IllegalMoveException: *space* is not empty
+        :return: ``None`` | the undo record if *undo* is set
+
+        The undo record is a tuple ``(player, direction, moved, pushed_off)``
+        of the current player, the direction, the indices of the spaces the
+        marbles were moved from (in the order in which they were moved) and
+        the owners of the marbles pushed off the board, each of which cost
+        its owner one point.
+
+        :rtype: None | tuple(int, int, tuple[int], tuple[int])
         """
 
         marbles = [parse_space(marble) for marble in marbles]
 
         if len(marbles) < 1 or len(marbles) > 3:
             raise IllegalMoveException(f'Moving {len(marbles)} marbles')
-        if not are_straight_line(marbles):
+        line = _find_line(marbles)
+        if line is None:
             raise IllegalMoveException(
                 f'Marbles {", ".join(marbles)} are not in a straight line')
+        if direction < 1 or direction > 6:
+            raise Exception(f'Invalid direction {direction}')
+        axis, in_line, ordered = line
+
+        if undo:
+            self._journal = ([], [])
+        try:
+            # single
+            if len(marbles) == 1:
+                self._move_marble(ordered[direction][0], direction)
+            elif in_line[direction]:
+                self.in_line(marbles, direction)
+            else:
+                self.broadside(marbles, direction)
+        except Exception:
+            if undo:
+                # Revert the marbles moved before the move turned out to be
+                # illegal.
+                self.unmove((self.current_player, direction,
+                             tuple(self._journal[0]), tuple(self._journal[1])))
+            raise
+        finally:
+            journal = self._journal
+            self._journal = None
+
+        if undo:
+            return (self.current_player, direction, tuple(journal[0]),
+                    tuple(journal[1]))
+
+    def _move_marble(self, marble, direction):
+        """Move a single marble to the adjacent space in a certain direction.
+
+        If there is no adjacent space, the marble is pushed off the board.
+
+        :param marble: the index of the marble to be moved
+        :type marble: int
+        :param direction: the direction of movement
+
+        .. seealso:: :func:`move` for information on the direction parameter
+
+        :type direction: int
+        :raises IllegalMoveException: *space* is not empty
+        """
 
-        # single
-        if len(marbles) == 1:
-            destination = neighbor(marbles[0], direction)
-            if destination == 0:
-                self.on_off_board(self.board[marbles[0]])
-            elif not self.is_empty(destination):
-                raise IllegalMoveException(f'{destination} is not empty')
+        cells = self.cells
+        features = self.features
+        keys = _zobrist_keys[cells[marble]]
+        destination = neighbors[marble][direction - 1]
+        if destination == OFF_BOARD:
+            self.on_off_board(cells[marble])
+            if self._journal is not None:
+                self._journal[1].append(cells[marble])
+        elif cells[destination] != 0:
+            raise IllegalMoveException(f'{spaces[destination]} is not empty')
+        else:
+            if features is None:
+                cells[destination] = cells[marble]
             else:
-                self.board[destination] = self.board[marbles[0]]
-            self.board[marbles[0]] = 0
-            return
-
-        same = same_row_and_diagonal(marbles)
-        if (same['row'] and direction in [1, 3, 4, 6] or
-            same['diagonal'] and direction in [1, 2, 4, 5] or
-                same['diagonal_r'] and direction in [2, 3, 5, 6]):
-            self.broadside(marbles, direction)
+                features.set(cells, destination, cells[marble])
+            self._zobrist = self._zobrist ^ keys[destination]
+        self._zobrist = self._zobrist ^ keys[marble]
+        if features is None:
+            cells[marble] = 0
         else:
-            self.in_line(marbles, direction)
+            features.set(cells, marble, 0)
+        if self._journal is not None:
+            self._journal[0].append(marble)
 
     def on_off_board(self, player):
         """Reduce the score of a player whose marble has been pushed off the
@@ -323,12 +953,96 @@ class Game:
 
         print(board_str)
 
+    def to_bytes(self):
+        """Serialize the state of the game compactly.
+
+        The 64 bytes are the 61 cells in the order of ``spaces``, the current
+        player and the scores of player 1 and 2.
+
+        .. seealso:: :func:`game_from_bytes`
+
+        :return: the serialized game
+        :rtype: bytes
+        """
+
+        return bytes(self.cells) + bytes([self.current_player,
+                                          self.score['p1'],
+                                          self.score['p2']])
+
     def toggle_player(self):
         """Switch ``current_player`` between ``1`` and ``2``.
         """
 
         self.current_player = 2 if self.current_player == 1 else 1
 
+    def track_features(self, enabled=True):
+        """Start or stop maintaining the :class:`Features` of the cells.
+
+        While enabled, ``features`` is updated whenever a cell changes,
+        including moves taken back by :func:`unmove`, which makes moves
+        somewhat slower.
+
+        :param enabled: whether to maintain the features
+        :type enabled: bool
+        """
+
+        self.features = Features(self.cells) if enabled else None
+
+    def unmove(self, record):
+        """Take back a move.
+
+        Restores the state of the game before the move exactly, including the
+        scores and the current player. Moves must be taken back in reverse
+        order.
+
+        :param record: the undo record returned by :func:`move`
+        :type record: tuple(int, int, tuple[int], tuple[int])
+        """
+
+        player, direction, moved, pushed_off = record
+        cells = self.cells
+        features = self.features
+
+        pushed_off_count = len(pushed_off)
+        for marble in reversed(moved):
+            destination = neighbors[marble][direction - 1]
+            if destination == OFF_BOARD:
+                pushed_off_count = pushed_off_count - 1
+                owner = pushed_off[pushed_off_count]
+                index = f'p{owner}'
+                self.score[index] = self.score[index] + 1
+            else:
+                owner = cells[destination]
+                if features is None:
+                    cells[destination] = 0
+                else:
+                    features.set(cells, destination, 0)
+                self._zobrist = (self._zobrist ^
+                                 _zobrist_keys[owner][destination])
+            if features is None:
+                cells[marble] = owner
+            else:
+                features.set(cells, marble, owner)
+            self._zobrist = self._zobrist ^ _zobrist_keys[owner][marble]
+
+        self.current_player = player
+
+    @property
+    def zobrist(self):
+        """64 bit Zobrist hash of the position, i. e. of the cells and the
+        current player.
+
+        The hash of the cells is updated incrementally whenever a marble is
+        moved, so reading it costs O(1). The scores are not part of the hash,
+        as they follow from the number of marbles on the board.
+
+        .. seealso:: :func:`compute_zobrist`
+
+        :rtype: int
+        """
+
+        return self._zobrist ^ _zobrist_players[self.current_player]
+
 
 class IllegalMoveException(Exception):
     """Custom Exception to be raised whenever a player performs an illegal
@@ -354,36 +1068,56 @@ def are_straight_line(spaces):
     if len(spaces) <= 1:
         return True
 
-    # Check for duplicates.
-    if len(set(spaces)) != len(spaces):
-        return False
+    return _find_line(spaces) is not None
 
-    same = same_row_and_diagonal(spaces)
-    if not same['row'] and not same['diagonal'] and not same['diagonal_r']:
-        return False
 
-    # The lexicographical sorting ensures that successive spaces in the list
-    # are closest to each other on the board.
-    spaces.sort()
-    for space in range(1, len(spaces)):
-        prev_row = spaces[space - 1][0]
-        row = spaces[space][0]
-        delta_row = abs(rows.index(prev_row) - rows.index(row))
-
-        prev_diagonal = spaces[space - 1][1]
-        diagonal = spaces[space][1]
-        delta_diagonal = (abs(diagonals.index(prev_diagonal) -
-                              diagonals.index(diagonal)))
-
-        # The distance (delta) to the previous space is exactly 1 if they are
-        # adjacent.
-        if (same['row'] and delta_diagonal != 1 or
-            same['diagonal'] and delta_row != 1 or
-                same['diagonal_r'] and (delta_diagonal != 1 or
-                                        delta_row != 1)):
-            return False
+def decode_move(code):
+    """Unpack a move packed by :func:`encode_move`.
+
+    :param code: the packed move
+    :type code: int
+    :raises Exception: Invalid move code
+    :return: the marbles and the direction of the move
+    :rtype: tuple(list[str], int)
+    """
+
+    direction = code & 7
+    if direction < 1 or direction > 6 or code >= 1 << _MOVE_BITS:
+        raise Exception(f'Invalid move code {code}')
+    marbles = []
+    for shift in range(3, _MOVE_BITS, 6):
+        index = (code >> shift) & 63
+        if index == 63:
+            break
+        marbles.append(spaces[index])
+
+    return marbles, direction
+
 
-    return True
+def encode_move(marbles, direction):
+    """Pack a move into an int of 21 bits.
+
+    The lowest 3 bits hold the direction, followed by 6 bits for the index of
+    each marble in the given order, where ``63`` marks an unused slot. Hence
+    ``0`` never is a valid code and may be used for "no move".
+
+    :param marbles: the one to three marbles to be moved
+    :type marbles: list[str]
+    :param direction: the direction of movement
+
+    .. seealso:: :func:`move` for information on the direction parameter
+
+    :type direction: int
+    :return: the packed move
+    :rtype: int
+    """
+
+    code = direction
+    for slot in range(3):
+        index = space_to_index(marbles[slot]) if slot < len(marbles) else 63
+        code = code | index << (3 + 6 * slot)
+
+    return code
 
 
 def from_head_to_tail(spaces, direction):
@@ -403,19 +1137,126 @@ def from_head_to_tail(spaces, direction):
     :rtype: list[str]
     """
 
-    if not are_straight_line(spaces):
+    line = _find_line(spaces)
+    if line is None:
         raise Exception(f'Marbles {", ".join(spaces)} '
                         'are not in a straight line')
-    same = same_row_and_diagonal(spaces)
-    if (same['row'] and direction in [1, 3, 4, 6] or
-        same['diagonal'] and direction in [1, 2, 4, 5] or
-            same['diagonal_r'] and direction in [2, 3, 5, 6]):
+    axis, in_line, ordered = line
+    if not in_line[direction]:
         raise Exception(f'Moving {", ".join(spaces)} in direction {direction} '
                         'is not an in-line move')
-    spaces.sort()
-    if direction in [1, 2, 6]:
-        spaces.reverse()
-    return spaces
+    return [index_to_space(index) for index in ordered[direction]]
+
+
+def _find_line(spaces):
+    """Look up a line of spaces in ``straight_lines``.
+
+    :param spaces: a list of spaces in any valid notation
+    :type spaces: list[str]
+    :return: the entry of the line | ``None`` if the spaces do not form a
+             straight line
+    :rtype: tuple | None
+    """
+
+    indices = []
+    for space in spaces:
+        index = _space_indices.get(parse_space(space))
+        if index is None:
+            return None
+        indices.append(index)
+    indices.sort()
+
+    return straight_lines.get(tuple(indices))
+
+
+def game_from_bytes(data):
+    """Create a game from the state serialized by :func:`Game.to_bytes`.
+
+    :param data: the serialized game
+    :type data: bytes
+    :raises ValueError: Invalid length
+    :return: the game
+    :rtype: Game
+    """
+
+    if len(data) != len(spaces) + 3:
+        raise ValueError(f'Invalid length {len(data)} '
+                         f'({len(spaces) + 3} expected)')
+
+    game = Game.__new__(Game)
+    game.cells = bytearray(data[:len(spaces)])
+    game.current_player = data[len(spaces)]
+    game.score = {'p1': data[len(spaces) + 1], 'p2': data[len(spaces) + 2]}
+    game.features = None
+    game._journal = None
+    game._zobrist = _hash_cells(game.cells)
+
+    return game
+
+
+def game_from_player_board(board):
+    """Create a game from a board as it is passed to the players.
+
+    The player the board was passed to, i. e. the player represented by
+    ``1``, becomes player 1 and the current player, the opponent (``-1``)
+    becomes player 2. The scores are not part of the board. They are derived
+    from the number of marbles of each player, assuming that both started
+    with the 14 marbles of the initial position.
+
+    :param board: a board as passed to the players' ``turn`` functions
+    :type board: dict[str, int]
+    :return: the game
+    :rtype: Game
+    """
+
+    game = Game()
+    game.board = {space: (1 if board[space] == 1 else
+                          (2 if board[space] == -1 else 0))
+                  for space in spaces}
+    for player in [1, 2]:
+        marbles = game.cells.count(player)
+        game.score[f'p{player}'] = max(0, min(6, marbles - 8))
+
+    return game
+
+
+def _in_danger(cells, index):
+    """Check if a marble could be pushed off the board by two marbles.
+
+    :param cells: the cells, indexed like ``spaces``
+    :type cells: bytearray
+    :param index: the index of the space
+    :type index: int
+    :return: whether there is a marble in the space and two marbles of the
+             opponent behind it along one of its ``_danger_lines``
+    :rtype: bool
+    """
+
+    owner = cells[index]
+    if owner == 0:
+        return False
+    opponent = 3 - owner
+    for first, second in _danger_lines[index]:
+        if cells[first] == opponent and cells[second] == opponent:
+            return True
+
+    return False
+
+
+def index_to_space(index):
+    """Convert the index of a space to the standard notation.
+
+    :param index: the index of a space in ``spaces`` or ``OFF_BOARD``
+    :type index: int
+    :return: the standard notation for the given space | ``0`` if the index is
+             ``OFF_BOARD``
+    :rtype: str | int
+    """
+
+    if index == OFF_BOARD:
+        return 0  # off the board
+
+    return spaces[index]
 
 
 def neighbor(space, direction):
@@ -438,34 +1279,39 @@ def neighbor(space, direction):
     :rtype: str | int
     """
 
-    space = parse_space(space)
-
-    row = rows.index(space[0])
-    diagonal = diagonals.index(space[1])
-
-    if direction == 1:
-        row = row + 1
-        diagonal = diagonal + 1
-    elif direction == 2:
-        diagonal = diagonal + 1
-    elif direction == 3:
-        row = row - 1
-    elif direction == 4:
-        row = row - 1
-        diagonal = diagonal - 1
-    elif direction == 5:
-        diagonal = diagonal - 1
-    elif direction == 6:
-        row = row + 1
-    else:
+    if direction < 1 or direction > 6:
         raise Exception(f'Invalid direction {direction}')
 
-    if (row < 0 or row >= len(rows) or
-        diagonal < 0 or diagonal >= len(diagonals) or
-            not f'{rows[row]}{diagonals[diagonal]}' in spaces):
-        return 0  # off the board
+    return index_to_space(neighbors[space_to_index(space)][direction - 1])
+
+
+def neighbor_index(index, direction):
+    """Get the index of the adjacent space in a certain direction.
+
+    This is the index-based counterpart of :func:`neighbor`. It only looks up
+    the precomputed ``neighbors`` table.
+
+    :param index: the index of the space from which the neighbour is
+                  determined
+    :type index: int
+    :param direction: the direction
 
-    return rows[row] + diagonals[diagonal]
+    .. seealso:: :func:`move` for information on the direction parameter
+
+    :type direction: int
+    :raises Exception: Invalid direction
+
+    if the direction is not between ``1`` and ``6`` (inclusive)
+
+    :return: the index of the neighbor space | ``OFF_BOARD`` if there is no
+             neighbor in the given direction
+    :rtype: int
+    """
+
+    if direction < 1 or direction > 6:
+        raise Exception(f'Invalid direction {direction}')
+
+    return neighbors[index][direction - 1]
 
 
 def parse_space(space):
@@ -550,3 +1396,31 @@ def same_row_and_diagonal(spaces):
         'diagonal': same_diagonal,
         'diagonal_r': same_diagonal_r
     }
+
+
+def space_to_index(space):
+    """Convert any valid space notation to the index of the space.
+
+    :param space: a space in any valid notation
+    :type space: str
+
+    .. seealso:: :func:`parse_space` for information on valid notations
+
+    :raises Exception: Space is not on the board
+    :return: the index of the given space in ``spaces`` | ``OFF_BOARD`` if
+             *space* is ``0``
+    :rtype: int
+    """
+
+    # Fast path for the standard notation.
+    index = _space_indices.get(space)
+    if index is not None:
+        return index
+
+    space = parse_space(space)
+    if space == 0:
+        return OFF_BOARD  # off the board
+    if space not in _space_indices:
+        raise Exception(f'Space {space} is not on the board')
+
+    return _space_indices[space]
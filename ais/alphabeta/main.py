@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2018 Scriptim
+# This code is licensed under the MIT License, see LICENSE.md
+
+
+import abalone
+import atexit
+import book
+import os
+import parallel
+import search
+import threading
+
+# The number of seconds to think about a move. It can be set with the
+# environment variable ABALONE_ALPHABETA_TIME.
+time_limit = float(os.environ.get('ABALONE_ALPHABETA_TIME', '5'))
+
+# The number of processes to search on. It can be set with the environment
+# variable ABALONE_ALPHABETA_WORKERS.
+workers = int(os.environ.get('ABALONE_ALPHABETA_WORKERS', '1'))
+
+# How to search on more than one process, see parallel.py: 'root' splits the
+# root moves among the processes, 'smp' lets all of them search the whole tree
+# with a shared transposition table. It can be set with the environment
+# variable ABALONE_ALPHABETA_PARALLEL.
+parallel_mode = os.environ.get('ABALONE_ALPHABETA_PARALLEL', 'root')
+
+if workers <= 1:
+    searcher = search.Searcher()
+elif parallel_mode == 'smp':
+    searcher = parallel.LazySMPSearcher(workers)
+else:
+    searcher = parallel.ParallelSearcher(workers)
+if workers > 1:
+    atexit.register(searcher.close)
+
+# An opening book (see book.py) whose moves are played without searching. Its
+# path can be set with the environment variable ABALONE_BOOK.
+opening_book = (book.Book(os.environ['ABALONE_BOOK'])
+                if os.environ.get('ABALONE_BOOK') else None)
+
+# Set by stop_ponder to end pondering and cleared by the next turn.
+ponder_cancel = threading.Event()
+
+
+def ponder(board):
+    """Search on the opponent's time.
+
+    The position after the own move is searched until :func:`stop_ponder` is
+    called. This fills the transposition table, so that the search of the
+    next turn finds most of the positions after the opponent's move in the
+    table and gets deeper in the same time.
+
+    Pondering is only supported by the search on a single process.
+
+    :param board: the current state of the board, the opponent to move
+    :type board: dict
+    """
+
+    if workers > 1 or ponder_cancel.is_set():
+        return
+
+    game = abalone.game_from_player_board(board)
+    game.toggle_player()
+    result = searcher.search(game, cancel=ponder_cancel)
+
+    print(f'alphabeta: pondered to depth {result["depth"]}, '
+          f'{result["nodes"]} nodes in {result["seconds"]:.2f} s')
+
+
+def stop_ponder():
+    """Stop pondering, see :func:`ponder`.
+    """
+
+    ponder_cancel.set()
+
+
+def turn(board, opponent_move):
+    """Search for the best move with an alpha-beta search.
+
+    :param board: the current state of the board
+    :type board: dict
+    :param opponent_move: the opponent's last move
+    :type opponent_move: tuple(list[str], int) | None
+    :return: the move to be performed
+    :rtype: tuple(list[str], int)
+    """
+
+    ponder_cancel.clear()
+
+    if opening_book is not None:
+        move = opening_book.choose(board)
+        if move is not None:
+            print('alphabeta: book move')
+            return move
+
+    game = abalone.game_from_player_board(board)
+    result = searcher.search(game, time_limit)
+
+    print(f'alphabeta: depth {result["depth"]}, score {result["score"]}, '
+          f'{result["nodes"]} nodes in {result["seconds"]:.2f} s '
+          f'({result["nps"]:.0f} nodes/s)' +
+          (f', {searcher.table.hits} table hits' if workers <= 1 else
+           f', {result["workers"]} workers'))
+
+    return result['move']
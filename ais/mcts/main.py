@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2018 Scriptim
+# This code is licensed under the MIT License, see LICENSE.md
+
+
+import abalone
+import mcts
+import os
+import random
+
+# The number of seconds to think about a move. It can be set with the
+# environment variable ABALONE_MCTS_TIME.
+time_limit = float(os.environ.get('ABALONE_MCTS_TIME', '5'))
+
+# The maximum number of playouts per move, 0 for no limit. It can be set with
+# the environment variable ABALONE_MCTS_PLAYOUTS.
+playouts = int(os.environ.get('ABALONE_MCTS_PLAYOUTS', '0'))
+
+tree = mcts.Tree()
+
+
+def turn(board, opponent_move):
+    """Search for the best move with a Monte Carlo tree search.
+
+    The tree is kept across the turns of a game. It is advanced by the own
+    move and by *opponent_move*, so that the playouts of the previous turn
+    are reused. If the board does not match the tree, e. g. because a new
+    game has started, a new tree is built.
+
+    :param board: the current state of the board
+    :type board: dict
+    :param opponent_move: the opponent's last move
+    :type opponent_move: tuple(list[str], int) | None
+    :return: the move to be performed
+    :rtype: tuple(list[str], int)
+    """
+
+    if opponent_move is not None:
+        try:
+            tree.advance(*opponent_move)
+        except Exception:
+            pass  # the tree does not belong to this game, see below
+
+    game = abalone.game_from_player_board(board)
+    result = tree.search(game, time_limit or None, playouts or None)
+
+    print(f'mcts: {result["playouts"]} playouts ({result["reused"]} reused) '
+          f'in {result["seconds"]:.2f} s, {result["nodes"]} nodes, '
+          f'win rate {result["win_rate"]:.2f}')
+
+    if result['move'] is None:
+        # The root has not been expanded, e. g. because of too few playouts
+        # or a full tree, and the tree is rebuilt on the next turn.
+        return random.choice(game.legal_moves())
+
+    tree.advance(*result['move'])
+
+    return result['move']
@@ -6,9 +6,6 @@
 
 import abalone
 import random
-import sys
-
-game = sys.modules['__main__'].game
 
 
 def turn(board, opponent_move):
@@ -21,32 +18,6 @@ def turn(board, opponent_move):
     :rtype: tuple(list[str], int)
     """
 
-    straight_lines = []
-    for space in abalone.spaces:
-        if board[space] == 1:
-            straight_lines.append([space])
-            for direction in [1, 2, 6]:
-                neighbor1 = abalone.neighbor(space, direction)
-                if neighbor1 in abalone.spaces and board[neighbor1] == 1:
-                    straight_lines.append([space, neighbor1])
-                    neighbor2 = abalone.neighbor(neighbor1, direction)
-                    if neighbor2 in abalone.spaces and board[neighbor2] == 1:
-                        straight_lines.append([space, neighbor1, neighbor2])
-
-    moves = []
-    for line in straight_lines:
-        for direction in range(1, 7):
-            off_board = False
-            for marble in line:
-                if abalone.neighbor(marble, direction) == 0:
-                    off_board = True
-                    break
-            if off_board:
-                continue
-            try:
-                game.copy().move(line, direction)
-                moves.append((line, direction))
-            except Exception:
-                pass
+    game = abalone.game_from_player_board(board)
 
-    return random.choice(moves)
+    return random.choice(game.legal_moves())
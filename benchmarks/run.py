@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2018 Scriptim
+# This code is licensed under the MIT License, see LICENSE.md
+
+"""Benchmarks of the engine's hot paths.
+
+Run from the repository root, e. g.
+
+::
+
+    python3 benchmarks/run.py -o before.json
+    python3 benchmarks/run.py -o after.json -c before.json
+
+All benchmarks work on position sets generated by seeded random play, so two
+runs with the same seed measure exactly the same work.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                '..')))
+
+import abalone  # noqa: E402
+import ais.random.main as random_ai  # noqa: E402
+
+
+def parse_args():
+    """Parse the command line arguments.
+
+    :return: parsed arguments
+    :rtype: argparse.Namespace
+    """
+
+    parser = argparse.ArgumentParser(description='Abalone BoAI benchmarks')
+    parser.add_argument('-o', '--output', dest='output', default=None,
+                        help='write the results to this JSON file')
+    parser.add_argument('-c', '--compare', dest='compare', default=None,
+                        help='compare the results to a previous JSON file')
+    parser.add_argument('-s', '--seed', dest='seed', type=int, default=2018,
+                        help='seed of the position sets')
+    parser.add_argument('-n', '--positions', dest='positions', type=int,
+                        default=200, help='number of positions per set')
+    parser.add_argument('-r', '--repeat', dest='repeat', type=int, default=5,
+                        help='number of repetitions of each benchmark')
+    parser.add_argument('-g', '--games', dest='games', type=int, default=3,
+                        help='number of self-play games')
+    parser.add_argument('-k', '--only', dest='only', default=None,
+                        help='only run benchmarks whose name contains this')
+
+    return parser.parse_args()
+
+
+def random_positions(seed, count):
+    """Generate positions by random play from the initial position.
+
+    A new game is started whenever a game ends.
+
+    :param seed: the seed of the random moves
+    :type seed: int
+    :param count: the number of positions
+    :type count: int
+    :return: the positions
+    :rtype: list[abalone.Game]
+    """
+
+    rng = random.Random(seed)
+    game = abalone.Game()
+    positions = []
+    while len(positions) < count:
+        moves = game.legal_moves()
+        if not moves or game.score['p1'] == 0 or game.score['p2'] == 0:
+            game = abalone.Game()
+            continue
+        marbles, direction = rng.choice(moves)
+        game.move(marbles, direction)
+        game.toggle_player()
+        positions.append(game.copy())
+
+    return positions
+
+
+def move_kind(game, marbles, direction):
+    """Classify a legal move.
+
+    :param game: the game the move is legal in
+    :type game: abalone.Game
+    :param marbles: the marbles to be moved
+    :type marbles: list[str]
+    :param direction: the direction of movement
+    :type direction: int
+    :return: ``'single'``, ``'in_line'``, ``'broadside'`` or ``'sumito'``
+    :rtype: str
+    """
+
+    if len(marbles) == 1:
+        return 'single'
+    if not abalone.are_straight_line(marbles):
+        raise Exception(f'{marbles} is not a line')
+    try:
+        head = abalone.from_head_to_tail(marbles, direction)[0]
+    except Exception:
+        return 'broadside'
+    if game.is_opponent(abalone.neighbor(head, direction)):
+        return 'sumito'
+    return 'in_line'
+
+
+def player_board(game):
+    """Make the board passed to the current player.
+
+    :param game: the game
+    :type game: abalone.Game
+    :return: the board with ``1`` for the player's marbles and ``-1`` for the
+             opponent's marbles
+    :rtype: dict[str, int]
+    """
+
+    board = {}
+    for space, player in game.board.items():
+        board[space] = (0 if player == 0 else
+                        (1 if player == game.current_player else -1))
+
+    return board
+
+
+def measure(function, repeat, setup=None):
+    """Time a function.
+
+    :param function: the function to be timed. It is passed the return value
+                     of *setup* if given and returns the number of operations
+                     it performed.
+    :type function: function
+    :param repeat: the number of repetitions
+    :type repeat: int
+    :param setup: a function called before each repetition, which is not
+                  timed
+    :type setup: function | None
+    :return: the result of the benchmark. ``best_us_per_op`` is ``None`` if
+             the function has not performed any operations.
+    :rtype: dict
+    """
+
+    times = []
+    operations = 0
+    for _ in range(repeat):
+        arguments = [setup()] if setup else []
+        start = time.perf_counter()
+        operations = function(*arguments)
+        times.append(time.perf_counter() - start)
+
+    return {
+        'operations': operations,
+        'repeat': repeat,
+        'best_seconds': min(times),
+        'median_seconds': statistics.median(times),
+        'best_us_per_op': (min(times) / operations * 1e6 if operations else
+                           None)
+    }
+
+
+def benchmarks(args):
+    """Set up the benchmarks.
+
+    :param args: the parsed command line arguments
+    :type args: argparse.Namespace
+    :return: the benchmark functions and their setup functions by name, see
+             :func:`measure`
+    :rtype: dict[str, tuple(function, function | None)]
+    """
+
+    positions = random_positions(args.seed, args.positions)
+    suite = {}
+
+    calls = [(space, direction) for space in abalone.spaces
+             for direction in range(1, 7)]
+
+    def bench_neighbor():
+        neighbor = abalone.neighbor
+        for space, direction in calls:
+            neighbor(space, direction)
+        return len(calls)
+    suite['neighbor'] = (bench_neighbor, None)
+
+    rng = random.Random(args.seed)
+    notations = []
+    for space in abalone.spaces:
+        notation = space if rng.random() < 0.5 else space[::-1]
+        notations.append(notation if rng.random() < 0.5 else
+                         notation.lower())
+
+    def bench_parse_space():
+        parse_space = abalone.parse_space
+        for notation in notations:
+            parse_space(notation)
+        return len(notations)
+    suite['parse_space'] = (bench_parse_space, None)
+
+    def bench_copy():
+        for game in positions:
+            game.copy()
+        return len(positions)
+    suite['game_copy'] = (bench_copy, None)
+
+    moves = {'single': [], 'in_line': [], 'broadside': [], 'sumito': []}
+    for game in positions:
+        for marbles, direction in game.legal_moves():
+            moves[move_kind(game, marbles, direction)].append(
+                (game, marbles, direction))
+    for kind in moves:
+        rng.shuffle(moves[kind])
+        moves[kind] = moves[kind][:args.positions]
+
+    def bench_move(cases):
+        for game, marbles, direction in cases:
+            game.move(marbles, direction)
+        return len(cases)
+
+    for kind, cases in moves.items():
+        # Each repetition moves fresh copies, the copies are not timed.
+        def setup(cases=cases):
+            return [(game.copy(), marbles, direction)
+                    for game, marbles, direction in cases]
+        suite[f'game_move_{kind}'] = (bench_move, setup)
+
+    boards = [player_board(game) for game in positions]
+
+    def bench_random_ai():
+        random.seed(args.seed)
+        for board in boards:
+            random_ai.turn(board, None)
+        return len(boards)
+    suite['random_ai_turn'] = (bench_random_ai, None)
+
+    def bench_self_play():
+        random.seed(args.seed)
+        plies = 0
+        for _ in range(args.games):
+            game = abalone.Game()
+            while game.score['p1'] > 0 and game.score['p2'] > 0:
+                marbles, direction = random_ai.turn(player_board(game), None)
+                game.move(marbles, direction)
+                game.toggle_player()
+                plies = plies + 1
+        return plies
+    suite['self_play_ply'] = (bench_self_play, None)
+
+    if args.only:
+        suite = {name: entry for name, entry in suite.items()
+                 if args.only in name}
+
+    return suite
+
+
+def run(args):
+    """Run the benchmarks.
+
+    :param args: the parsed command line arguments
+    :type args: argparse.Namespace
+    :return: the results, ready to be serialized as JSON
+    :rtype: dict
+    """
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'],
+                                capture_output=True, text=True,
+                                cwd=os.path.dirname(__file__)).stdout.strip()
+    except OSError:
+        commit = None
+
+    results = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(),
+            'commit': commit or None,
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'positions': args.positions
+        },
+        'results': {}
+    }
+
+    for name, (function, setup) in benchmarks(args).items():
+        result = measure(function, args.repeat, setup)
+        results['results'][name] = result
+        if result['best_us_per_op'] is None:
+            print(f'{name:24} {"-":>12} us/op (0 ops)')
+        else:
+            print(f'{name:24} {result["best_us_per_op"]:12.2f} us/op '
+                  f'({result["operations"]} ops)')
+
+    return results
+
+
+def compare(results, previous):
+    """Print the speedup of each benchmark relative to a previous run.
+
+    :param results: the results of this run
+    :type results: dict
+    :param previous: the results of the previous run
+    :type previous: dict
+    """
+
+    print()
+    print(f'compared to {previous["meta"].get("commit")} '
+          f'({previous["meta"].get("timestamp")})')
+    for name, result in results['results'].items():
+        if name not in previous['results']:
+            continue
+        before = previous['results'][name]['best_us_per_op']
+        after = result['best_us_per_op']
+        if before is None or after is None:
+            continue
+        print(f'{name:24} {before:12.2f} -> {after:12.2f} us/op '
+              f'({before / after:6.2f}x)')
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    results = run(args)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            compare(results, json.load(file))
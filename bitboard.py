@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2018 Scriptim
+# This code is licensed under the MIT License, see LICENSE.md
+
+"""Bitboard move engine.
+
+Each player's marbles are stored in a single Python int. The spaces are laid
+out row by row with a stride of 10 bits and a margin of one row and one
+column, so that every direction of movement is a constant shift::
+
+    bit(row, diagonal) = 10 * (row + 1) + diagonal + 1
+
+where ``row`` and ``diagonal`` are the zero based indices into
+:data:`abalone.rows` and :data:`abalone.diagonals`. The margin bits do not
+belong to the board, which makes it possible to tell a space one step off the
+board apart from the board itself.
+
+Moves are generated with whole-board shifts and masks instead of per-space
+lookups. The engine follows the same rules as :func:`abalone.Game.move` and
+the referee in ``main.py`` and produces the same moves as
+:func:`abalone.Game.legal_moves`, in the same order.
+"""
+
+import abalone
+
+# shift of the bit index per direction (index 0 is unused)
+_shifts = (0, 11, 1, -10, -11, -1, 10)
+
+# ``_bits[index]`` is the bit of the space ``abalone.spaces[index]``
+_bits = tuple(1 << (10 * (abalone.rows.index(space[0]) + 1) +
+                    abalone.diagonals.index(space[1]) + 1)
+              for space in abalone.spaces)
+
+# maps the position of a bit (``bit.bit_length() - 1``) to the index of the
+# space
+_indices = {bit.bit_length() - 1: index for index, bit in enumerate(_bits)}
+
+# all spaces on the board
+BOARD = sum(_bits)
+
+# all bits of the layout, i. e. the board and its margin
+_ALL = (1 << (BOARD.bit_length() + 11)) - 1
+
+# the directions of movement that are in-line for a line of marbles extending
+# in one of the axes 1, 2 and 6, see :func:`abalone.Game.legal_moves`
+_in_line = {1: (1, 4), 2: (2, 5), 6: (6, 3)}
+
+# position of a line in the canonical move order of a marble, keyed by
+# (axis, number of marbles)
+_line_order = {(0, 1): 0, (1, 2): 1, (1, 3): 2, (2, 2): 3, (2, 3): 4,
+               (6, 2): 5, (6, 3): 6}
+
+
+class Bitboard:
+    """Representation of an Abalone game by one bitboard per player.
+
+    The attributes ``current_player`` and ``score`` have the same meaning as
+    in :class:`abalone.Game`.
+    """
+
+    __slots__ = ('marbles', 'current_player', 'score')
+
+    def __init__(self):
+        """Initialize the game with the default initial position.
+        """
+
+        self.current_player = 1
+
+        # ``marbles[player]`` holds the bits of the marbles of player 1 and 2,
+        # ``marbles[0]`` is unused.
+        self.marbles = [0, 0, 0]
+        for index, player in enumerate(abalone.Game().cells):
+            if player != 0:
+                self.marbles[player] = self.marbles[player] | _bits[index]
+
+        self.score = {'p1': 6, 'p2': 6}
+
+    def copy(self):
+        """Make a clone of the current state of the game.
+
+        :return: the clone
+        :rtype: Bitboard
+        """
+
+        bitboard_copy = Bitboard.__new__(Bitboard)
+        bitboard_copy.marbles = self.marbles[:]
+        bitboard_copy.current_player = self.current_player
+        bitboard_copy.score = self.score.copy()
+
+        return bitboard_copy
+
+    def legal_moves(self):
+        """List all legal moves of the current player.
+
+        .. seealso:: :func:`abalone.Game.legal_moves` for the rules and the
+                     order of the moves
+
+        :return: the moves in the format returned by the players' ``turn``
+                 functions
+        :rtype: list[tuple(list[str], int)]
+        """
+
+        player = self.current_player
+        own = self.marbles[player]
+        opponent = self.marbles[3 - player]
+        empty = BOARD & ~(own | opponent)
+        # empty or off the board
+        free = _ALL & ~(own | opponent)
+
+        # ``movable[direction]`` are the spaces whose neighbor in
+        # ``direction`` is empty
+        movable = [0] + [_shift(empty, -_shifts[direction])
+                         for direction in range(1, 7)]
+
+        found = []  # (mask of tails, axis, number of marbles, direction)
+
+        for direction in range(1, 7):
+            found.append((own & movable[direction], 0, 1, direction))
+
+        for axis in [1, 2, 6]:
+            step = _shifts[axis]
+            pairs = own & _shift(own, -step)
+            triples = pairs & _shift(pairs, -step)
+            for length, tails in [(2, pairs), (3, triples)]:
+                for direction in range(1, 7):
+                    if direction in _in_line[axis]:
+                        found.append((_in_line_tails(
+                            tails, length, step, _shifts[direction], empty,
+                            opponent, free), axis, length, direction))
+                    else:
+                        mask = tails
+                        for marble in range(length):
+                            mask = mask & _shift(movable[direction],
+                                                 -marble * step)
+                        found.append((mask, axis, length, direction))
+
+        keyed = []
+        for tails, axis, length, direction in found:
+            order = _line_order[(axis, length)]
+            while tails:
+                tail = tails & -tails
+                tails = tails ^ tail
+                keyed.append((_indices[tail.bit_length() - 1], order, axis,
+                              length, direction))
+        keyed.sort()
+
+        moves = []
+        for marble, order, axis, length, direction in keyed:
+            line = [abalone.spaces[marble]]
+            for _ in range(1, length):
+                marble = abalone.neighbors[marble][axis - 1]
+                line.append(abalone.spaces[marble])
+            moves.append((line, direction))
+
+        return moves
+
+    def move(self, marbles, direction):
+        """Perform a move in a specific direction.
+
+        .. warning:: This function does not perform input validation. It is
+                     only intended for moves returned by
+                     :func:`legal_moves`.
+
+        :param marbles: the marbles to be moved
+        :type marbles: list[str]
+        :param direction: the direction of movement
+
+        .. seealso:: :func:`abalone.Game.move` for information on the
+                     direction parameter
+
+        :type direction: int
+        """
+
+        player = self.current_player
+        opponent = 3 - player
+        step = _shifts[direction]
+        line = 0
+        for marble in marbles:
+            line = line | _bits[abalone.space_to_index(marble)]
+
+        destinations = _shift(line, step)
+        if destinations & line == 0:
+            # single or broadside
+            self.marbles[player] = self.marbles[player] ^ line ^ destinations
+            return
+
+        # in-line: the marble at the tail moves to the space in front of the
+        # head, pushed opponent marbles do the same
+        tail = line & ~destinations
+        front = destinations & ~line
+        self.marbles[player] = self.marbles[player] ^ tail ^ front
+        if self.marbles[opponent] & front:
+            opponent_tail = front
+            while _shift(front, step) & self.marbles[opponent]:
+                front = _shift(front, step)
+            front = _shift(front, step)
+            self.marbles[opponent] = self.marbles[opponent] ^ opponent_tail
+            if front & BOARD:
+                self.marbles[opponent] = self.marbles[opponent] ^ front
+            else:
+                index = f'p{opponent}'
+                self.score[index] = self.score[index] - 1
+
+    def to_board(self):
+        """Convert the bitboards to a board dict.
+
+        :return: a dict like :attr:`abalone.Game.board`
+        :rtype: dict[str, int]
+        """
+
+        board = {}
+        for index, space in enumerate(abalone.spaces):
+            board[space] = (1 if self.marbles[1] & _bits[index] else
+                            (2 if self.marbles[2] & _bits[index] else 0))
+
+        return board
+
+    def to_game(self):
+        """Convert the bitboards to a :class:`abalone.Game`.
+
+        :return: the game
+        :rtype: abalone.Game
+        """
+
+        game = abalone.Game()
+        game.board = self.to_board()
+        game.current_player = self.current_player
+        game.score = self.score.copy()
+
+        return game
+
+    def toggle_player(self):
+        """Switch ``current_player`` between ``1`` and ``2``.
+        """
+
+        self.current_player = 2 if self.current_player == 1 else 1
+
+
+def from_board(board):
+    """Create bitboards from a board dict.
+
+    :param board: a board like :attr:`abalone.Game.board`
+    :type board: dict[str, int]
+    :return: the bitboards, with player 1 to move and the initial scores
+    :rtype: Bitboard
+    """
+
+    bitboard = Bitboard()
+    bitboard.marbles = [0, 0, 0]
+    for index, space in enumerate(abalone.spaces):
+        if board[space] != 0:
+            bitboard.marbles[board[space]] = (bitboard.marbles[board[space]] |
+                                              _bits[index])
+
+    return bitboard
+
+
+def from_game(game):
+    """Create bitboards from a :class:`abalone.Game`.
+
+    :param game: the game
+    :type game: abalone.Game
+    :return: the bitboards
+    :rtype: Bitboard
+    """
+
+    bitboard = from_board(game.board)
+    bitboard.current_player = game.current_player
+    bitboard.score = game.score.copy()
+
+    return bitboard
+
+
+def _in_line_tails(tails, length, step, direction_step, empty, opponent,
+                   free):
+    """Select the lines of marbles that can make an in-line move.
+
+    :param tails: the tails of the lines, i. e. the marble the lines extend
+                  from in the axis
+    :type tails: int
+    :param length: the number of marbles in each line
+    :type length: int
+    :param step: the shift of the axis
+    :type step: int
+    :param direction_step: the shift of the direction of movement, either
+                           ``step`` or ``-step``
+    :type direction_step: int
+    :param empty: the empty spaces
+    :type empty: int
+    :param opponent: the opponent's marbles
+    :type opponent: int
+    :param free: the empty spaces and the margin around the board
+    :type free: int
+    :return: the tails of the lines that can be moved
+    :rtype: int
+    """
+
+    # The head is the marble that moves first.
+    offset = (length - 1) * step if direction_step == step else 0
+    heads = _shift(tails, offset)
+
+    # destination: empty
+    movable = heads & _shift(empty, -direction_step)
+    # sumito 2 -> 1, 3 -> 1
+    movable = movable | (heads & _shift(opponent, -direction_step) &
+                         _shift(free, -2 * direction_step))
+    # sumito 3 -> 2
+    if length == 3:
+        movable = movable | (heads & _shift(opponent, -direction_step) &
+                             _shift(opponent, -2 * direction_step) &
+                             _shift(free, -3 * direction_step))
+
+    return _shift(movable, -offset)
+
+
+def _shift(bits, step):
+    """Shift bits by a number of positions.
+
+    :param bits: the bits
+    :type bits: int
+    :param step: the number of positions, negative for a right shift
+    :type step: int
+    :return: the shifted bits
+    :rtype: int
+    """
+
+    return bits << step if step >= 0 else bits >> -step
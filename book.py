@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2018 Scriptim
+# This code is licensed under the MIT License, see LICENSE.md
+
+"""Opening book.
+
+The book counts how often each move has been played in a position and how
+often the player who played it has won. Positions are identified by a 64 bit
+hash of their canonical key (:func:`symmetry.canonical`), so a move learned
+in one position also applies to its symmetric positions, and moves are
+stored in the frame of the canonical position.
+
+The book is built from the course-of-the-game records that ``main.py``
+writes to the ``results`` directory, from archives of game records written
+by ``tournament.py`` (see :mod:`record`) or from self-play, e. g.
+
+::
+
+    python3 book.py -o book.bin results/*.js
+    python3 book.py -o book.bin games.abr
+    python3 book.py -o book.bin --self-play 100 -1 alphabeta.main
+
+The file starts with a header of 16 bytes, the magic bytes ``ABBOOK01`` and
+the number of records, followed by records of 20 bytes::
+
+    position hash (8 bytes), move (4 bytes), games (4 bytes), wins (4 bytes)
+
+little-endian and sorted by position hash and move. The move is packed by
+:func:`abalone.encode_move` with the marbles sorted by index. A
+:class:`Book` maps the file into memory and finds a position by binary
+search, so there is nothing to load before the first lookup.
+"""
+
+import abalone
+import argparse
+import hashlib
+import importlib
+import json
+import main
+import mmap
+import random
+import record
+import struct
+import symmetry
+
+_MAGIC = b'ABBOOK01'
+_HEADER = struct.Struct('<8sQ')
+_RECORD = struct.Struct('<QIII')
+_KEY = struct.Struct('<Q')
+
+
+class Book:
+    """Read-only view of an opening book file.
+    """
+
+    def __init__(self, path):
+        """Map a book file into memory.
+
+        :param path: the path of the file
+        :type path: str
+        :raises ValueError: the file is not an opening book
+        """
+
+        with open(path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.records = _HEADER.unpack_from(self._map)
+        if (magic != _MAGIC or len(self._map) !=
+                _HEADER.size + self.records * _RECORD.size):
+            self._map.close()
+            raise ValueError(f'{path} is not an opening book')
+
+    def choose(self, board, min_games=1):
+        """Choose the most frequently played move of a position.
+
+        Moves played equally often are ordered by the number of wins.
+
+        :param board: see :func:`symmetry.canonical`
+        :type board: dict[str, int] | abalone.Game
+        :param min_games: the number of games the move must have been played
+                          in
+        :type min_games: int
+        :return: the move | ``None`` if the position is not in the book
+        :rtype: tuple(list[str], int) | None
+        """
+
+        moves = [entry for entry in self.lookup(board)
+                 if entry[1] >= min_games]
+        if not moves:
+            return None
+
+        return max(moves, key=lambda entry: (entry[1], entry[2]))[0]
+
+    def close(self):
+        """Unmap the file.
+        """
+
+        self._map.close()
+
+    def lookup(self, board):
+        """Find the moves of a position.
+
+        :param board: see :func:`symmetry.canonical`
+        :type board: dict[str, int] | abalone.Game
+        :return: the moves, each with the number of games it has been played
+                 in and the number of these games won by the player who
+                 played it
+        :rtype: list[tuple(tuple(list[str], int), int, int)]
+        """
+
+        key, transform = symmetry.canonical(board)
+        position = position_hash(key)
+
+        # Find the first record of the position.
+        low = 0
+        high = self.records
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < position:
+                low = middle + 1
+            else:
+                high = middle
+
+        moves = []
+        back = symmetry.inverse(transform)
+        while low < self.records and self._key(low) == position:
+            _, code, games, wins = _RECORD.unpack_from(
+                self._map, _HEADER.size + low * _RECORD.size)
+            moves.append((symmetry.transform_move(
+                *abalone.decode_move(code), back), games, wins))
+            low = low + 1
+
+        return moves
+
+    def _key(self, record):
+        """Read the position hash of a record.
+
+        :param record: the index of the record
+        :type record: int
+        :rtype: int
+        """
+
+        return _KEY.unpack_from(self._map,
+                                _HEADER.size + record * _RECORD.size)[0]
+
+
+class _RandomOpening:
+    """An AI that plays random moves at the start of a game and lets
+    another AI play the rest, see :func:`self_play`.
+    """
+
+    def __init__(self, ai, random_plies, rng, plies):
+        """Initialize the AI.
+
+        :param ai: the AI that plays after the random plies
+        :type ai: module
+        :param random_plies: the number of random plies of the game
+        :type random_plies: int
+        :param rng: the random number generator of the random plies
+        :type rng: random.Random
+        :param plies: the number of plies played so far, shared with the
+                      opponent
+        :type plies: list[int]
+        """
+
+        self.ai = ai
+        self.random_plies = random_plies
+        self.rng = rng
+        self.plies = plies
+
+    def new_game(self):
+        """Start a new game, see :func:`main.play_match`.
+        """
+
+        self.plies[0] = 0
+        if hasattr(self.ai, 'new_game'):
+            self.ai.new_game()
+
+    def turn(self, board, opponent_move):
+        """Play a random move or let the AI play.
+
+        :param board: the current state of the board
+        :type board: dict
+        :param opponent_move: the opponent's last move
+        :type opponent_move: tuple(list[str], int) | None
+        :return: the move to be performed
+        :rtype: tuple(list[str], int)
+        """
+
+        ply = self.plies[0]
+        self.plies[0] = ply + 1
+        if ply < self.random_plies:
+            game = abalone.game_from_player_board(board)
+            return self.rng.choice(game.legal_moves())
+
+        return self.ai.turn(board, opponent_move)
+
+
+def build(records, path, max_plies=20):
+    """Build an opening book from game records.
+
+    :param records: the courses of the games, see
+                    ``main.save_course_of_the_game_to_file``
+    :type records: iterable[dict]
+    :param path: the path of the book file to be written
+    :type path: str
+    :param max_plies: the number of plies of each game that are added
+    :type max_plies: int
+    :return: the number of positions and the number of records of the book
+    :rtype: tuple(int, int)
+    """
+
+    counts = {}  # (position hash, move) -> [games, wins]
+    for record in records:
+        game = abalone.Game()
+        if record.get('boardHistory'):
+            game.board = record['boardHistory'][0]
+        game.current_player = record['startPlayer']
+
+        for ply, move in enumerate(record['moveHistory'][:max_plies]):
+            move = _legal_move(game, move)
+            if move is None:
+                break  # an illegal move ended the game
+            marbles, direction = move
+            if ply < record.get('randomPlies', 0):
+                game.move(marbles, direction)
+                game.toggle_player()
+                continue
+
+            key, transform = symmetry.canonical(game)
+            marbles_canonical, direction_canonical = symmetry.transform_move(
+                marbles, direction, transform)
+            code = abalone.encode_move(
+                sorted(marbles_canonical, key=abalone.space_to_index),
+                direction_canonical)
+            entry = counts.setdefault((position_hash(key), code), [0, 0])
+            entry[0] = entry[0] + 1
+            if record.get('winner') == game.current_player:
+                entry[1] = entry[1] + 1
+
+            game.move(marbles, direction)
+            game.toggle_player()
+
+    with open(path, 'wb') as file:
+        file.write(_HEADER.pack(_MAGIC, len(counts)))
+        for (position, code), (games, wins) in sorted(counts.items()):
+            file.write(_RECORD.pack(position, code, games, wins))
+
+    return len({position for position, code in counts}), len(counts)
+
+
+def _legal_move(game, move):
+    """Check whether a move of a record is legal.
+
+    :param game: the game before the move
+    :type game: abalone.Game
+    :param move: the move as returned by an AI's ``turn`` function, which may
+                 be malformed or use any space notation
+    :type move: object
+    :return: the move in standard notation | ``None`` if it is not legal
+    :rtype: tuple(list[str], int) | None
+    """
+
+    try:
+        marbles, direction = move
+        marbles = [abalone.parse_space(marble) for marble in marbles]
+        if (sorted(marbles), direction) in [
+                (sorted(legal_marbles), legal_direction)
+                for legal_marbles, legal_direction in game.legal_moves()]:
+            return marbles, direction
+    except Exception:
+        pass  # a malformed move or an invalid space, see abalone.parse_space
+
+    return None
+
+
+def position_hash(key):
+    """Hash a canonical key to 64 bits.
+
+    :param key: a key returned by :func:`symmetry.canonical`
+    :type key: bytes
+    :rtype: int
+    """
+
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(),
+                          'little')
+
+
+def read_record(path):
+    """Read a course-of-the-game record written by ``main.py``.
+
+    :param path: the path of the ``.js`` file
+    :type path: str
+    :return: the course of the game
+    :rtype: dict
+    """
+
+    with open(path, encoding='utf-8') as file:
+        content = file.read()
+    start = content.index('{')
+    end = content.rindex('}') + 1
+
+    return json.loads(content[start:end])
+
+
+def self_play(p1, p2, games, random_plies=4, max_plies=400, seed=None):
+    """Play games between two AIs and record their courses.
+
+    The games are played by :func:`main.play_match`, so an AI that raises an
+    exception or makes an illegal move loses the game. The first plies of
+    each game are random, so that the games differ even between
+    deterministic AIs. They are not added to a book by :func:`build`.
+
+    :param p1: the AI that plays as player 1
+    :type p1: module
+    :param p2: the AI that plays as player 2
+    :type p2: module
+    :param games: the number of games
+    :type games: int
+    :param random_plies: the number of random plies at the start of a game
+    :type random_plies: int
+    :param max_plies: the number of plies after which a game is a draw
+    :type max_plies: int
+    :param seed: the seed of the random plies
+    :type seed: int | None
+    :return: the courses of the games as returned by
+             :func:`main.play_match`, with the additional key
+             ``randomPlies``, the number of random plies
+    :rtype: generator[dict]
+    """
+
+    rng = random.Random(seed)
+    plies = [0]
+    black = _RandomOpening(p1, random_plies, rng, plies)
+    # The same AI must be told about a new game only once.
+    white = (black if p1 is p2 else
+             _RandomOpening(p2, random_plies, rng, plies))
+    for _ in range(games):
+        course_of_the_game = main.play_match(black, white,
+                                             max_plies=max_plies)
+        course_of_the_game['randomPlies'] = random_plies
+        yield course_of_the_game
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build an opening book')
+    parser.add_argument('records', nargs='*',
+                        help='course-of-the-game files written by main.py '
+                        'or archives of game records (.abr)')
+    parser.add_argument('-o', '--output', dest='output', required=True,
+                        help='the book file to be written')
+    parser.add_argument('-p', '--plies', dest='plies', type=int, default=20,
+                        help='number of plies of each game to add')
+    parser.add_argument('--self-play', dest='self_play', type=int, default=0,
+                        help='number of self-play games to add')
+    parser.add_argument('-1', dest='p1', default='alphabeta.main',
+                        help='python module for player 1 of self-play')
+    parser.add_argument('-2', dest='p2', default=None,
+                        help='python module for player 2 of self-play '
+                        '(default: the same as player 1)')
+    parser.add_argument('-s', '--seed', dest='seed', type=int, default=None,
+                        help='seed of the random plies of self-play')
+    args = parser.parse_args()
+
+    def records():
+        for path in args.records:
+            if path.endswith('.abr'):
+                for game_record in record.read_archive(path):
+                    yield game_record.to_course()
+            else:
+                yield read_record(path)
+        if args.self_play:
+            p1 = importlib.import_module(f'ais.{args.p1}')
+            p2 = importlib.import_module(f'ais.{args.p2 or args.p1}')
+            yield from self_play(p1, p2, args.self_play, seed=args.seed)
+
+    positions, moves = build(records(), args.output, args.plies)
+    print(f'{positions} positions, {moves} moves')
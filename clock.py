@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2018 Scriptim
+# This code is licensed under the MIT License, see LICENSE.md
+
+"""Time controls of a game.
+
+A :class:`Clock` limits the time each player may think about a move, either
+by a fixed limit per move or by a budget for the whole game that grows by an
+increment after every move, or both, e. g.
+
+::
+
+    clock.Clock(move_time=5)  # 5 seconds per move
+    clock.Clock(base=300, increment=2)  # 5 minutes plus 2 seconds per move
+
+:func:`main.play_match` forfeits the game of a player who exceeds the
+limit.
+"""
+
+
+class Clock:
+    """The remaining thinking time of both players.
+    """
+
+    def __init__(self, move_time=None, base=None, increment=0.0):
+        """Initialize the time control.
+
+        :param move_time: the number of seconds per move | ``None`` for no
+                          limit per move
+        :type move_time: float | None
+        :param base: the number of seconds per game | ``None`` for no limit
+                     per game
+        :type base: float | None
+        :param increment: the number of seconds added to the time of a
+                          player per game after each of their moves
+        :type increment: float
+        """
+
+        self.move_time = move_time
+        self.base = base
+        self.increment = increment
+        # the remaining time of player 1 and 2 for the rest of the game
+        self.remaining = {}
+        self.reset()
+
+    def allowance(self, player):
+        """Get the time a player may think about the next move.
+
+        :param player: the player (``1`` or ``2``)
+        :type player: int
+        :return: the number of seconds | ``None`` if there is no limit
+        :rtype: float | None
+        """
+
+        if self.base is None:
+            return self.move_time
+        if self.move_time is None:
+            return max(0.0, self.remaining[player])
+
+        return max(0.0, min(self.move_time, self.remaining[player]))
+
+    def charge(self, player, seconds):
+        """Charge a player for the time spent on a move.
+
+        :param player: the player (``1`` or ``2``)
+        :type player: int
+        :param seconds: the time spent on the move
+        :type seconds: float
+        :return: whether the move has been made in time
+        :rtype: bool
+        """
+
+        allowance = self.allowance(player)
+        if self.base is not None:
+            self.remaining[player] = (self.remaining[player] - seconds +
+                                      self.increment)
+
+        return allowance is None or seconds <= allowance
+
+    def reset(self):
+        """Restore the time of both players for a new game.
+        """
+
+        self.remaining = {1: self.base, 2: self.base}
+
+
+class TimeLimitExceeded(TimeoutError):
+    """A player has exceeded the time limit.
+
+    Unlike any other ``TimeoutError``, which may be raised by the AI itself,
+    this is only raised by the referee.
+    """
+
+    pass
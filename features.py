@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2018 Scriptim
+# This code is licensed under the MIT License, see LICENSE.md
+
+"""Batched position encoding and evaluation with NumPy.
+
+Positions are encoded from the perspective of the player to move, just like
+the boards passed to the players: ``1`` for the player's own marbles, ``-1``
+for the opponent's marbles and ``0`` for empty spaces. The spaces are indexed
+like :data:`abalone.spaces`.
+
+All features are computed for a whole batch at once over precomputed index
+arrays, e. g.
+
+::
+
+    encoded = features.encode(games)
+    scores = features.evaluate(encoded)
+"""
+
+import abalone
+import numpy as np
+
+# names of the columns of :func:`features`
+FEATURE_NAMES = ('own_marbles', 'opponent_marbles',
+                 'own_centre_distance', 'opponent_centre_distance',
+                 'own_edge', 'opponent_edge',
+                 'own_cohesion', 'opponent_cohesion')
+
+# weights of :func:`evaluate`, in the order of ``FEATURE_NAMES``
+DEFAULT_WEIGHTS = np.array([100, -100, -2, 2, -3, 3, 1, -1],
+                           dtype=np.float32)
+
+# ``CENTRE_DISTANCE[index]`` is the distance of a space to E5, from 0 to 4,
+# see :data:`abalone.centre_distances`
+CENTRE_DISTANCE = np.array(abalone.centre_distances, dtype=np.int8)
+
+# the 24 spaces of the outermost ring
+EDGE = np.flatnonzero(CENTRE_DISTANCE == abalone.EDGE_DISTANCE)
+
+# ``NEIGHBORS[index, direction - 1]`` is :data:`abalone.neighbors` as an
+# array. ``abalone.OFF_BOARD`` points to an extra column that is always empty.
+NEIGHBORS = np.array(abalone.neighbors, dtype=np.intp)
+
+
+def encode(positions):
+    """Encode positions as an array.
+
+    :param positions: games or boards as passed to the players' ``turn``
+                      functions
+    :type positions: list[abalone.Game | dict[str, int]]
+    :return: an ``(N, 61)`` array, see the module documentation for the
+             values
+    :rtype: numpy.ndarray
+    """
+
+    encoded = np.zeros((len(positions), len(abalone.spaces)), dtype=np.int8)
+    games = [index for index, position in enumerate(positions)
+             if isinstance(position, abalone.Game)]
+    boards = [index for index, position in enumerate(positions)
+              if not isinstance(position, abalone.Game)]
+
+    if games:
+        cells = np.frombuffer(b''.join(bytes(positions[index].cells)
+                                       for index in games),
+                              dtype=np.int8).reshape(len(games), -1)
+        players = np.array([positions[index].current_player
+                            for index in games], dtype=np.int8)[:, None]
+        encoded[games] = np.where(cells == players, 1,
+                                  np.where(cells == 0, 0, -1))
+
+    if boards:
+        encoded[boards] = np.array([[positions[index][space]
+                                     for space in abalone.spaces]
+                                    for index in boards], dtype=np.int8)
+
+    return encoded
+
+
+def evaluate(encoded, weights=DEFAULT_WEIGHTS):
+    """Evaluate positions with a linear function of their features.
+
+    :param encoded: positions as returned by :func:`encode`
+    :type encoded: numpy.ndarray
+    :param weights: one weight per column of :func:`features`
+    :type weights: numpy.ndarray
+    :return: the score of each position for the player to move, higher is
+             better
+    :rtype: numpy.ndarray
+    """
+
+    return features(encoded) @ np.asarray(weights, dtype=np.float32)
+
+
+def features(encoded):
+    """Compute the features of positions.
+
+    For both the player to move and the opponent there is the number of
+    marbles, the summed distance of the marbles to the centre, the number of
+    marbles on the edge of the board and the cohesion, i. e. the number of
+    ordered pairs of adjacent marbles of the same player.
+
+    :param encoded: positions as returned by :func:`encode`
+    :type encoded: numpy.ndarray
+    :return: an ``(N, 8)`` array whose columns are named by
+             ``FEATURE_NAMES``
+    :rtype: numpy.ndarray
+    """
+
+    own, opponent = planes(encoded)[:2]
+
+    # Append an empty column for the neighbors off the board.
+    padding = np.zeros((len(encoded), 1), dtype=own.dtype)
+    own_neighbors = np.concatenate([own, padding], axis=1)[:, NEIGHBORS]
+    opponent_neighbors = np.concatenate([opponent, padding],
+                                        axis=1)[:, NEIGHBORS]
+
+    columns = [
+        own.sum(axis=1),
+        opponent.sum(axis=1),
+        own @ CENTRE_DISTANCE.astype(np.int32),
+        opponent @ CENTRE_DISTANCE.astype(np.int32),
+        own[:, EDGE].sum(axis=1),
+        opponent[:, EDGE].sum(axis=1),
+        (own_neighbors.sum(axis=2) * own).sum(axis=1),
+        (opponent_neighbors.sum(axis=2) * opponent).sum(axis=1)
+    ]
+
+    return np.stack(columns, axis=1).astype(np.float32)
+
+
+def planes(encoded):
+    """Split positions into one plane per kind of space.
+
+    :param encoded: positions as returned by :func:`encode`
+    :type encoded: numpy.ndarray
+    :return: a ``(3, N, 61)`` array of the player's own marbles, the
+             opponent's marbles and the empty spaces, each ``0`` or ``1``
+    :rtype: numpy.ndarray
+    """
+
+    return np.stack([encoded == 1, encoded == -1,
+                     encoded == 0]).astype(np.int32)
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2018 Scriptim
+# This code is licensed under the MIT License, see LICENSE.md
+
+"""Isolated execution of AIs.
+
+An :class:`IsolatedAI` runs an AI in a host subprocess, so that the referee
+can stop an AI that exceeds its time limit and an AI that allocates a lot of
+memory does not bloat the referee. It has the same functions as an AI, with
+an additional timeout for ``turn``, e. g.
+
+::
+
+    ai = isolation.IsolatedAI('alphabeta.main', memory_limit=2 ** 30)
+    ai.new_game()
+    move = ai.turn(board, opponent_move, timeout=5)
+    ai.close()
+
+The host is started on the first request and serves any number of games, so
+the AI's module, its tables and its caches stay warm from game to game. If
+the AI exceeds the timeout, the host is killed. A host that has been killed
+or has died, e. g. by exceeding the memory limit, is replaced by a new one
+on the next request.
+
+The referee and the host talk over a pipe. Each message is framed by its
+length as a 4 byte big-endian integer (see
+:func:`multiprocessing.connection.Connection.send_bytes`) and starts with a
+byte that denotes its kind:
+
+- ``N`` + optional 8 byte seed: a new game starts. The ``random`` module is
+  seeded if a seed is given and the AI's optional ``new_game`` function is
+  called.
+- ``T`` + 61 cells + 4 byte move: the AI's turn. The cells are indexed like
+  ``abalone.spaces`` and hold ``0`` for empty spaces, ``1`` for the AI's
+  marbles and ``2`` for the opponent's marbles. The opponent's last move is
+  packed by :func:`abalone.encode_move`, ``0`` meaning none.
+- ``P`` + 61 cells: the AI may ponder on the position, the opponent to move.
+- ``S``: the AI stops pondering.
+- ``Q``: the host quits.
+
+Only ``T`` is answered, by one of
+
+- ``M`` + 4 byte move: the AI's move, packed by :func:`abalone.encode_move`
+- ``I`` + message: the AI's move is illegal
+- ``E`` + traceback: the AI has raised an exception
+
+All integers are big-endian.
+"""
+
+import abalone
+import clock
+import importlib
+import multiprocessing
+import random
+import struct
+import threading
+import traceback
+
+_MOVE = struct.Struct('>I')
+_SEED = struct.Struct('>q')
+
+# ``_CELLS[owner]`` is the byte of a space of the board passed to a player
+# (``0``, ``1`` or ``-1``)
+_CELLS = {0: 0, 1: 1, -1: 2}
+_OWNERS = (0, 1, -1)
+
+
+class IsolatedAI:
+    """An AI that runs in a host subprocess.
+    """
+
+    def __init__(self, name, memory_limit=None):
+        """Initialize the AI without starting the host yet.
+
+        :param name: the name of the AI's module inside ``ais``, e. g.
+                     ``alphabeta.main``
+        :type name: str
+        :param memory_limit: the maximum size of the address space of the
+                             host in bytes | ``None`` for no limit. Only
+                             supported on Unix.
+        :type memory_limit: int | None
+        """
+
+        self.name = name
+        self.memory_limit = memory_limit
+        self._process = None
+        self._connection = None
+
+    def close(self):
+        """Stop the host.
+        """
+
+        if self._process is None:
+            return
+
+        try:
+            self._connection.send_bytes(b'Q')
+        except OSError:
+            pass
+        self._process.join(1)
+        if self._process.is_alive():
+            self._process.kill()
+            self._process.join()
+        self._connection.close()
+        self._process = None
+        self._connection = None
+
+    def _kill(self):
+        """Kill the host, e. g. because it does not answer.
+        """
+
+        self._process.kill()
+        self._process.join()
+        self._connection.close()
+        self._process = None
+        self._connection = None
+
+    def new_game(self, seed=None):
+        """Tell the AI that a new game starts.
+
+        :param seed: the seed of the ``random`` module of the host, see
+                     :func:`main.play_match` | ``None`` to leave it as it is
+        :type seed: int | None
+        """
+
+        self._send(b'N' + (b'' if seed is None else _SEED.pack(seed)))
+
+    def ponder(self, board):
+        """Let the AI think on the opponent's time.
+
+        The AI ponders in the host, so this returns at once.
+
+        :param board: the current state of the board, the opponent to move
+        :type board: dict
+        """
+
+        self._send(b'P' + _encode_board(board))
+
+    def _send(self, message):
+        """Send a message to the host, starting it if necessary.
+
+        A host that has died, e. g. because it has exceeded the memory limit
+        while pondering, is replaced by a new one.
+
+        :param message: the message
+        :type message: bytes
+        """
+
+        if self._process is not None and not self._process.is_alive():
+            self._kill()
+        if self._process is None:
+            self._start()
+        try:
+            self._connection.send_bytes(message)
+        except OSError:
+            # The host has died after the check.
+            self._kill()
+            self._start()
+            self._connection.send_bytes(message)
+
+    def _start(self):
+        """Start the host.
+        """
+
+        self._connection, child = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(
+            target=serve, args=(self.name, child, self.memory_limit),
+            daemon=True)
+        self._process.start()
+        child.close()
+
+    def stop_ponder(self):
+        """Stop pondering, see :func:`ponder`.
+        """
+
+        # A host that has died does not ponder anymore.
+        if self._process is not None and self._process.is_alive():
+            self._send(b'S')
+
+    def turn(self, board, opponent_move, timeout=None):
+        """Let the AI choose a move.
+
+        :param board: the current state of the board
+        :type board: dict
+        :param opponent_move: the opponent's last move
+        :type opponent_move: tuple(list[str], int) | None
+        :param timeout: the number of seconds to wait for the move | ``None``
+                        to wait as long as it takes
+        :type timeout: float | None
+        :raises clock.TimeLimitExceeded: the AI has not answered in time
+        :raises IllegalMoveException: the AI's move is illegal
+        :raises RuntimeError: the AI has raised an exception or its host has
+                              died
+        :return: the move to be performed
+        :rtype: tuple(list[str], int)
+        """
+
+        code = (0 if opponent_move is None else
+                abalone.encode_move(*opponent_move))
+        self._send(b'T' + _encode_board(board) + _MOVE.pack(code))
+        if not self._connection.poll(timeout):
+            self._kill()
+            raise clock.TimeLimitExceeded(f'{self.name} has not moved within '
+                                          f'{timeout} seconds')
+        try:
+            answer = self._connection.recv_bytes()
+        except EOFError:
+            exit_code = self._process.exitcode
+            self._kill()
+            raise RuntimeError(f'{self.name} has died (exit code '
+                               f'{exit_code})')
+
+        kind, payload = answer[:1], answer[1:]
+        if kind == b'I':
+            raise abalone.IllegalMoveException(payload.decode())
+        if kind == b'E':
+            raise RuntimeError(f'{self.name} raised an exception:\n'
+                               f'{payload.decode()}')
+
+        return abalone.decode_move(_MOVE.unpack(payload)[0])
+
+
+def _decode_board(cells):
+    """Decode a board sent by :func:`_encode_board`.
+
+    :param cells: the cells
+    :type cells: bytes
+    :return: the board
+    :rtype: dict[str, int]
+    """
+
+    return {space: _OWNERS[cell] for space, cell in zip(abalone.spaces,
+                                                        cells)}
+
+
+def _encode_board(board):
+    """Encode a board as it is passed to the players.
+
+    :param board: the board
+    :type board: dict[str, int]
+    :return: one byte per space
+    :rtype: bytes
+    """
+
+    return bytes(_CELLS[board[space]] for space in abalone.spaces)
+
+
+def _encode_move(move):
+    """Encode the move of an AI as the answer to a ``T`` message.
+
+    :param move: the move returned by the AI's ``turn`` function
+    :type move: tuple(list[str], int)
+    :return: the answer
+    :rtype: bytes
+    """
+
+    marbles, direction = move
+    # Moves that cannot be packed are answered like :func:`abalone.Game.move`
+    # would react to them.
+    if len(marbles) < 1 or len(marbles) > 3:
+        return b'I' + f'Moving {len(marbles)} marbles'.encode()
+    if direction not in range(1, 7):
+        raise Exception(f'Invalid direction {direction}')
+
+    return b'M' + _MOVE.pack(abalone.encode_move(marbles, direction))
+
+
+def serve(name, connection, memory_limit=None):
+    """Serve an AI in the host process until it is asked to quit.
+
+    See the module documentation for the messages.
+
+    :param name: the name of the AI's module inside ``ais``
+    :type name: str
+    :param connection: the host's end of the pipe
+    :type connection: multiprocessing.connection.Connection
+    :param memory_limit: the maximum size of the address space in bytes |
+                         ``None``
+    :type memory_limit: int | None
+    """
+
+    if memory_limit is not None:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+    ai = None
+    pondering = None
+    while True:
+        try:
+            message = connection.recv_bytes()
+        except EOFError:
+            break
+        kind, payload = message[:1], message[1:]
+
+        if pondering is not None and kind != b'P':
+            ai.stop_ponder()
+            pondering.join()
+            pondering = None
+        if kind == b'Q':
+            break
+
+        try:
+            if ai is None:
+                ai = importlib.import_module(f'ais.{name}')
+            if kind == b'N':
+                if payload:
+                    random.seed(_SEED.unpack(payload)[0])
+                if hasattr(ai, 'new_game'):
+                    ai.new_game()
+            elif kind == b'P':
+                if (pondering is None and hasattr(ai, 'ponder') and
+                        hasattr(ai, 'stop_ponder')):
+                    pondering = threading.Thread(
+                        target=ai.ponder, args=(_decode_board(payload),),
+                        daemon=True)
+                    pondering.start()
+            elif kind == b'T':
+                code = _MOVE.unpack(payload[len(abalone.spaces):])[0]
+                connection.send_bytes(_encode_move(ai.turn(
+                    _decode_board(payload[:len(abalone.spaces)]),
+                    abalone.decode_move(code) if code else None)))
+        except Exception:
+            if kind == b'T':
+                connection.send_bytes(b'E' + traceback.format_exc().encode())
+            else:
+                traceback.print_exc()
+
+    connection.close()
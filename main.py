@@ -5,17 +5,76 @@
 
 import argparse
 import abalone
+import clock
 import importlib
+import isolation
 import json
 import os
 import random
+import record
 import sys
+import threading
+import time
 import traceback
 import urllib.parse
 
 
 game = abalone.Game()
 
+# the number of seconds an AI may take to stop pondering, see
+# :func:`stop_pondering`
+PONDER_STOP_TIME = 1.0
+
+
+def add_time_control_args(parser):
+    """Add the command line arguments of time controls and isolation.
+
+    :param parser: the parser
+    :type parser: argparse.ArgumentParser
+    """
+
+    parser.add_argument('-t', '--move-time', dest='move_time', type=float,
+                        default=None,
+                        help='number of seconds per move, the player who '
+                        'exceeds it loses')
+    parser.add_argument('--clock', dest='clock', type=float, default=None,
+                        help='number of seconds per game, the player who '
+                        'exceeds it loses')
+    parser.add_argument('--increment', dest='increment', type=float,
+                        default=0.0,
+                        help='number of seconds added to the clock after '
+                        'each move')
+    parser.add_argument('-i', '--isolate', dest='isolate',
+                        action='store_true',
+                        help='run the AIs in subprocesses, which are stopped '
+                        'when they exceed the time limit')
+    parser.add_argument('--memory-limit', dest='memory_limit', type=int,
+                        default=None,
+                        help='number of megabytes each isolated AI may use')
+
+
+def board_for_player(game, player):
+    """Get the board of a game as it is passed to a player.
+
+    :param game: the game
+    :type game: abalone.Game
+    :param player: the player (``1`` or ``2``)
+    :type player: int
+    :return: the board, in which ``1`` stands for the player and ``-1`` for
+             the opponent
+    :rtype: dict[str, int]
+    """
+
+    player_board = {}
+    for space in game.board:
+        owner = game.board[space]
+        if owner == 0:
+            player_board[space] = 0
+        else:
+            player_board[space] = 1 if owner == player else -1
+
+    return player_board
+
 
 def parse_args():
     """Parse the command line arguments.
@@ -36,6 +95,10 @@ def parse_args():
                         help='verbose output')
     parser.add_argument('-r', '--random', dest='random', action='store_true',
                         help='start with random player')
+    parser.add_argument('-p', '--ponder', dest='ponder', action='store_true',
+                        help='let AIs that support it think on the '
+                        'opponent\'s time')
+    add_time_control_args(parser)
 
     sys.argv = vars(parser.parse_args())
 
@@ -50,126 +113,242 @@ def init_game():
         game.toggle_player()
 
 
-def run_game(p1, p2):
-    """The main game loop.
+def play_match(p1, p2, seed=None, start_player=1, max_plies=None,
+               display=False, verbose=False, ponder=False, time_control=None):
+    """Play a game between two AIs.
+
+    Unlike :func:`run_game`, the game has no side effects other than calling
+    the AIs, so that many games can be played in one process, e. g. by
+    ``tournament.py``. It neither uses the global ``game`` nor exits nor
+    prints anything unless *display* is set.
 
     :param p1: an AI that plays as player 1 (black)
-    :type p1: module
+    :type p1: module | isolation.IsolatedAI
     :param p2: an AI that plays as player 2 (white)
-    :type p2: module
+    :type p2: module | isolation.IsolatedAI
+    :param seed: the seed of the ``random`` module, which is set before the
+                 game so that AIs using it play reproducibly, including
+                 isolated AIs | ``None`` to leave it as it is
+    :type seed: int | None
+    :param start_player: the player (``1`` or ``2``) that starts the game
+    :type start_player: int
+    :param max_plies: the number of plies after which the game is a draw |
+                      ``None`` to play until a player has won
+    :type max_plies: int | None
+    :param display: whether to print the board and the moves
+    :type display: bool
+    :param verbose: whether to print stack traces of unknown exceptions
+    :type verbose: bool
+    :param ponder: whether to let the AIs think on the opponent's time, see
+                   :func:`start_pondering`
+    :type ponder: bool
+    :param time_control: the time the AIs may think | ``None`` for no limit.
+                         A player who exceeds it loses the game. An
+                         :class:`isolation.IsolatedAI` is stopped at the
+                         deadline, other AIs can only be judged after they
+                         have moved.
+    :type time_control: clock.Clock | None
+    :return: the course of the game, see
+             :func:`save_course_of_the_game_to_file`. ``winner`` is ``None``
+             if the game is a draw.
+    :rtype: dict
     """
 
+    if seed is not None:
+        random.seed(seed)
+    log = print if display else _silent
+
+    match = abalone.Game()
+    match.current_player = start_player
+    if time_control is not None:
+        time_control.reset()
+    # the AIs that are told about the new game before their first turn, so
+    # that an AI whose host has broken forfeits the game
+    new_game = [p1] if p1 is p2 else [p1, p2]
+
     course_of_the_game = {
-        'boardHistory': [],
         'moveHistory': [],
-        'scoreHistory': [],
+        'thinkTimes': [],
         'startPlayer': None,
         'winner': None,
         'exitReason': None
     }
 
-    course_of_the_game['startPlayer'] = game.current_player
+    course_of_the_game['startPlayer'] = match.current_player
 
     last_move = None
+    # The AIs share their module-level state if they are the same module, so
+    # one of them must not ponder while the other one moves.
+    ponder = ponder and p1 is not p2
+    # the pondering of player 1 and 2, see :func:`start_pondering`
+    pondering = {1: None, 2: None}
 
-    while True:
-        print()
-
-        course_of_the_game['scoreHistory'].append((game.score['p1'],
-                                                   game.score['p2']))
-        course_of_the_game['boardHistory'].append(game.board.copy())
-
-        if game.score['p1'] == 0 or game.score['p2'] == 0:
-            if game.score['p1'] == 0:
-                winner = 2
-            if game.score['p2'] == 0:
-                winner = 1
-            print(f'Player {winner} won the game!')
-            course_of_the_game['winner'] = winner
-            save_course_of_the_game_to_file(course_of_the_game)
-            sys.exit(0)
-
-        print(f'Player {game.current_player} is next')
-        print(f'Score: {game.score["p1"]} : {game.score["p2"]}')
-
-        game.print_board()
-
-        # A modified board is given to the player, in which 1 stands for the
-        # player and -1 for the opponent.
-        player_board = {}
-        for space in game.board:
-            player = game.board[space]
-            if player == 0:
-                player_board[space] = 0
-            else:
-                player_board[space] = (1 if player == game.current_player else
-                                       -1)
+    try:
+        while True:
+            log()
+
+            if match.score['p1'] == 0 or match.score['p2'] == 0:
+                winner = 2 if match.score['p1'] == 0 else 1
+                log(f'Player {winner} won the game!')
+                course_of_the_game['winner'] = winner
+                return course_of_the_game
+
+            if (max_plies is not None and
+                    len(course_of_the_game['moveHistory']) >= max_plies):
+                exit_reason = f'Draw after {max_plies} plies'
+                log(exit_reason)
+                course_of_the_game['exitReason'] = exit_reason
+                return course_of_the_game
+
+            log(f'Player {match.current_player} is next')
+            log(f'Score: {match.score["p1"]} : {match.score["p2"]}')
+
+            if display:
+                match.print_board()
+
+            # A modified board is given to the player, in which 1 stands for
+            # the player and -1 for the opponent.
+            player_board = board_for_player(match, match.current_player)
+
+            try:
+                ai = p1 if match.current_player == 1 else p2
+                if ai in new_game:
+                    new_game.remove(ai)
+                    if isinstance(ai, isolation.IsolatedAI):
+                        ai.new_game(seed)
+                    elif hasattr(ai, 'new_game'):
+                        ai.new_game()
+                # The opponent has moved, so the current player stops
+                # pondering.
+                stopped = stop_pondering(pondering[match.current_player])
+                pondering[match.current_player] = None
+                if not stopped:
+                    raise RuntimeError('The AI has not stopped pondering')
+                allowance = (None if time_control is None else
+                             time_control.allowance(match.current_player))
+                start = time.perf_counter()
+                try:
+                    if isinstance(ai, isolation.IsolatedAI):
+                        last_move = ai.turn(player_board, last_move,
+                                            allowance)
+                    else:
+                        last_move = ai.turn(player_board, last_move)
+                finally:
+                    seconds = time.perf_counter() - start
+                    course_of_the_game['thinkTimes'].append(round(seconds, 3))
+                if time_control is not None and not time_control.charge(
+                        match.current_player, seconds):
+                    raise clock.TimeLimitExceeded(f'{seconds:.3f} seconds')
+
+                course_of_the_game['moveHistory'].append(last_move)
+
+                log(f'Moving \'{", ".join(last_move[0])}\' in direction '
+                    f'{last_move[1]}')
+
+                for marble in last_move[0]:
+                    if match.is_opponent(marble):
+                        raise abalone.IllegalMoveException(
+                            'Moving opponent\'s marble')
+                    if abalone.neighbor(marble, last_move[1]) == 0:
+                        raise abalone.IllegalMoveException(
+                            'Moving marble off the board')
+
+                match.move(last_move[0], last_move[1])
+                match.toggle_player()
+
+                # The player who has just moved thinks on the opponent's time.
+                if ponder:
+                    player = 2 if match.current_player == 1 else 1
+                    pondering[player] = start_pondering(
+                        p1 if player == 1 else p2,
+                        board_for_player(match, player))
+
+            except clock.TimeLimitExceeded as e:
+                exit_reason = (f'Player {match.current_player} exceeded the '
+                               'time limit')
+                log(e)
+                course_of_the_game['exitReason'] = exit_reason
+                winner = 2 if match.current_player == 1 else 1
+                log(f'Player {winner} won the game!')
+                course_of_the_game['winner'] = winner
+                return course_of_the_game
+
+            except abalone.IllegalMoveException as e:
+                exit_reason = (f'Player {match.current_player} made an '
+                               'illegal move')
+                log(e)
+                course_of_the_game['exitReason'] = exit_reason
+                winner = 2 if match.current_player == 1 else 1
+                log(f'Player {winner} won the game!')
+                course_of_the_game['winner'] = winner
+                return course_of_the_game
+
+            except Exception:
+                exit_reason = (f'Player {match.current_player}\'s move caused '
+                               'an exception')
+                log(exit_reason)
+                course_of_the_game['exitReason'] = exit_reason
+                if verbose:
+                    traceback.print_exc()
+                winner = 2 if match.current_player == 1 else 1
+                log(f'Player {winner} won the game!')
+                course_of_the_game['winner'] = winner
+                return course_of_the_game
+    finally:
+        for player in pondering:
+            stop_pondering(pondering[player])
 
-        try:
-            if game.current_player == 1:
-                last_move = p1.turn(player_board, last_move)
-            else:
-                last_move = p2.turn(player_board, last_move)
-
-            course_of_the_game['moveHistory'].append(last_move)
-
-            print(f'Moving \'{", ".join(last_move[0])}\' in direction '
-                  f'{last_move[1]}')
-
-            for marble in last_move[0]:
-                if game.is_opponent(marble):
-                    raise abalone.IllegalMoveException(
-                        'Moving opponent\'s marble')
-                if abalone.neighbor(marble, last_move[1]) == 0:
-                    raise abalone.IllegalMoveException(
-                        'Moving marble off the board')
-
-            game.move(last_move[0], last_move[1])
-            game.toggle_player()
-
-        except abalone.IllegalMoveException as e:
-            exit_reason = f'Player {game.current_player} made an illegal move'
-            print(e)
-            course_of_the_game['exitReason'] = exit_reason
-            winner = 2 if game.current_player == 1 else 1
-            print(f'Player {winner} won the game!')
-            course_of_the_game['winner'] = winner
-            save_course_of_the_game_to_file(course_of_the_game)
-            sys.exit(1)
 
-        except Exception:
-            exit_reason = (f'Player {game.current_player}\'s move caused an '
-                           'exception')
-            print(exit_reason)
-            course_of_the_game['exitReason'] = exit_reason
-            if sys.argv['verbose']:
-                traceback.print_exc()
-            winner = 2 if game.current_player == 1 else 1
-            print(f'Player {winner} won the game!')
-            course_of_the_game['winner'] = winner
-            save_course_of_the_game_to_file(course_of_the_game)
-            sys.exit(1)
+def run_game(p1, p2):
+    """The main game loop.
+
+    The game is started by the current player of the global ``game``. It is
+    saved to the results directory and the program exits with status ``0``
+    if a player has won and ``1`` if the game has ended by an error.
+
+    :param p1: an AI that plays as player 1 (black)
+    :type p1: module | isolation.IsolatedAI
+    :param p2: an AI that plays as player 2 (white)
+    :type p2: module | isolation.IsolatedAI
+    """
 
+    course_of_the_game = play_match(p1, p2,
+                                    start_player=game.current_player,
+                                    display=True,
+                                    verbose=sys.argv['verbose'],
+                                    ponder=sys.argv['ponder'],
+                                    time_control=time_control_from_args(
+                                        sys.argv))
     save_course_of_the_game_to_file(course_of_the_game)
+    sys.exit(1 if course_of_the_game['exitReason'] else 0)
 
 
 def save_course_of_the_game_to_file(course_of_the_game):
     """Save the course of the game to a JSON file in the results directory.
 
+    The boards and the scores of every ply are reconstructed from the moves
+    (see :func:`record.Record.to_course`) and saved for the web view.
+
     :param course_of_the_game: The course of the game to be saved
 
     keys:
 
-    - ``boardHistory``: a list containing all states of the board during the
-      game in chronological order
     - ``moveHistory``: a list of all moves, i. e. the return values of the
       players' ``turn`` functions, during the game in chronological order
-    - ``scoreHistory``: a list of tuples of two integer values representing
-      the players' scores during the game in chronological order
+    - ``thinkTimes``: a list of the seconds the players have thought about
+      each move in chronological order, including a move that has not been
+      made because of an error
     - ``startPlayer``: the player (``1`` or ``2``) that started the game
     - ``winner``: The player (``1`` or ``2``) that won the game
     - ``exitReason``: the error message if an error has occurred
 
+    The saved file additionally contains the keys
+
+    - ``boardHistory``: a list containing all states of the board during the
+      game in chronological order
+    - ``scoreHistory``: a list of tuples of two integer values representing
+      the players' scores during the game in chronological order
+
     :type course_of_the_game: dict
     """
 
@@ -182,7 +361,8 @@ def save_course_of_the_game_to_file(course_of_the_game):
 
     with open(filepath, 'w', encoding='utf-8') as file:
         file.write('const courseOfTheGame = ')
-        file.write(json.dumps(course_of_the_game))
+        file.write(json.dumps(record.from_course(
+            course_of_the_game, (p1, p2), hashes=False).to_course()))
         file.write('\nupdate.all()')
         filename = urllib.parse.quote(filename)
         html_file = os.path.join(directory, 'html', 'index.html')
@@ -190,11 +370,100 @@ def save_course_of_the_game_to_file(course_of_the_game):
         print(f'\nOpen file://{html_file}?game={filename} in a web browser')
 
 
+def _silent(*values):
+    """Print nothing, see :func:`play_match`.
+    """
+
+    pass
+
+
+def start_pondering(ai, board):
+    """Let an AI think on the opponent's time.
+
+    If the AI has a ``ponder`` function, it is called with the board in a
+    background thread. It keeps thinking until its ``stop_ponder`` function
+    is called. An :class:`isolation.IsolatedAI` ponders in its host, so it is
+    called directly and talks to the host from this thread only.
+
+    :param ai: the AI that has just moved
+    :type ai: module | isolation.IsolatedAI
+    :param board: the board from the AI's perspective, see
+                  :func:`board_for_player`
+    :type board: dict[str, int]
+    :return: the AI and the thread (``None`` for an isolated AI) | ``None``
+             if the AI does not ponder
+    :rtype: tuple(module | isolation.IsolatedAI, threading.Thread | None) |
+            None
+    """
+
+    if isinstance(ai, isolation.IsolatedAI):
+        try:
+            ai.ponder(board)
+        except Exception:
+            # A broken host is noticed on the AI's next turn.
+            return None
+        return ai, None
+
+    if not hasattr(ai, 'ponder') or not hasattr(ai, 'stop_ponder'):
+        return None
+
+    thread = threading.Thread(target=ai.ponder, args=(board,), daemon=True)
+    thread.start()
+
+    return ai, thread
+
+
+def stop_pondering(pondering):
+    """Stop an AI's pondering and wait for it to finish.
+
+    An AI that does not stop within ``PONDER_STOP_TIME`` seconds is left
+    pondering in its background thread.
+
+    :param pondering: the return value of :func:`start_pondering`
+    :type pondering: tuple(module | isolation.IsolatedAI,
+                     threading.Thread | None) | None
+    :return: whether the AI has stopped pondering
+    :rtype: bool
+    """
+
+    if pondering is None:
+        return True
+
+    ai, thread = pondering
+    ai.stop_ponder()
+    if thread is None:
+        return True  # the host stops pondering before its next message
+    thread.join(PONDER_STOP_TIME)
+
+    return not thread.is_alive()
+
+
+def time_control_from_args(args):
+    """Create the time control given on the command line.
+
+    :param args: the parsed arguments, see :func:`add_time_control_args`
+    :type args: dict
+    :return: the time control | ``None`` if there is no limit
+    :rtype: clock.Clock | None
+    """
+
+    if args['move_time'] is None and args['clock'] is None:
+        return None
+
+    return clock.Clock(args['move_time'], args['clock'], args['increment'])
+
+
 if __name__ == "__main__":
     parse_args()
 
-    p1 = importlib.import_module(f'ais.{sys.argv["p1"]}')
-    p2 = importlib.import_module(f'ais.{sys.argv["p2"]}')
+    if sys.argv['isolate']:
+        memory_limit = (None if sys.argv['memory_limit'] is None else
+                        sys.argv['memory_limit'] * 1024 * 1024)
+        p1 = isolation.IsolatedAI(sys.argv['p1'], memory_limit)
+        p2 = isolation.IsolatedAI(sys.argv['p2'], memory_limit)
+    else:
+        p1 = importlib.import_module(f'ais.{sys.argv["p1"]}')
+        p2 = importlib.import_module(f'ais.{sys.argv["p2"]}')
 
     init_game()
 
@@ -204,3 +473,7 @@ if __name__ == "__main__":
         if sys.argv['verbose']:
             print('Interrupted')
         sys.exit(137)
+    finally:
+        if sys.argv['isolate']:
+            p1.close()
+            p2.close()
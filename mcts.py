@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2018 Scriptim
+# This code is licensed under the MIT License, see LICENSE.md
+
+"""Monte Carlo tree search on :class:`abalone.Game`.
+
+The tree is searched with UCT: starting at the root, the child with the
+highest upper confidence bound is selected until a leaf is reached, the leaf
+is expanded and a playout from it decides the reward, which is propagated
+back to the root.
+
+The nodes are not Python objects but indices into flat arrays, which hold
+the move leading to a node, its parent, its children and its statistics. The
+children of a node are stored next to each other, so a node only needs the
+index of its first child and the number of children. The positions of the
+nodes are not stored, they are reached by making the moves from the root.
+
+A playout makes random moves, except that it always pushes a marble off the
+board if it can. Since random games of Abalone hardly ever end, the playout
+stops after a few plies and the position is scored by
+:func:`search.evaluate`, which is turned into a probability of winning.
+
+After a move the tree is advanced to the subtree of the move with
+:func:`Tree.advance`, so that the playouts spent on it are not lost.
+"""
+
+import abalone
+import array
+import math
+import random
+import search
+import time
+
+# exploration constant of the UCT formula
+EXPLORATION = 1.0
+
+# number of plies after which a playout is scored by the evaluation
+PLAYOUT_DEPTH = 8
+
+# the evaluation difference that makes a win about 73 % likely (``1 / (1 +
+# e ** -1)``), see :func:`_probability`
+_EVALUATION_SCALE = 1000
+
+
+class Tree:
+    """Monte Carlo search tree.
+
+    The position of the root is kept in ``game``. Rewards are stored from the
+    perspective of the player who made the move leading to a node.
+    """
+
+    def __init__(self, max_nodes=500000, exploration=EXPLORATION,
+                 playout_depth=PLAYOUT_DEPTH, seed=None):
+        """Initialize an empty tree.
+
+        :param max_nodes: the maximum number of nodes. Once the tree is full,
+                          leaves are no longer expanded.
+        :type max_nodes: int
+        :param exploration: the exploration constant of the UCT formula
+        :type exploration: float
+        :param playout_depth: the number of plies after which a playout is
+                              scored by the evaluation
+        :type playout_depth: int
+        :param seed: the seed of the random moves of the playouts
+        :type seed: int | None
+        """
+
+        self.max_nodes = max_nodes
+        self.exploration = exploration
+        self.playout_depth = playout_depth
+        self.random = random.Random(seed)
+        self.game = None
+        self._reset()
+
+    def advance(self, marbles, direction):
+        """Make a move at the root and keep the subtree of the move.
+
+        If the move has not been expanded yet, the tree is emptied.
+
+        :param marbles: the marbles of the move, in any order
+        :type marbles: list[str]
+        :param direction: the direction of the move
+        :type direction: int
+        """
+
+        if self.game is None:
+            return
+        target = _normalize(abalone.encode_move(marbles, direction))
+        child = None
+        for node in range(self.first[0], self.first[0] + self.count[0]):
+            if _normalize(self.move[node]) == target:
+                child = node
+                break
+
+        game = self.game
+        game.move(marbles, direction)
+        game.toggle_player()
+        if child is None:
+            self._reset()
+        else:
+            self._reroot(child)
+        self.game = game
+
+    def search(self, game, time_limit=None, playouts=None):
+        """Run playouts from a position and choose the best move.
+
+        If the position is not the one at the root, e. g. because a new game
+        has started, the tree is rebuilt.
+
+        :param game: the game, which is not modified
+        :type game: abalone.Game
+        :param time_limit: the number of seconds after which the search stops
+                           | ``None``
+        :type time_limit: float | None
+        :param playouts: the number of playouts after which the search stops
+                         | ``None``. If neither this nor *time_limit* is
+                         given, 1000 playouts are run.
+        :type playouts: int | None
+        :return: a dict with the keys
+
+        - ``move``: the most visited move | ``None`` if there are no moves
+        - ``visits``: the number of visits of the move
+        - ``win_rate``: the average reward of the move
+        - ``playouts``: the number of playouts of this search
+        - ``reused``: the number of visits of the root before the search
+        - ``nodes``: the number of nodes of the tree
+        - ``seconds``: the duration of the search
+
+        :rtype: dict
+        """
+
+        start = time.perf_counter()
+        if (self.game is None or self.game.cells != game.cells or
+                self.game.current_player != game.current_player):
+            self.game = game.copy()
+            self._reset()
+        reused = self.visits[0]
+        if time_limit is None and playouts is None:
+            playouts = 1000
+        deadline = start + time_limit if time_limit else None
+
+        done = 0
+        while playouts is None or done < playouts:
+            if deadline is not None and (done & 15 == 0 and
+                                         time.perf_counter() > deadline):
+                break
+            self._playout()
+            done = done + 1
+
+        result = {'move': None, 'visits': 0, 'win_rate': 0.0,
+                  'playouts': done, 'reused': reused, 'nodes': len(self.move)}
+        if self.first[0] >= 0:
+            best = max(range(self.first[0], self.first[0] + self.count[0]),
+                       key=lambda node: self.visits[node])
+            result['move'] = abalone.decode_move(self.move[best])
+            result['visits'] = self.visits[best]
+            result['win_rate'] = (self.value[best] / self.visits[best]
+                                  if self.visits[best] else 0.0)
+        result['seconds'] = time.perf_counter() - start
+
+        return result
+
+    def _expand(self, node, moves):
+        """Add the children of a node.
+
+        :param node: the node
+        :type node: int
+        :param moves: the legal moves in the position of the node
+        :type moves: list[tuple(list[str], int)]
+        :return: whether the children have been added, which is not the case
+                 if the tree is full
+        :rtype: bool
+        """
+
+        if len(self.move) + len(moves) > self.max_nodes:
+            return False
+        self.first[node] = len(self.move)
+        self.count[node] = len(moves)
+        for marbles, direction in moves:
+            self.move.append(abalone.encode_move(marbles, direction))
+            self.parent.append(node)
+            self.first.append(-1)
+            self.count.append(0)
+            self.visits.append(0)
+            self.value.append(0.0)
+
+        return True
+
+    def _playout(self):
+        """Select a leaf, expand it, play out from it and propagate the
+        reward back to the root.
+        """
+
+        game = self.game
+        records = []
+        node = 0
+        first = self.first
+        count = self.count
+        visits = self.visits
+        value = self.value
+        exploration = self.exploration
+
+        # selection
+        while first[node] >= 0 and not _game_over(game):
+            log_visits = math.log(visits[node])
+            best_node = -1
+            best_bound = -1.0
+            for child in range(first[node], first[node] + count[node]):
+                if visits[child] == 0:
+                    best_node = child
+                    break
+                bound = (value[child] / visits[child] + exploration *
+                         math.sqrt(log_visits / visits[child]))
+                if bound > best_bound:
+                    best_bound = bound
+                    best_node = child
+            node = best_node
+            records.append(game.move(*abalone.decode_move(self.move[node]),
+                                     True))
+            game.toggle_player()
+
+        # expansion
+        if visits[node] > 0 and not _game_over(game):
+            moves = game.legal_moves()
+            # Unvisited children are selected in order, pushes first.
+            moves.sort(key=lambda move: -search.push_kind(game, *move))
+            if moves and self._expand(node, moves):
+                node = first[node]
+                records.append(game.move(*moves[0], True))
+                game.toggle_player()
+
+        # simulation, the reward is for the player to move at the leaf
+        reward = self._simulate()
+
+        # backpropagation
+        while True:
+            visits[node] = visits[node] + 1
+            # The move leading to the node was made by the other player.
+            reward = 1.0 - reward
+            value[node] = value[node] + reward
+            if node == 0:
+                break
+            node = self.parent[node]
+
+        for record in reversed(records):
+            game.unmove(record)
+
+    def _reroot(self, root):
+        """Make a node the root, discarding all nodes outside its subtree.
+
+        :param root: the new root
+        :type root: int
+        """
+
+        move = array.array('l', [0])
+        parent = array.array('l', [-1])
+        first = array.array('l', [-1])
+        count = array.array('l', [0])
+        visits = array.array('l', [self.visits[root]])
+        value = array.array('d', [self.value[root]])
+
+        # Copy the subtree breadth-first, so that the children of a node
+        # stay next to each other.
+        queue = [(root, 0)]
+        for old, new in queue:
+            if self.first[old] < 0:
+                continue
+            first[new] = len(move)
+            count[new] = self.count[old]
+            for child in range(self.first[old],
+                               self.first[old] + self.count[old]):
+                queue.append((child, len(move)))
+                move.append(self.move[child])
+                parent.append(new)
+                first.append(-1)
+                count.append(0)
+                visits.append(self.visits[child])
+                value.append(self.value[child])
+
+        self.move = move
+        self.parent = parent
+        self.first = first
+        self.count = count
+        self.visits = visits
+        self.value = value
+
+    def _reset(self):
+        """Empty the tree, keeping only the root.
+        """
+
+        # ``move[node]`` is the move leading to a node packed by
+        # :func:`abalone.encode_move`, ``parent[node]`` its parent,
+        # ``first[node]`` its first child (``-1`` if it has not been
+        # expanded) and ``count[node]`` the number of its children.
+        self.move = array.array('l', [0])
+        self.parent = array.array('l', [-1])
+        self.first = array.array('l', [-1])
+        self.count = array.array('l', [0])
+        # ``visits[node]`` is the number of playouts through a node,
+        # ``value[node]`` the sum of their rewards.
+        self.visits = array.array('l', [0])
+        self.value = array.array('d', [0.0])
+
+    def _simulate(self):
+        """Play out the position of the current leaf.
+
+        :return: the reward for the player to move at the leaf, from ``0``
+                 (loss) to ``1`` (win)
+        :rtype: float
+        """
+
+        game = self.game
+        player = game.current_player
+        records = []
+
+        for ply in range(self.playout_depth):
+            if _game_over(game):
+                break
+            move = None
+            for marbles, direction in game.legal_moves(sumito_only=True):
+                if search.push_kind(game, marbles, direction) == 2:
+                    move = (marbles, direction)
+                    break
+            if move is None:
+                moves = game.legal_moves()
+                if not moves:
+                    break
+                move = self.random.choice(moves)
+            records.append(game.move(*move, True))
+            game.toggle_player()
+
+        if game.score['p1'] == 0 or game.score['p2'] == 0:
+            reward = 0.0 if game.score[f'p{player}'] == 0 else 1.0
+        else:
+            evaluation = search.evaluate(game)
+            if game.current_player != player:
+                evaluation = -evaluation
+            reward = _probability(evaluation)
+
+        for record in reversed(records):
+            game.unmove(record)
+
+        return reward
+
+
+def _game_over(game):
+    """Check if a game is over.
+
+    :param game: the game
+    :type game: abalone.Game
+    :rtype: bool
+    """
+
+    return game.score['p1'] == 0 or game.score['p2'] == 0
+
+
+def _normalize(code):
+    """Pack a move independently of the order of its marbles.
+
+    :param code: a move packed by :func:`abalone.encode_move`
+    :type code: int
+    :return: the move packed with the marbles sorted by index
+    :rtype: int
+    """
+
+    marbles, direction = abalone.decode_move(code)
+    return abalone.encode_move(sorted(marbles, key=abalone.space_to_index),
+                               direction)
+
+
+def _probability(evaluation):
+    """Turn an evaluation into a probability of winning.
+
+    :param evaluation: the evaluation of a position
+    :type evaluation: int
+    :return: the probability, from ``0`` to ``1``
+    :rtype: float
+    """
+
+    return 1.0 / (1.0 + math.exp(-evaluation / _EVALUATION_SCALE))
@@ -0,0 +1,599 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2018 Scriptim
+# This code is licensed under the MIT License, see LICENSE.md
+
+"""Parallel alpha-beta search on several processes.
+
+:class:`ParallelSearcher` splits the root moves among the processes. The
+legal moves of the current player are dealt to a pool of worker processes,
+each of which runs a :class:`search.Searcher` on its share of the
+moves. Every worker searches with iterative deepening and reports the score
+and the principal variation of each completed depth. The results are merged
+at the deepest depth that all workers have completed, since the scores of
+different depths are not comparable. Forced wins and losses are exact at any
+depth, so a worker that has found one does not hold the others back.
+
+A worker that finds a forced win cancels the other workers. In any case the
+search returns by the deadline: workers that have not finished by then are
+stopped. Each worker publishes every iteration as soon as it has completed
+it, so the completed iterations of the stopped workers are merged as well.
+
+:class:`LazySMPSearcher` instead lets all processes search the whole tree
+with one :class:`transposition.SharedTranspositionTable` ("Lazy SMP"). The
+workers order the moves differently, so that they tend to search different
+subtrees first and profit from each other's entries in the table. The result
+of the deepest completed iteration is played.
+
+Both searchers have the same interface as :class:`search.Searcher`, e. g.
+
+::
+
+    searcher = parallel.ParallelSearcher(workers=8)
+    result = searcher.search(game, time_limit=5)
+"""
+
+import abalone
+import concurrent.futures
+import multiprocessing
+import os
+import queue
+import random
+import search
+import time
+import transposition
+
+# fraction of the time limit the workers may use, the rest is left for
+# starting the search, transferring the results and merging them
+_WORKER_SHARE = 0.85
+
+# number of seconds reserved for merging the results before the deadline
+_MERGE_TIME = 0.01
+
+# fraction of the time limit a search waits for the workers of the last
+# search to notice that they have been cancelled before it replaces them
+_STALE_SHARE = 0.1
+
+# the searcher of a worker process and the event that cancels its search
+_searcher = None
+_cancel = None
+# the queue to which a worker of a :class:`ParallelSearcher` publishes its
+# completed iterations, and the search and the part of the root moves they
+# belong to
+_reports = None
+_report = None
+
+
+class LazySMPSearcher:
+    """Alpha-beta search of the whole tree by all worker processes, which
+    share a transposition table.
+
+    The workers are started once and keep their searchers across searches.
+    Call :func:`close` to shut them down and free the table.
+    """
+
+    def __init__(self, workers=None, max_depth=64,
+                 table_size=64 * 1024 * 1024):
+        """Create the shared table and start the worker processes.
+
+        :param workers: the number of worker processes | ``None`` for the
+                        number of CPUs
+        :type workers: int | None
+        :param max_depth: the maximum depth of the iterative deepening
+        :type max_depth: int
+        :param table_size: the memory of the shared transposition table in
+                           bytes
+        :type table_size: int
+        """
+
+        self.workers = workers or os.cpu_count() or 1
+        self.max_depth = max_depth
+        self.table = transposition.SharedTranspositionTable(table_size,
+                                                            self.workers)
+        self._start()
+        # the futures of the last search that have not finished in time
+        self._pending = set()
+
+    def close(self):
+        """Shut down the worker processes and free the shared table.
+        """
+
+        self._cancel.set()
+        for future in self._pending:
+            future.cancel()
+        self._executor.shutdown(wait=True)
+        self.table.close()
+
+    def search(self, game, time_limit=None, max_depth=None):
+        """Search for the best move of the current player.
+
+        The search ends as soon as the first worker has finished its
+        iterative deepening.
+
+        :param game: the game, which is not modified
+        :type game: abalone.Game
+        :param time_limit: the number of seconds after which the search
+                           returns | ``None`` to search until *max_depth*
+        :type time_limit: float | None
+        :param max_depth: the maximum depth | ``None`` for the maximum depth
+                          of the searcher
+        :type max_depth: int | None
+        :return: a dict like the one returned by :func:`search.Searcher.search`
+                 with the additional key ``workers``, the number of workers
+                 that have reported a result. The statistics of the table are
+                 returned by the ``stats`` function of the attribute
+                 ``table``.
+        :rtype: dict
+        """
+
+        start = time.perf_counter()
+        deadline = start + time_limit if time_limit else None
+        max_depth = min(max_depth or self.max_depth, self.max_depth)
+        moves = game.legal_moves()
+
+        # The workers of the last search must not resume when the event is
+        # cleared.
+        if _wait_stale(self._pending, time_limit):
+            self._start()
+        self._pending = set()
+        self._cancel.clear()
+        self.table.next_generation()
+        data = game.to_bytes()
+        worker_limit = time_limit * _WORKER_SHARE if time_limit else None
+        futures = [self._executor.submit(_search_all, data, worker_limit,
+                                         max_depth)
+                   for worker in range(self.workers)]
+
+        results = []
+        pending = set(futures)
+        while pending:
+            timeout = (max(0.0, deadline - _MERGE_TIME - time.perf_counter())
+                       if deadline else None)
+            done, pending = concurrent.futures.wait(
+                pending, timeout,
+                return_when=concurrent.futures.FIRST_COMPLETED)
+            if not done:
+                break  # deadline
+            for future in done:
+                if future.exception() is None:
+                    results.append(future.result())
+            # The other workers only report their completed iterations.
+            self._cancel.set()
+        self._cancel.set()
+        for future in pending:
+            future.cancel()
+        self._pending = pending
+
+        result = {'move': moves[0] if moves else None, 'score': 0,
+                  'depth': 0, 'pv': moves[:1],
+                  'nodes': sum(part['nodes'] for part in results),
+                  'iterations': [], 'workers': len(results)}
+        iterations = [part['iterations'][-1] for part in results
+                      if part['iterations']]
+        if iterations:
+            # The first result of the deepest iteration wins.
+            depth, score, pv = max(iterations,
+                                   key=lambda iteration: iteration[0])
+            pv = [abalone.decode_move(code) for code in pv]
+            result.update({'move': pv[0], 'score': score, 'depth': depth,
+                           'pv': pv, 'iterations': [(depth, score, pv)]})
+
+        seconds = time.perf_counter() - start
+        result['seconds'] = seconds
+        result['nps'] = result['nodes'] / seconds if seconds > 0 else 0.0
+
+        return result
+
+    def _start(self):
+        """Start the worker processes.
+
+        Workers that are already running are left to finish on their own,
+        see :func:`_wait_stale`.
+        """
+
+        if hasattr(self, '_executor'):
+            self._executor.shutdown(wait=False)
+        context = multiprocessing.get_context()
+        self._cancel = context.Event()
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            self.workers, mp_context=context,
+            initializer=_initialize_shared,
+            initargs=(self._cancel, context.Value('i', 0), self.table.name,
+                      self.max_depth))
+
+
+class _WorkerSearcher(search.Searcher):
+    """Searcher that can also be stopped from another process.
+
+    Unless *seed* is ``None``, moves of equal priority are searched in a
+    random order, so that workers searching the same tree diverge.
+    """
+
+    def __init__(self, max_depth=64, quiescence_depth=4, table=None,
+                 seed=None):
+        """Initialize the searcher.
+
+        .. seealso:: :func:`search.Searcher.__init__` for the other parameters
+
+        :param seed: the seed of the order of moves of equal priority |
+                     ``None`` for the order of :func:`abalone.Game.legal_moves`
+        :type seed: int | None
+        """
+
+        super().__init__(max_depth, quiescence_depth, table)
+        self._random = random.Random(seed) if seed is not None else None
+
+    def _check_time(self):
+        """Abort the search if the time is up or it has been cancelled.
+
+        :raises search._Abort: the search has to be aborted
+        """
+
+        if _cancel.is_set():
+            raise search._Abort()
+        super()._check_time()
+
+    def _order(self, moves, ply, best=None):
+        """Sort moves so that the most promising ones come first.
+
+        .. seealso:: :func:`search.Searcher._order`
+        """
+
+        if self._random is not None:
+            moves = moves[:]
+            self._random.shuffle(moves)
+        return super()._order(moves, ply, best)
+
+    def _root(self, moves, depth):
+        """Search the root position and publish the completed iteration.
+
+        .. seealso:: :func:`search.Searcher._root`
+        """
+
+        score = super()._root(moves, depth)
+        if _report is not None:
+            _reports.put((*_report, (depth, score, [
+                abalone.encode_move(*move) for move in self._pv[0]]),
+                self.nodes))
+        return score
+
+
+class ParallelSearcher:
+    """Alpha-beta search with the root moves split among worker processes.
+
+    The workers are started once and keep their searchers, i. e. their
+    killer moves, history heuristic and transposition tables, across
+    searches. Call :func:`close` to shut them down.
+    """
+
+    def __init__(self, workers=None, max_depth=64,
+                 table_size=16 * 1024 * 1024):
+        """Start the worker processes.
+
+        :param workers: the number of worker processes | ``None`` for the
+                        number of CPUs
+        :type workers: int | None
+        :param max_depth: the maximum depth of the iterative deepening
+        :type max_depth: int
+        :param table_size: the memory of each worker's transposition table in
+                           bytes
+        :type table_size: int
+        """
+
+        self.workers = workers or os.cpu_count() or 1
+        self.max_depth = max_depth
+        self._table_size = table_size
+        self._start()
+        # the futures of the last search that have not finished in time
+        self._pending = set()
+        # the number of searches so far, which tells the reports of the
+        # current search apart from late reports of the last one
+        self._searches = 0
+
+    def close(self):
+        """Shut down the worker processes.
+        """
+
+        self._cancel.set()
+        for future in self._pending:
+            future.cancel()
+        self._executor.shutdown(wait=True)
+
+    def _collect(self, published):
+        """Collect the iterations the workers have published so far.
+
+        :param published: the iterations and the number of nodes of each part
+                          of the root moves, which are updated
+        :type published: list[dict]
+        """
+
+        while True:
+            try:
+                number, part, iteration, nodes = self._reports.get_nowait()
+            except queue.Empty:
+                break
+            if number == self._searches:
+                published[part]['iterations'].append(iteration)
+                published[part]['nodes'] = nodes
+
+    def search(self, game, time_limit=None, max_depth=None):
+        """Search for the best move of the current player.
+
+        :param game: the game, which is not modified
+        :type game: abalone.Game
+        :param time_limit: the number of seconds after which the search
+                           returns | ``None`` to search until *max_depth*
+        :type time_limit: float | None
+        :param max_depth: the maximum depth | ``None`` for the maximum depth
+                          of the searcher
+        :type max_depth: int | None
+        :return: a dict like the one returned by :func:`search.Searcher.search`
+                 with the additional key ``workers``, the number of workers
+                 that have reported a result
+        :rtype: dict
+        """
+
+        start = time.perf_counter()
+        deadline = start + time_limit if time_limit else None
+        max_depth = min(max_depth or self.max_depth, self.max_depth)
+
+        moves = game.legal_moves()
+        # Deal the pushes, which are most likely the best moves, evenly.
+        moves.sort(key=lambda move: -search.push_kind(game, *move))
+        parts = [moves[worker::self.workers]
+                 for worker in range(self.workers)]
+        parts = [part for part in parts if part]
+
+        # The workers of the last search must not resume when the event is
+        # cleared.
+        if _wait_stale(self._pending, time_limit):
+            self._start()
+        self._pending = set()
+        self._cancel.clear()
+        self._searches = self._searches + 1
+        data = game.to_bytes()
+        worker_limit = time_limit * _WORKER_SHARE if time_limit else None
+        futures = {self._executor.submit(
+            _search_part, data,
+            [abalone.encode_move(*move) for move in part], worker_limit,
+            max_depth, (self._searches, index)): index
+            for index, part in enumerate(parts)}
+
+        finished = {}
+        pending = set(futures)
+        while pending:
+            timeout = (max(0.0, deadline - _MERGE_TIME - time.perf_counter())
+                       if deadline else None)
+            done, pending = concurrent.futures.wait(
+                pending, timeout,
+                return_when=concurrent.futures.FIRST_COMPLETED)
+            if not done:
+                break  # deadline
+            for future in done:
+                if future.exception() is None:
+                    finished[futures[future]] = future.result()
+            if any(result['iterations'] and
+                   result['iterations'][-1][1] > search._WIN_BOUND
+                   for result in finished.values()):
+                break  # forced win
+        self._cancel.set()
+        for future in pending:
+            future.cancel()
+        self._pending = pending
+
+        # The parts that have not finished contribute the iterations they
+        # have published.
+        published = [{'iterations': [], 'nodes': 0} for part in parts]
+        self._collect(published)
+        results = [finished.get(index, published[index])
+                   for index in range(len(parts))
+                   if index in finished or published[index]['iterations']]
+        result = _merge(results, moves)
+        seconds = time.perf_counter() - start
+        result['seconds'] = seconds
+        result['nps'] = result['nodes'] / seconds if seconds > 0 else 0.0
+
+        return result
+
+    def _start(self):
+        """Start the worker processes.
+
+        Workers that are already running are left to finish on their own,
+        see :func:`_wait_stale`.
+        """
+
+        if hasattr(self, '_executor'):
+            self._executor.shutdown(wait=False)
+        context = multiprocessing.get_context()
+        self._cancel = context.Event()
+        self._reports = context.Queue()
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            self.workers, mp_context=context, initializer=_initialize,
+            initargs=(self._cancel, self._reports, self.max_depth,
+                      self._table_size))
+
+
+def _initialize(cancel, reports, max_depth, table_size):
+    """Set up a worker process.
+
+    :param cancel: the event that cancels the search of the worker
+    :type cancel: multiprocessing.Event
+    :param reports: the queue to which the worker publishes its completed
+                    iterations
+    :type reports: multiprocessing.Queue
+    :param max_depth: the maximum depth of the iterative deepening
+    :type max_depth: int
+    :param table_size: the memory of the transposition table in bytes
+    :type table_size: int
+    """
+
+    global _searcher
+    global _cancel
+    global _reports
+
+    _cancel = cancel
+    _reports = reports
+    _searcher = _WorkerSearcher(
+        max_depth, table=transposition.TranspositionTable(table_size))
+
+
+def _initialize_shared(cancel, counter, name, max_depth):
+    """Set up a worker process of a :class:`LazySMPSearcher`.
+
+    :param cancel: the event that cancels the search of the worker
+    :type cancel: multiprocessing.Event
+    :param counter: the number of workers set up so far, which becomes the
+                    index of this worker
+    :type counter: multiprocessing.Value
+    :param name: the name of the shared transposition table
+    :type name: str
+    :param max_depth: the maximum depth of the iterative deepening
+    :type max_depth: int
+    """
+
+    global _searcher
+    global _cancel
+
+    with counter.get_lock():
+        worker = counter.value
+        counter.value = counter.value + 1
+
+    _cancel = cancel
+    # The first worker keeps the usual order of moves.
+    _searcher = _WorkerSearcher(
+        max_depth, table=transposition.attach(name, worker),
+        seed=worker if worker > 0 else None)
+
+
+def _merge(results, moves):
+    """Merge the results of the workers.
+
+    :param results: the results of :func:`_search_part`
+    :type results: list[dict]
+    :param moves: all legal moves at the root
+    :type moves: list[tuple(list[str], int)]
+    :return: a dict like the one returned by :func:`search.Searcher.search`,
+             without the timing
+    :rtype: dict
+    """
+
+    merged = {'move': moves[0] if moves else None, 'score': 0, 'depth': 0,
+              'pv': moves[:1], 'nodes': sum(result['nodes']
+                                            for result in results),
+              'iterations': [], 'workers': len(results)}
+
+    iterations = [result['iterations'] for result in results
+                  if result['iterations']]
+    if not iterations:
+        return merged
+
+    # A forced win or loss is exact at any depth, and a worker stops
+    # deepening once it has found one.
+    wins = [part[-1] for part in iterations
+            if part[-1][1] > search._WIN_BOUND]
+    losses = [part[-1] for part in iterations
+              if part[-1][1] < -search._WIN_BOUND]
+    others = [part for part in iterations
+              if abs(part[-1][1]) <= search._WIN_BOUND]
+    if wins:
+        depth, score, pv = max(wins, key=lambda iteration: iteration[1])
+    elif others:
+        # the deepest depth all other workers have completed
+        depth = min(part[-1][0] for part in others)
+        depth, score, pv = max(
+            (max((iteration for iteration in part if iteration[0] <= depth),
+                 key=lambda iteration: iteration[0]) for part in others),
+            key=lambda iteration: iteration[1])
+    else:
+        depth, score, pv = max(losses, key=lambda iteration: iteration[1])
+
+    pv = [abalone.decode_move(code) for code in pv]
+    merged.update({'move': pv[0], 'score': score, 'depth': depth, 'pv': pv,
+                   'iterations': [(depth, score, pv)]})
+
+    return merged
+
+
+def _search_all(data, time_limit, max_depth):
+    """Search all root moves in a worker process of a
+    :class:`LazySMPSearcher`.
+
+    :param data: the game serialized by :func:`abalone.Game.to_bytes`
+    :type data: bytes
+    :param time_limit: the number of seconds after which the search is
+                       aborted | ``None``
+    :type time_limit: float | None
+    :param max_depth: the maximum depth
+    :type max_depth: int
+    :return: a dict like the one returned by :func:`_search_part`
+    :rtype: dict
+    """
+
+    result = _searcher.search(abalone.game_from_bytes(data), time_limit,
+                              max_depth)
+    _searcher.table.publish()
+
+    return {
+        'iterations': [(depth, score,
+                        [abalone.encode_move(*move) for move in pv])
+                       for depth, score, pv in result['iterations']],
+        'nodes': result['nodes']
+    }
+
+
+def _search_part(data, codes, time_limit, max_depth, report=None):
+    """Search some of the root moves in a worker process.
+
+    :param data: the game serialized by :func:`abalone.Game.to_bytes`
+    :type data: bytes
+    :param codes: the root moves packed by :func:`abalone.encode_move`
+    :type codes: list[int]
+    :param time_limit: the number of seconds after which the search is
+                       aborted | ``None``
+    :type time_limit: float | None
+    :param max_depth: the maximum depth
+    :type max_depth: int
+    :param report: the number of the search and the index of the part, with
+                   which each completed iteration is published | ``None`` to
+                   not publish the iterations
+    :type report: tuple(int, int) | None
+    :return: a dict with the keys ``iterations``, the depth, the score and the
+             packed principal variation of each completed iteration, and
+             ``nodes``
+    :rtype: dict
+    """
+
+    global _report
+
+    game = abalone.game_from_bytes(data)
+    moves = [abalone.decode_move(code) for code in codes]
+    _report = report
+    try:
+        result = _searcher.search(game, time_limit, max_depth, moves)
+    finally:
+        _report = None
+
+    return {
+        'iterations': [(depth, score,
+                        [abalone.encode_move(*move) for move in pv])
+                       for depth, score, pv in result['iterations']],
+        'nodes': result['nodes']
+    }
+
+
+def _wait_stale(futures, time_limit):
+    """Wait for the cancelled workers of the last search to finish.
+
+    :param futures: the futures of the workers
+    :type futures: set[concurrent.futures.Future]
+    :param time_limit: the time limit of the next search | ``None``
+    :type time_limit: float | None
+    :return: whether a worker is still busy, e. g. because it is stuck in a
+             long computation, so that the workers have to be replaced
+    :rtype: bool
+    """
+
+    timeout = time_limit * _STALE_SHARE if time_limit else None
+    done, pending = concurrent.futures.wait(futures, timeout)
+
+    return bool(pending)
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2018 Scriptim
+# This code is licensed under the MIT License, see LICENSE.md
+
+"""Compact game records.
+
+The moves of a game determine all of its positions, so a :class:`Record`
+only stores the start position, the moves packed by
+:func:`abalone.encode_move` and, optionally, the Zobrist hash of the
+position after each move to detect corrupt records. Any position of the game
+is reconstructed on demand by :func:`Record.replay`, and
+:func:`Record.to_course` converts the record to the course of the game with
+the board of every ply, which ``html/index.js`` displays, e. g.
+
+::
+
+    python3 record.py results/games.abr -n 3 -o 'results/game 3.js'
+
+A record takes 3 bytes per ply (11 with hashes), a course of the game
+written by ``main.py`` about 600 bytes per ply. Records are serialized by
+:func:`Record.to_bytes`::
+
+    magic bytes ABREC001 (8 bytes), flags (1 byte),
+    start position (64 bytes, see abalone.Game.to_bytes),
+    winner (1 byte, 0 for none), number of plies (4 bytes),
+    names of player 1 and 2 (1 byte length + UTF-8 each),
+    exit reason (2 bytes length + UTF-8),
+    unpacked last move (2 bytes length + JSON, only if bit 2 is set),
+    moves (3 bytes each), hashes (8 bytes each),
+    number of think times (4 bytes), think times (4 bytes each, in ms)
+
+All integers are big-endian. Bit 0 of the flags tells whether there are
+hashes, bit 1 whether the last move has not been made because it was
+illegal and bit 2 whether there is a last move that cannot be packed, e. g.
+because it is malformed, which has not been made either. An archive is a
+file of records, each preceded by its length as a 4 byte integer, see
+:func:`read_archive` and :func:`write`.
+"""
+
+import abalone
+import argparse
+import json
+import struct
+
+_MAGIC = b'ABREC001'
+_HASHES = 1
+_ILLEGAL = 2
+_UNPACKED = 4
+
+_LENGTH = struct.Struct('>I')
+_SHORT = struct.Struct('>H')
+_HASH = struct.Struct('>Q')
+
+# A checkpoint of the position is kept every this many plies, so that
+# replaying a ply makes at most this many moves.
+_CHECKPOINT_INTERVAL = 16
+
+
+class Record:
+    """Compact record of a game.
+    """
+
+    def __init__(self, start, moves, winner=None, exit_reason=None,
+                 names=('', ''), think_times=None, hashes=None,
+                 illegal=False, unpacked=None):
+        """Initialize the record.
+
+        :param start: the start position, see :func:`abalone.Game.to_bytes`
+        :type start: bytes
+        :param moves: the moves packed by :func:`abalone.encode_move`
+        :type moves: list[int]
+        :param winner: the player (``1`` or ``2``) that won the game |
+                       ``None``
+        :type winner: int | None
+        :param exit_reason: the error message if an error has occurred
+        :type exit_reason: str | None
+        :param names: the names of the AIs of player 1 and 2
+        :type names: tuple(str, str)
+        :param think_times: the seconds the players have thought about each
+                            move | ``None``
+        :type think_times: list[float] | None
+        :param hashes: the Zobrist hash of the position after each move |
+                       ``None``
+        :type hashes: list[int] | None
+        :param illegal: whether the last move has not been made because it
+                        was illegal
+        :type illegal: bool
+        :param unpacked: the last move as returned by the AI, encoded as
+                         JSON, if it cannot be packed. It has not been made
+                         and follows the packed moves.
+        :type unpacked: str | None
+        """
+
+        self.start = start
+        self.moves = moves
+        self.winner = winner
+        self.exit_reason = exit_reason
+        self.names = names
+        self.think_times = think_times
+        self.hashes = hashes
+        self.illegal = illegal
+        self.unpacked = unpacked
+        # ``_checkpoints[index]`` is the position after
+        # ``index * _CHECKPOINT_INTERVAL`` plies, see :func:`replay`
+        self._checkpoints = [start]
+
+    def plies(self):
+        """Get the number of moves that have been made.
+
+        :return: the number of moves, not counting an illegal last move
+        :rtype: int
+        """
+
+        return len(self.moves) - 1 if self.illegal else len(self.moves)
+
+    def replay(self, ply):
+        """Reconstruct the position after a number of plies.
+
+        The position is replayed from the closest checkpoint, and the
+        checkpoints passed on the way are kept for later calls.
+
+        :param ply: the number of plies, from ``0`` (the start position) to
+                    :func:`plies`
+        :type ply: int
+        :raises IndexError: *ply* is out of range
+        :raises ValueError: the hash of a position does not match the record
+        :return: the game in the position
+        :rtype: abalone.Game
+        """
+
+        if ply < 0 or ply > self.plies():
+            raise IndexError(f'Ply {ply} out of range')
+
+        checkpoint = min(ply // _CHECKPOINT_INTERVAL,
+                         len(self._checkpoints) - 1)
+        game = abalone.game_from_bytes(self._checkpoints[checkpoint])
+        for current in range(checkpoint * _CHECKPOINT_INTERVAL, ply):
+            game.move(*abalone.decode_move(self.moves[current]))
+            game.toggle_player()
+            if (self.hashes is not None and
+                    game.zobrist != self.hashes[current]):
+                raise ValueError(f'Hash mismatch after ply {current + 1}')
+            if ((current + 1) % _CHECKPOINT_INTERVAL == 0 and
+                    (current + 1) // _CHECKPOINT_INTERVAL ==
+                    len(self._checkpoints)):
+                self._checkpoints.append(game.to_bytes())
+
+        return game
+
+    def to_bytes(self):
+        """Serialize the record, see the module documentation.
+
+        :return: the serialized record
+        :rtype: bytes
+        """
+
+        flags = ((_HASHES if self.hashes is not None else 0) |
+                 (_ILLEGAL if self.illegal else 0) |
+                 (_UNPACKED if self.unpacked is not None else 0))
+        parts = [_MAGIC, bytes([flags]), self.start,
+                 bytes([self.winner or 0]), _LENGTH.pack(len(self.moves))]
+        for name in self.names:
+            encoded = name.encode()
+            parts.append(bytes([len(encoded)]) + encoded)
+        encoded = (self.exit_reason or '').encode()
+        parts.append(_SHORT.pack(len(encoded)) + encoded)
+        if self.unpacked is not None:
+            encoded = self.unpacked.encode()
+            parts.append(_SHORT.pack(len(encoded)) + encoded)
+        parts.append(b''.join(code.to_bytes(3, 'big') for code in self.moves))
+        if self.hashes is not None:
+            parts.append(b''.join(_HASH.pack(value) for value in self.hashes))
+        think_times = self.think_times or []
+        parts.append(_LENGTH.pack(len(think_times)))
+        parts.append(b''.join(_LENGTH.pack(round(seconds * 1000))
+                              for seconds in think_times))
+
+        return b''.join(parts)
+
+    def to_course(self):
+        """Convert the record to the course of the game.
+
+        :return: the course of the game with the board and the scores of
+                 every ply, see ``main.save_course_of_the_game_to_file``
+        :rtype: dict
+        """
+
+        game = self.replay(0)
+        course_of_the_game = {
+            'boardHistory': [game.board.copy()],
+            'moveHistory': [],
+            'scoreHistory': [(game.score['p1'], game.score['p2'])],
+            'thinkTimes': list(self.think_times or []),
+            'startPlayer': game.current_player,
+            'winner': self.winner,
+            'exitReason': self.exit_reason
+        }
+
+        for ply, code in enumerate(self.moves):
+            course_of_the_game['moveHistory'].append(
+                abalone.decode_move(code))
+            if ply == self.plies():
+                break  # the illegal last move
+            game.move(*abalone.decode_move(code))
+            game.toggle_player()
+            if self.hashes is not None and game.zobrist != self.hashes[ply]:
+                raise ValueError(f'Hash mismatch after ply {ply + 1}')
+            course_of_the_game['boardHistory'].append(game.board.copy())
+            course_of_the_game['scoreHistory'].append((game.score['p1'],
+                                                       game.score['p2']))
+        if self.unpacked is not None:
+            course_of_the_game['moveHistory'].append(
+                json.loads(self.unpacked))
+
+        return course_of_the_game
+
+
+def from_course(course_of_the_game, names=('', ''), hashes=True):
+    """Create a record from the course of a game.
+
+    The moves are replayed to find out whether the last one has been made,
+    which is not the case if it has been illegal or has caused an exception.
+    A malformed last move is kept as it is, see :class:`Record`.
+
+    :param course_of_the_game: the course of the game as returned by
+                               ``main.play_match``. Of the board history,
+                               only the first board is used if there is one.
+    :type course_of_the_game: dict
+    :param names: the names of the AIs of player 1 and 2
+    :type names: tuple(str, str)
+    :param hashes: whether to store the hash of the position after each move
+    :type hashes: bool
+    :return: the record
+    :rtype: Record
+    """
+
+    game = abalone.Game()
+    if course_of_the_game.get('boardHistory'):
+        game.board = course_of_the_game['boardHistory'][0]
+    game.current_player = course_of_the_game['startPlayer']
+    start = game.to_bytes()
+
+    moves = []
+    values = []
+    illegal = False
+    unpacked = None
+    for move in course_of_the_game['moveHistory']:
+        if not _packable(move):
+            unpacked = json.dumps(move, default=repr)
+            break
+        marbles, direction = move
+        moves.append(abalone.encode_move(marbles, direction))
+        try:
+            _referee_move(game, marbles, direction)
+        except Exception:
+            illegal = True
+            break
+        game.toggle_player()
+        values.append(game.zobrist)
+
+    return Record(start, moves, course_of_the_game.get('winner'),
+                  course_of_the_game.get('exitReason'), names,
+                  course_of_the_game.get('thinkTimes'),
+                  values if hashes else None, illegal, unpacked)
+
+
+def _packable(move):
+    """Check whether a move can be packed by :func:`abalone.encode_move`.
+
+    :param move: the move as returned by an AI's ``turn`` function, which may
+                 be malformed
+    :type move: object
+    :rtype: bool
+    """
+
+    try:
+        marbles, direction = move
+        return (isinstance(marbles, (list, tuple)) and
+                1 <= len(marbles) <= 3 and direction in range(1, 7) and
+                all(marble in abalone.spaces for marble in marbles))
+    except (TypeError, ValueError):
+        return False
+
+
+def parse(data):
+    """Create a record from the data serialized by :func:`Record.to_bytes`.
+
+    :param data: the serialized record
+    :type data: bytes
+    :raises ValueError: the data is not a record
+    :return: the record
+    :rtype: Record
+    """
+
+    if data[:len(_MAGIC)] != _MAGIC:
+        raise ValueError('Not a game record')
+
+    offset = len(_MAGIC)
+    flags = data[offset]
+    start = bytes(data[offset + 1:offset + 65])
+    winner = data[offset + 65] or None
+    plies = _LENGTH.unpack_from(data, offset + 66)[0]
+    offset = offset + 70
+
+    names = []
+    for _ in range(2):
+        length = data[offset]
+        names.append(bytes(data[offset + 1:offset + 1 + length]).decode())
+        offset = offset + 1 + length
+    length = _SHORT.unpack_from(data, offset)[0]
+    exit_reason = bytes(data[offset + 2:offset + 2 + length]).decode() or None
+    offset = offset + 2 + length
+    unpacked = None
+    if flags & _UNPACKED:
+        length = _SHORT.unpack_from(data, offset)[0]
+        unpacked = bytes(data[offset + 2:offset + 2 + length]).decode()
+        offset = offset + 2 + length
+
+    moves = [int.from_bytes(data[index:index + 3], 'big')
+             for index in range(offset, offset + 3 * plies, 3)]
+    offset = offset + 3 * plies
+    hashes = None
+    if flags & _HASHES:
+        illegal = 1 if flags & _ILLEGAL else 0
+        hashes = [_HASH.unpack_from(data, index)[0]
+                  for index in range(offset, offset + 8 * (plies - illegal),
+                                     8)]
+        offset = offset + 8 * (plies - illegal)
+    count = _LENGTH.unpack_from(data, offset)[0]
+    think_times = [_LENGTH.unpack_from(data, index)[0] / 1000
+                   for index in range(offset + 4, offset + 4 + 4 * count, 4)]
+
+    return Record(start, moves, winner, exit_reason, tuple(names),
+                  think_times or None, hashes, bool(flags & _ILLEGAL),
+                  unpacked)
+
+
+def read_archive(path):
+    """Read the records of an archive written by :func:`write`.
+
+    :param path: the path of the archive
+    :type path: str
+    :return: the records
+    :rtype: generator[Record]
+    """
+
+    with open(path, 'rb') as file:
+        while True:
+            header = file.read(_LENGTH.size)
+            if len(header) < _LENGTH.size:
+                break
+            yield parse(file.read(_LENGTH.unpack(header)[0]))
+
+
+def _referee_move(game, marbles, direction):
+    """Make a move like ``main.play_match`` does.
+
+    :param game: the game
+    :type game: abalone.Game
+    :param marbles: the marbles to be moved
+    :type marbles: list[str]
+    :param direction: the direction of movement
+    :type direction: int
+    :raises IllegalMoveException: the move is illegal
+    """
+
+    for marble in marbles:
+        if game.is_opponent(marble):
+            raise abalone.IllegalMoveException('Moving opponent\'s marble')
+        if abalone.neighbor(marble, direction) == 0:
+            raise abalone.IllegalMoveException('Moving marble off the board')
+    game.move(marbles, direction)
+
+
+def write(file, record):
+    """Append a record to an archive.
+
+    :param file: the archive, opened for writing in binary mode
+    :type file: io.BufferedIOBase
+    :param record: the record
+    :type record: Record
+    """
+
+    data = record.to_bytes()
+    file.write(_LENGTH.pack(len(data)) + data)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Convert a game record for the web view')
+    parser.add_argument('archive', help='archive of game records')
+    parser.add_argument('-n', '--number', dest='number', type=int, default=1,
+                        help='number of the record in the archive, starting '
+                        'at 1')
+    parser.add_argument('-o', '--output', dest='output', required=True,
+                        help='the .js file to be written, see main.py')
+    args = parser.parse_args()
+
+    for number, game_record in enumerate(read_archive(args.archive), 1):
+        if number == args.number:
+            break
+    else:
+        parser.error(f'the archive has no record {args.number}')
+
+    with open(args.output, 'w', encoding='utf-8') as file:
+        file.write('const courseOfTheGame = ')
+        file.write(json.dumps(game_record.to_course()))
+        file.write('\nupdate.all()')
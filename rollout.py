@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2018 Scriptim
+# This code is licensed under the MIT License, see LICENSE.md
+
+"""Vectorized random playouts with NumPy.
+
+Many games are played out at once. The K boards are encoded from the
+perspective of the player to move like the ``(K, 61)`` positions of
+:func:`features.encode`, with an extra pad space for "off the board" that is
+always empty. They are held transposed in one ``(62, K)`` int8 array, one
+column per board, so that gathering a space of all boards reads one
+contiguous row. After every ply the boards are negated, so the player to move
+always owns the ``1`` marbles.
+
+All moves that can ever be made are enumerated once as move templates: the
+marbles to be moved, the spaces they leave and enter and, for in-line moves,
+the three spaces in front of the head. A ply checks the legality of every
+template on every board with a few row gathers, picks a random legal
+template per board and applies it with scatters. The rules are those of
+:func:`abalone.Game.move` and the referee in ``main.py``.
+
+::
+
+    results = rollout.playout(games, max_plies=200, seed=1)
+    print(results['wins'], results['losses'], results['unfinished'])
+"""
+
+import abalone
+import features
+import numpy as np
+
+# index of the pad column, i. e. "off the board"
+PAD = abalone.OFF_BOARD
+
+# A player loses when only this many marbles are left, i. e. after losing 6
+# of the 14 marbles of the initial position.
+LOSING_COUNT = 8
+
+
+def _build_templates():
+    """Enumerate all moves that stay on the board.
+
+    :return: a dict of the template arrays, see ``TEMPLATES``
+    :rtype: dict[str, numpy.ndarray]
+    """
+
+    marbles = []
+    sources = []
+    destinations = []
+    fronts = []
+    in_line = []
+    triple = []
+
+    def pad(indices):
+        return list(indices) + [PAD] * (3 - len(indices))
+
+    for axis, line_in_line, ordered in abalone.straight_lines.values():
+        for direction in range(1, 7):
+            line = ordered[direction]
+            if line_in_line[direction]:
+                front = [abalone.neighbors[line[0]][direction - 1]]
+                if front[0] == PAD:
+                    continue  # the own head would leave the board
+                while len(front) < 3:
+                    front.append(PAD if front[-1] == PAD else
+                                 abalone.neighbors[front[-1]][direction - 1])
+                marbles.append(pad(line))
+                sources.append(pad([line[-1]]))
+                destinations.append(pad([front[0]]))
+                fronts.append(front)
+                in_line.append(True)
+                triple.append(len(line) == 3)
+            else:
+                targets = [abalone.neighbors[index][direction - 1]
+                           for index in line]
+                if PAD in targets:
+                    continue
+                marbles.append(pad(line))
+                sources.append(pad(line))
+                destinations.append(pad(targets))
+                fronts.append([PAD] * 3)
+                in_line.append(False)
+                triple.append(len(line) == 3)
+
+    return {
+        'marbles': np.array(marbles, dtype=np.intp),
+        'sources': np.array(sources, dtype=np.intp),
+        'destinations': np.array(destinations, dtype=np.intp),
+        'fronts': np.array(fronts, dtype=np.intp),
+        'in_line': np.array(in_line, dtype=bool),
+        'triple': np.array(triple, dtype=bool)
+    }
+
+
+# The move templates, one row per template:
+#
+# - ``marbles``: the marbles to be moved, padded with ``PAD``
+# - ``sources``: the spaces that become empty (the tail of an in-line move)
+# - ``destinations``: the spaces that receive a marble of the player (the
+#   space in front of the head of an in-line move)
+# - ``fronts``: the three spaces in front of the head of an in-line move
+# - ``in_line``: whether the template is an in-line move
+# - ``triple``: whether three marbles are moved
+TEMPLATES = _build_templates()
+
+# ``_slots[name][slot]`` is column ``slot`` of ``TEMPLATES[name]``, ready for
+# gathering rows
+_slots = {name: [np.ascontiguousarray(TEMPLATES[name][:, slot])
+                 for slot in range(3)]
+          for name in ['marbles', 'sources', 'destinations', 'fronts']}
+
+
+def legal(boards):
+    """Check which templates are legal moves on each board.
+
+    :param boards: a ``(62, K)`` array, see the module documentation
+    :type boards: numpy.ndarray
+    :return: a ``(K, T)`` boolean array, ``T`` being the number of templates
+    :rtype: numpy.ndarray
+    """
+
+    own = boards == 1
+    own[PAD] = True  # unused slots of ``marbles``
+    empty = boards == 0
+    opponent = boards == -1
+    marbles = _slots['marbles']
+    destinations = _slots['destinations']
+    fronts = _slots['fronts']
+
+    moves = own[marbles[0]] & own[marbles[1]] & own[marbles[2]]
+    free = (empty[destinations[0]] & empty[destinations[1]] &
+            empty[destinations[2]])
+    # 2 -> 1 and 3 -> 1 push the marble to an empty space or off the board,
+    # 3 -> 2 pushes the second marble
+    sumito = (TEMPLATES['in_line'][:, None] & opponent[fronts[0]] &
+              (empty[fronts[1]] | (TEMPLATES['triple'][:, None] &
+                                   opponent[fronts[1]] & empty[fronts[2]])))
+    moves = moves & (free | sumito)
+
+    return np.ascontiguousarray(moves.T)
+
+
+def playout(positions, max_plies=200, seed=None):
+    """Play out positions with random legal moves.
+
+    :param positions: games or boards as passed to the players' ``turn``
+                      functions
+    :type positions: list[abalone.Game | dict[str, int]]
+    :param max_plies: the number of plies after which a game is given up as
+                      unfinished
+    :type max_plies: int
+    :param seed: the seed of the random moves
+    :type seed: int | None
+    :return: a dict with the keys
+
+    - ``result``: for each game ``1`` if the player to move in the position
+      has won, ``-1`` if they have lost and ``0`` if the game is unfinished
+    - ``plies``: for each game the number of plies played
+    - ``wins``, ``losses`` and ``unfinished``: the number of games of each
+      result
+    - ``mean_plies``: the mean number of plies of the finished games
+
+    :rtype: dict
+    """
+
+    rng = np.random.default_rng(seed)
+    count = len(positions)
+    boards = np.zeros((PAD + 1, count), dtype=np.int8)
+    boards[:PAD] = features.encode(positions).T
+
+    # marbles of the player to move and of the other player
+    marbles = np.stack([(boards == 1).sum(axis=0),
+                        (boards == -1).sum(axis=0)])
+    result = np.zeros(count, dtype=np.int8)
+    plies = np.zeros(count, dtype=np.int32)
+    running = (marbles > LOSING_COUNT).all(axis=0)
+    # Games that are already over are lost by the player without marbles.
+    result[~running] = np.where(marbles[0, ~running] <= LOSING_COUNT, -1, 1)
+    active = np.flatnonzero(running)
+
+    for ply in range(max_plies):
+        if len(active) == 0:
+            break
+        # ``take`` keeps the rows contiguous, unlike ``boards[:, active]``.
+        current = boards.take(active, axis=1)
+        movable, captured = _step(current, rng)
+        boards[:, active] = current
+        plies[active[movable]] = ply + 1
+        opponent = marbles[1, active] - captured
+        marbles[1, active] = marbles[0, active]
+        marbles[0, active] = opponent
+
+        won = opponent <= LOSING_COUNT
+        # The player to move at the start moves on even plies.
+        result[active[won]] = 1 if ply % 2 == 0 else -1
+        active = active[~won & movable]
+
+    finished = result != 0
+    return {
+        'result': result,
+        'plies': plies,
+        'wins': int((result == 1).sum()),
+        'losses': int((result == -1).sum()),
+        'unfinished': int((~finished).sum()),
+        'mean_plies': float(plies[finished].mean()) if finished.any() else 0.0
+    }
+
+
+def _choose(moves, rng):
+    """Choose a random legal template for each board.
+
+    Only the legal templates are drawn from, which is much faster than
+    drawing a random key for every template.
+
+    :param moves: the legal templates, as returned by :func:`legal`
+    :type moves: numpy.ndarray
+    :param rng: the random number generator
+    :type rng: numpy.random.Generator
+    :return: the chosen template of each board (``0`` if there is no legal
+             move) and whether there is a legal move
+    :rtype: tuple(numpy.ndarray, numpy.ndarray)
+    """
+
+    legal_indices = np.flatnonzero(moves)
+    counts = np.count_nonzero(moves, axis=1)
+    ends = np.cumsum(counts)
+    picks = ends - counts + (rng.random(len(moves)) * counts).astype(np.intp)
+    movable = counts > 0
+    chosen = np.zeros(len(moves), dtype=np.intp)
+    chosen[movable] = legal_indices[picks[movable]] % moves.shape[1]
+
+    return chosen, movable
+
+
+def _step(boards, rng):
+    """Make a random legal move on each board.
+
+    :param boards: a ``(62, K)`` array, see the module documentation. The
+                   moves are made in place and the boards are negated for the
+                   next player, except for boards without a legal move, which
+                   are left as they are.
+    :type boards: numpy.ndarray
+    :param rng: the random number generator
+    :type rng: numpy.random.Generator
+    :return: whether there was a legal move and whether a marble was pushed
+             off the board, for each board
+    :rtype: tuple(numpy.ndarray, numpy.ndarray)
+    """
+
+    chosen, movable = _choose(legal(boards), rng)
+    columns = np.flatnonzero(movable)
+    chosen = chosen[movable]
+
+    # The contents in front of the head decide about a push.
+    first = boards[TEMPLATES['fronts'][chosen, 0], columns]
+    second = boards[TEMPLATES['fronts'][chosen, 1], columns]
+    for slot in range(3):
+        boards[_slots['sources'][slot][chosen], columns] = 0
+    for slot in range(3):
+        boards[_slots['destinations'][slot][chosen], columns] = 1
+    pushed = TEMPLATES['in_line'][chosen] & (first == -1)
+    target = np.where(second == -1, TEMPLATES['fronts'][chosen, 2],
+                      TEMPLATES['fronts'][chosen, 1])
+    boards[target[pushed], columns[pushed]] = -1
+    boards[PAD] = 0
+    boards[:, columns] = -boards[:, columns]
+
+    captured = np.zeros(boards.shape[1], dtype=bool)
+    captured[columns] = pushed & (target == PAD)
+
+    return movable, captured
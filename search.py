@@ -0,0 +1,556 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2018 Scriptim
+# This code is licensed under the MIT License, see LICENSE.md
+
+"""Alpha-beta game tree search on :class:`abalone.Game`.
+
+The search is a negamax alpha-beta search with iterative deepening under a
+time budget. Moves that push marbles of the opponent are searched first,
+followed by killer moves and the remaining moves sorted by the history
+heuristic. Results are cached in a :class:`transposition.TranspositionTable`
+keyed by the Zobrist hash of the position, whose best moves are searched
+first when a position is reached again. At the leaves a quiescence search
+follows sequences of sumito moves, so that positions are not evaluated in the
+middle of an exchange.
+
+The search mutates a single copy of the game with :func:`abalone.Game.move`
+and :func:`abalone.Game.unmove` instead of copying it for every node.
+"""
+
+import abalone
+import time
+import transposition
+
+# Score of a won position. It is reduced by the number of plies it takes to
+# win, so that faster wins score higher.
+WIN = 1000000
+
+# Scores beyond this bound are wins or losses. They are stored in the
+# transposition table relative to the position instead of the root.
+_WIN_BOUND = WIN - 1000
+
+# weights of :func:`evaluate`
+MARBLE = 1000
+CENTRE = 10
+COHESION = 3
+
+# ``_centre_bonus[index]`` is 4 for E5 down to 0 for the edge of the board.
+_centre_bonus = tuple(abalone.EDGE_DISTANCE - distance
+                      for distance in abalone.centre_distances)
+
+
+class _Abort(Exception):
+    """Raised inside the search when the time is up or the search has been
+    stopped.
+    """
+
+    pass
+
+
+class Searcher:
+    """Alpha-beta search with iterative deepening.
+
+    The killer moves and the history heuristic are kept across searches, so
+    a searcher should be reused for the moves of a game. So is the
+    transposition table, whose memory is allocated once.
+    """
+
+    def __init__(self, max_depth=64, quiescence_depth=4, table=None):
+        """Initialize the searcher.
+
+        :param max_depth: the maximum depth of the iterative deepening
+        :type max_depth: int
+        :param quiescence_depth: the maximum number of sumito moves searched
+                                 beyond the nominal depth
+        :type quiescence_depth: int
+        :param table: the transposition table | ``None`` for a new table of
+                      the default size
+        :type table: transposition.TranspositionTable | None
+        """
+
+        self.max_depth = max_depth
+        self.quiescence_depth = quiescence_depth
+
+        # ``killers[ply]`` are the two latest moves that caused a cutoff at
+        # ``ply``.
+        self.killers = [[None, None]
+                        for ply in range(max_depth + quiescence_depth + 2)]
+        # Maps moves to a score that grows with every cutoff they cause.
+        self.history = {}
+        self.table = table or transposition.TranspositionTable()
+
+        self.game = None
+        self.nodes = 0
+        self.deadline = None
+        self.stopped = False
+        # the event that aborts the current search, see :func:`search`
+        self._cancel = None
+        # ``_pv[ply]`` is the principal variation from ``ply`` on.
+        self._pv = []
+        # (score, move, principal variation) of the best root move of the
+        # current iteration
+        self._root_best = None
+
+    def search(self, game, time_limit=None, max_depth=None, root_moves=None,
+               cancel=None):
+        """Search for the best move of the current player.
+
+        :param game: the game, which is not modified
+        :type game: abalone.Game
+        :param time_limit: the number of seconds after which the search is
+                           aborted | ``None`` to search until *max_depth*
+        :type time_limit: float | None
+        :param max_depth: the maximum depth | ``None`` for the maximum depth
+                          of the searcher
+        :type max_depth: int | None
+        :param root_moves: the moves to be searched at the root | ``None`` for
+                           all legal moves
+        :type root_moves: list[tuple(list[str], int)] | None
+        :param cancel: an event that aborts the search once it is set, e. g.
+                       by another thread. Unlike :func:`stop`, it also aborts
+                       a search that has not started yet when it is set.
+        :type cancel: threading.Event | None
+        :return: a dict with the keys
+
+        - ``move``: the best move | ``None`` if there are no moves
+        - ``score``: the score of the move for the current player
+        - ``depth``: the depth of the last completed iteration
+        - ``pv``: the principal variation, starting with ``move``
+        - ``nodes``: the number of nodes searched
+        - ``seconds``: the duration of the search
+        - ``nps``: the number of nodes searched per second
+        - ``iterations``: the depth, the score and the principal variation of
+          each completed iteration
+
+        :rtype: dict
+        """
+
+        start = time.perf_counter()
+        self.deadline = start + time_limit if time_limit else None
+        self.stopped = False
+        self._cancel = cancel
+        self.nodes = 0
+        self.game = game.copy()
+        self.table.new_search()
+        self._pv = [[] for ply in range(len(self.killers) + 1)]
+        for move in self.history:
+            self.history[move] = self.history[move] // 2
+        max_depth = min(max_depth or self.max_depth, self.max_depth)
+
+        moves = (self.game.legal_moves() if root_moves is None else
+                 [(list(marbles), direction)
+                  for marbles, direction in root_moves])
+        result = {'move': moves[0] if moves else None, 'score': 0,
+                  'depth': 0, 'pv': moves[:1], 'nodes': 0, 'iterations': []}
+
+        for depth in range(1, max_depth + 1):
+            if not moves:
+                break
+            moves = self._order(moves, 0, result['move'])
+            try:
+                score = self._root(moves, depth)
+            except _Abort:
+                # The best move of the previous iteration is searched first,
+                # hence any move that has been found to be better since is
+                # better indeed.
+                if self._root_best is not None:
+                    result['move'] = self._root_best[1]
+                    result['score'] = self._root_best[0]
+                    result['pv'] = self._root_best[2]
+                break
+
+            result['move'] = self._pv[0][0]
+            result['score'] = score
+            result['depth'] = depth
+            result['pv'] = self._pv[0]
+            result['iterations'].append((depth, score, self._pv[0]))
+
+            if abs(score) >= WIN - len(self._pv):
+                break  # forced win or loss
+            elapsed = time.perf_counter() - start
+            if time_limit and elapsed > time_limit / 2:
+                # The next iteration would most likely not finish in time.
+                break
+
+        seconds = time.perf_counter() - start
+        result['nodes'] = self.nodes
+        result['seconds'] = seconds
+        result['nps'] = self.nodes / seconds if seconds > 0 else 0.0
+
+        return result
+
+    def stop(self):
+        """Abort the current search as soon as possible.
+
+        This may be called from another thread. The search returns the best
+        move found so far.
+        """
+
+        self.stopped = True
+
+    def _negamax(self, depth, alpha, beta, ply):
+        """Search a position.
+
+        :param depth: the remaining depth
+        :type depth: int
+        :param alpha: the lower bound of the window
+        :type alpha: int
+        :param beta: the upper bound of the window
+        :type beta: int
+        :param ply: the distance to the root
+        :type ply: int
+        :return: the score for the current player
+        :rtype: int
+        """
+
+        self.nodes = self.nodes + 1
+        if self.nodes & 1023 == 0:
+            self._check_time()
+
+        game = self.game
+        self._pv[ply] = []
+        over = _game_over(game, ply)
+        if over is not None:
+            return over
+        if depth <= 0:
+            return self._quiescence(alpha, beta, ply, self.quiescence_depth)
+
+        key = game.zobrist
+        entry = self.table.probe(key)
+        table_move = None
+        if entry is not None:
+            entry_depth, bound, score, code = entry
+            if code:
+                table_move = abalone.decode_move(code)
+            if entry_depth >= depth:
+                score = _from_table(score, ply)
+                if (bound == transposition.EXACT or
+                        (bound == transposition.LOWER and score >= beta) or
+                        (bound == transposition.UPPER and score <= alpha)):
+                    if table_move:
+                        self._pv[ply] = [table_move]
+                    return score
+
+        moves = game.legal_moves()
+        if not moves:
+            return evaluate(game)
+
+        original_alpha = alpha
+        best = -WIN - 1
+        best_move = None
+        for marbles, direction in self._order(moves, ply, table_move):
+            record = game.move(marbles, direction, True)
+            game.toggle_player()
+            score = -self._negamax(depth - 1, -beta, -alpha, ply + 1)
+            game.unmove(record)
+
+            if score > best:
+                best = score
+            if score > alpha:
+                alpha = score
+                best_move = (marbles, direction)
+                self._pv[ply] = [(marbles, direction)] + self._pv[ply + 1]
+            if alpha >= beta:
+                self._store_cutoff(marbles, direction, depth, ply)
+                break
+
+        if best >= beta:
+            bound = transposition.LOWER
+        elif best > original_alpha:
+            bound = transposition.EXACT
+        else:
+            bound = transposition.UPPER
+        self.table.store(key, depth, bound, _to_table(best, ply),
+                         abalone.encode_move(*best_move) if best_move else 0)
+
+        return best
+
+    def _quiescence(self, alpha, beta, ply, depth):
+        """Search only sumito moves until the position is quiet.
+
+        :param alpha: the lower bound of the window
+        :type alpha: int
+        :param beta: the upper bound of the window
+        :type beta: int
+        :param ply: the distance to the root
+        :type ply: int
+        :param depth: the remaining number of sumito moves to be searched
+        :type depth: int
+        :return: the score for the current player
+        :rtype: int
+        """
+
+        self.nodes = self.nodes + 1
+        if self.nodes & 1023 == 0:
+            self._check_time()
+
+        game = self.game
+        self._pv[ply] = []
+        over = _game_over(game, ply)
+        if over is not None:
+            return over
+
+        # The player may choose not to push ("stand pat").
+        best = evaluate(game)
+        if best >= beta or depth == 0:
+            return best
+        if best > alpha:
+            alpha = best
+
+        moves = game.legal_moves(sumito_only=True)
+        for marbles, direction in self._order(moves, ply):
+            record = game.move(marbles, direction, True)
+            game.toggle_player()
+            score = -self._quiescence(-beta, -alpha, ply + 1, depth - 1)
+            game.unmove(record)
+
+            if score > best:
+                best = score
+            if score > alpha:
+                alpha = score
+                self._pv[ply] = [(marbles, direction)] + self._pv[ply + 1]
+            if alpha >= beta:
+                break
+
+        return best
+
+    def _root(self, moves, depth):
+        """Search the root position.
+
+        :param moves: the ordered moves to be searched
+        :type moves: list[tuple(list[str], int)]
+        :param depth: the depth
+        :type depth: int
+        :return: the score of the best move, which is stored as the first move
+                 of the principal variation
+        :rtype: int
+        """
+
+        game = self.game
+        alpha = -WIN - 1
+        beta = WIN + 1
+        self._root_best = None
+        self._pv[0] = []
+
+        for marbles, direction in moves:
+            record = game.move(marbles, direction, True)
+            game.toggle_player()
+            score = -self._negamax(depth - 1, -beta, -alpha, 1)
+            game.unmove(record)
+
+            if score > alpha:
+                alpha = score
+                self._pv[0] = [(marbles, direction)] + self._pv[1]
+                self._root_best = (score, (marbles, direction), self._pv[0])
+
+        return alpha
+
+    def _check_time(self):
+        """Abort the search if the time is up or it has been stopped.
+
+        :raises _Abort: the search has to be aborted
+        """
+
+        if self.stopped or (self.deadline is not None and
+                            time.perf_counter() > self.deadline):
+            raise _Abort()
+        if self._cancel is not None and self._cancel.is_set():
+            raise _Abort()
+
+    def _order(self, moves, ply, best=None):
+        """Sort moves so that the most promising ones come first.
+
+        :param moves: the legal moves of the current player
+        :type moves: list[tuple(list[str], int)]
+        :param ply: the distance to the root
+        :type ply: int
+        :param best: a move to be searched first, e. g. from a previous
+                     iteration
+        :type best: tuple(list[str], int) | None
+        :return: the sorted moves
+        :rtype: list[tuple(list[str], int)]
+        """
+
+        game = self.game
+        killers = self.killers[ply]
+        history = self.history
+        best_key = (tuple(best[0]), best[1]) if best else None
+
+        keyed = []
+        for position, (marbles, direction) in enumerate(moves):
+            key = (tuple(marbles), direction)
+            if key == best_key:
+                priority = 4000000
+            else:
+                push = push_kind(game, marbles, direction)
+                if push:
+                    priority = 2000000 + push * 1000000
+                elif key == killers[0]:
+                    priority = 1500000
+                elif key == killers[1]:
+                    priority = 1400000
+                else:
+                    priority = history.get(key, 0)
+            keyed.append((-priority, position, (marbles, direction)))
+        keyed.sort()
+
+        return [move for priority, position, move in keyed]
+
+    def _store_cutoff(self, marbles, direction, depth, ply):
+        """Remember a move that caused a cutoff for move ordering.
+
+        :param marbles: the marbles of the move
+        :type marbles: list[str]
+        :param direction: the direction of the move
+        :type direction: int
+        :param depth: the remaining depth at which the cutoff occurred
+        :type depth: int
+        :param ply: the distance to the root
+        :type ply: int
+        """
+
+        key = (tuple(marbles), direction)
+        if push_kind(self.game, marbles, direction):
+            return  # pushes are searched first anyway
+        killers = self.killers[ply]
+        if killers[0] != key:
+            killers[1] = killers[0]
+            killers[0] = key
+        self.history[key] = self.history.get(key, 0) + depth * depth
+
+
+def evaluate(game):
+    """Evaluate a position statically.
+
+    The evaluation considers the scores, the distance of the marbles to the
+    centre of the board and the number of adjacent marbles of the same player.
+    If the game tracks its :class:`abalone.Features`, they are read instead
+    of scanning the board.
+
+    :param game: the game
+    :type game: abalone.Game
+    :return: the score for the current player, higher is better
+    :rtype: int
+    """
+
+    player = game.current_player
+    opponent = 2 if player == 1 else 1
+    features = game.features
+    if features is not None:
+        material = features.material
+        centre = features.centre
+        cohesion = features.cohesion
+        return ((game.score[f'p{player}'] - game.score[f'p{opponent}']) *
+                MARBLE +
+                (abalone.EDGE_DISTANCE * (material[player] -
+                                          material[opponent]) -
+                 centre[player] + centre[opponent]) * CENTRE +
+                (cohesion[player] - cohesion[opponent]) * COHESION)
+
+    cells = game.cells
+    neighbors = abalone.neighbors
+    off_board = abalone.OFF_BOARD
+
+    value = (game.score[f'p{player}'] - game.score[f'p{opponent}']) * MARBLE
+    for index, owner in enumerate(cells):
+        if owner == 0:
+            continue
+        marble_value = _centre_bonus[index] * CENTRE
+        # Count each pair of adjacent marbles once.
+        adjacent = neighbors[index]
+        for direction in [0, 1, 5]:
+            if (adjacent[direction] != off_board and
+                    cells[adjacent[direction]] == owner):
+                marble_value = marble_value + COHESION
+        if owner == player:
+            value = value + marble_value
+        else:
+            value = value - marble_value
+
+    return value
+
+
+def push_kind(game, marbles, direction):
+    """Check if a legal move pushes marbles of the opponent.
+
+    :param game: the game
+    :type game: abalone.Game
+    :param marbles: the marbles to be moved
+    :type marbles: list[str]
+    :param direction: the direction of movement
+    :type direction: int
+    :return: ``2`` if a marble is pushed off the board, ``1`` for other sumito
+             moves, ``0`` otherwise
+    :rtype: int
+    """
+
+    cells = game.cells
+    opponent = 2 if game.current_player == 1 else 1
+    for marble in marbles:
+        index = abalone.space_to_index(marble)
+        front = abalone.neighbors[index][direction - 1]
+        if front != abalone.OFF_BOARD and cells[front] == opponent:
+            while front != abalone.OFF_BOARD and cells[front] == opponent:
+                front = abalone.neighbors[front][direction - 1]
+            return 2 if front == abalone.OFF_BOARD else 1
+
+    return 0
+
+
+def _from_table(score, ply):
+    """Convert a score from the transposition table to the current search.
+
+    :param score: the score as stored by :func:`_to_table`
+    :type score: int
+    :param ply: the distance of the position to the root
+    :type ply: int
+    :return: the score relative to the root
+    :rtype: int
+    """
+
+    if score > _WIN_BOUND:
+        return score - ply
+    if score < -_WIN_BOUND:
+        return score + ply
+    return score
+
+
+def _game_over(game, ply):
+    """Score a finished game.
+
+    :param game: the game
+    :type game: abalone.Game
+    :param ply: the distance to the root
+    :type ply: int
+    :return: the score for the current player if the game is over | ``None``
+    :rtype: int | None
+    """
+
+    if game.score['p1'] > 0 and game.score['p2'] > 0:
+        return None
+    if game.score[f'p{game.current_player}'] == 0:
+        return -(WIN - ply)
+    return WIN - ply
+
+
+def _to_table(score, ply):
+    """Convert a score of the current search for the transposition table.
+
+    Wins and losses are scored by their distance to the root. The table
+    stores them by their distance to the position instead, so that they stay
+    valid when the position is reached at another ply.
+
+    :param score: the score relative to the root
+    :type score: int
+    :param ply: the distance of the position to the root
+    :type ply: int
+    :return: the score relative to the position
+    :rtype: int
+    """
+
+    if score > _WIN_BOUND:
+        return score + ply
+    if score < -_WIN_BOUND:
+        return score - ply
+    return score
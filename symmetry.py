@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2018 Scriptim
+# This code is licensed under the MIT License, see LICENSE.md
+
+"""Symmetries of the board.
+
+The hexagonal board is symmetric under 6 rotations by 60 degrees, each with
+or without a reflection. Positions are considered from the perspective of
+the player to move, like the boards passed to the players, which also makes
+them independent of the colours. Hence up to 12 positions that only differ
+by a symmetry share a canonical key, e. g. in an opening book.
+
+The 12 transforms are numbered ``0`` to ``11``: transform ``6 * r + k``
+reflects the board if ``r`` is ``1`` and then rotates it ``k`` times by 60
+degrees clockwise. Transform ``0`` is the identity.
+
+::
+
+    key, transform = symmetry.canonical(board)
+    # a move found for the canonical position ...
+    marbles, direction = symmetry.transform_move(
+        marbles, direction, symmetry.inverse(transform))
+    # ... is the same move in the original position
+"""
+
+import abalone
+import operator
+
+# number of transforms
+TRANSFORMS = 12
+
+
+def _build_tables():
+    """Compute the permutations of the spaces and directions.
+
+    The spaces are placed in axial coordinates around E5, ``x`` growing
+    eastwards (direction 2) and ``y`` growing north-westwards (direction 6).
+    A rotation by 60 degrees maps ``(x, y)`` to ``(y, y - x)`` and the
+    reflection maps it to ``(y - x, y)``.
+
+    :return: the tables ``spaces`` and ``directions``, see ``_spaces`` and
+             ``_directions``
+    :rtype: tuple(tuple[tuple[int]], tuple[tuple[int]])
+    """
+
+    coordinates = [(abalone.diagonals.index(space[1]) - 4,
+                    abalone.rows.index(space[0]) - 4)
+                   for space in abalone.spaces]
+    indices = {coordinate: index
+               for index, coordinate in enumerate(coordinates)}
+
+    spaces = []
+    directions = []
+    for transform in range(TRANSFORMS):
+        reflect, rotations = divmod(transform, 6)
+        permutation = []
+        for x, y in coordinates:
+            if reflect:
+                x, y = y - x, y
+            for _ in range(rotations):
+                x, y = y, y - x
+            permutation.append(indices[(x, y)])
+        spaces.append(tuple(permutation))
+
+        # The reflection swaps directions 1 and 6, 2 and 5 and 3 and 4, each
+        # rotation turns a direction into the next one.
+        mapped = [0]
+        for direction in range(1, 7):
+            if reflect:
+                direction = 7 - direction
+            mapped.append((direction - 1 + rotations) % 6 + 1)
+        directions.append(tuple(mapped))
+
+    return tuple(spaces), tuple(directions)
+
+
+# ``_spaces[transform][index]`` is the index the space ``index`` is moved to,
+# ``_directions[transform][direction]`` the direction ``direction`` turns into
+_spaces, _directions = _build_tables()
+
+# ``_inverses[transform]`` is the transform that undoes ``transform``
+_inverses = tuple(next(candidate for candidate in range(TRANSFORMS)
+                       if all(_spaces[candidate][_spaces[transform][index]] ==
+                              index for index in range(len(abalone.spaces))))
+                  for transform in range(TRANSFORMS))
+
+# ``_gathers[transform]`` collects the contents of the transformed board from
+# the original one
+_gathers = tuple(operator.itemgetter(*[permutation.index(index)
+                                       for index in range(len(permutation))])
+                 for permutation in _spaces)
+
+
+def canonical(board):
+    """Compute the canonical key of a position.
+
+    All positions that only differ by a symmetry have the same key.
+
+    :param board: a board as passed to the players' ``turn`` functions or a
+                  game, which is seen from the perspective of its current
+                  player
+    :type board: dict[str, int] | abalone.Game
+    :return: the key and the transform that maps the position to the
+             canonical one
+    :rtype: tuple(bytes, int)
+    """
+
+    cells = _cells(board)
+    key = None
+    best = 0
+    for transform in range(TRANSFORMS):
+        candidate = bytes(_gathers[transform](cells))
+        if key is None or candidate < key:
+            key = candidate
+            best = transform
+
+    return key, best
+
+
+def _cells(board):
+    """Encode a position from the perspective of the player to move.
+
+    :param board: see :func:`canonical`
+    :type board: dict[str, int] | abalone.Game
+    :return: one value per space, ``0`` for empty spaces, ``1`` for marbles
+             of the player to move and ``2`` for marbles of the opponent
+    :rtype: bytes
+    """
+
+    if isinstance(board, abalone.Game):
+        if board.current_player == 1:
+            return bytes(board.cells)
+        return bytes(board.cells).translate(bytes([0, 2, 1]) +
+                                            bytes(253))
+
+    return bytes(0 if board[space] == 0 else (1 if board[space] == 1 else 2)
+                 for space in abalone.spaces)
+
+
+def inverse(transform):
+    """Get the transform that undoes another one.
+
+    :param transform: the transform, from ``0`` to ``11``
+    :type transform: int
+    :return: the inverse transform
+    :rtype: int
+    """
+
+    return _inverses[transform]
+
+
+def transform_board(board, transform):
+    """Apply a transform to a board.
+
+    :param board: a board like :attr:`abalone.Game.board` or as passed to the
+                  players' ``turn`` functions
+    :type board: dict[str, int]
+    :param transform: the transform, from ``0`` to ``11``
+    :type transform: int
+    :return: the transformed board
+    :rtype: dict[str, int]
+    """
+
+    return {abalone.spaces[_spaces[transform][index]]: board[space]
+            for index, space in enumerate(abalone.spaces)}
+
+
+def transform_move(marbles, direction, transform):
+    """Apply a transform to a move.
+
+    :param marbles: the marbles to be moved
+    :type marbles: list[str]
+    :param direction: the direction of movement
+    :type direction: int
+    :param transform: the transform, from ``0`` to ``11``
+    :type transform: int
+    :return: the transformed move, with the marbles in the same order
+    :rtype: tuple(list[str], int)
+    """
+
+    return ([abalone.spaces[_spaces[transform][abalone.space_to_index(marble)]]
+             for marble in marbles], _directions[transform][direction])
@@ -0,0 +1,624 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2018 Scriptim
+# This code is licensed under the MIT License, see LICENSE.md
+
+"""Headless tournaments between AIs.
+
+The games are played by :func:`main.play_match` on a pool of worker
+processes, each of which imports the AIs once and plays many games, e. g.
+
+::
+
+    python3 tournament.py -g 100 -w 8 alphabeta.main mcts.main random.main
+    python3 tournament.py --gauntlet -g 50 alphabeta.main mcts.main random.main
+
+In a round robin every AI plays every other AI, in a gauntlet the first AI
+plays each of the others. The AIs of a pairing take turns at playing black
+(player 1), which starts the game. A game that takes more than a maximum
+number of plies is a draw.
+
+With a time control (``--move-time`` or ``--clock``) a player who exceeds
+the time loses. With ``--isolate`` the AIs run in host subprocesses of the
+workers (see :mod:`isolation`), which are stopped at the deadline, so that a
+hung AI cannot stall the tournament. Each worker keeps one host per AI for
+all of its games.
+
+At the end the results are aggregated into a table of wins, losses, draws
+and forfeits of each AI and a table of the score of each AI against each
+other AI. The output of the AIs is discarded.
+
+For each pairing the Elo difference with its confidence interval and the
+log-likelihood ratio of a sequential probability ratio test (SPRT) are
+updated as the results come in. With ``--sprt`` a pairing stops as soon as
+the test accepts either hypothesis, which usually takes far fewer games than
+the maximum, e. g.
+
+::
+
+    python3 tournament.py --sprt 0 20 -g 2000 alphabeta.main mcts.main
+"""
+
+import argparse
+import concurrent.futures
+import importlib
+import isolation
+import main
+import math
+import os
+import record
+import sys
+
+# the AI modules of a worker process, by name
+_ais = {}
+
+
+class MatchStatistics:
+    """Results of the games between two AIs, from the perspective of the
+    first one.
+
+    The Elo difference and the log-likelihood ratio follow from the numbers
+    of wins, losses and draws, so they are updated in O(1) per game.
+    """
+
+    def __init__(self):
+        """Initialize the statistics without any games.
+        """
+
+        self.wins = 0
+        self.losses = 0
+        self.draws = 0
+        # ``'H0'`` or ``'H1'`` once the SPRT has accepted a hypothesis, see
+        # :func:`sprt`
+        self.decision = None
+
+    def add(self, score):
+        """Add the result of a game.
+
+        :param score: ``1`` for a win, ``0.5`` for a draw and ``0`` for a
+                      loss of the first AI
+        :type score: float
+        """
+
+        if score == 1:
+            self.wins = self.wins + 1
+        elif score == 0:
+            self.losses = self.losses + 1
+        else:
+            self.draws = self.draws + 1
+
+    def elo(self, confidence=0.95):
+        """Estimate the Elo difference between the AIs.
+
+        :param confidence: the probability of the difference to be inside the
+                           confidence interval
+        :type confidence: float
+        :return: the difference and the bounds of its confidence interval,
+                 which are infinite if one AI has scored all points
+        :rtype: tuple(float, float, float)
+        """
+
+        games = self.games()
+        if games == 0:
+            return 0.0, -math.inf, math.inf
+        score = self.score()
+        deviation = math.sqrt(self._variance(score) / games)
+        z = _normal_quantile((1 + confidence) / 2)
+
+        return (_elo(score), _elo(score - z * deviation),
+                _elo(score + z * deviation))
+
+    def games(self):
+        """Get the number of games.
+
+        :rtype: int
+        """
+
+        return self.wins + self.losses + self.draws
+
+    def llr(self, elo0, elo1):
+        """Compute the log-likelihood ratio of two Elo differences.
+
+        The scores of the games are approximated by a normal distribution
+        with the observed variance (generalized SPRT).
+
+        :param elo0: the Elo difference of the null hypothesis
+        :type elo0: float
+        :param elo1: the Elo difference of the alternative hypothesis
+        :type elo1: float
+        :return: the log-likelihood ratio, positive values favour *elo1*
+        :rtype: float
+        """
+
+        games = self.games()
+        if games == 0:
+            return 0.0
+        score = self.score()
+        score0 = _expected_score(elo0)
+        score1 = _expected_score(elo1)
+
+        return (games * (score1 - score0) * (2 * score - score0 - score1) /
+                (2 * self._variance(score)))
+
+    def score(self):
+        """Get the average score of the first AI.
+
+        :return: the score, from ``0`` to ``1``
+        :rtype: float
+        """
+
+        return (self.wins + self.draws / 2) / self.games()
+
+    def sprt(self, elo0, elo1, alpha=0.05, beta=0.05):
+        """Run a sequential probability ratio test of two Elo differences.
+
+        The test is meant to be run after every game. Once it has accepted a
+        hypothesis, further games do not change the decision.
+
+        :param elo0: the Elo difference of the null hypothesis, e. g. ``0``
+        :type elo0: float
+        :param elo1: the Elo difference of the alternative hypothesis, e. g.
+                     ``20``
+        :type elo1: float
+        :param alpha: the probability of accepting *elo1* if *elo0* is true
+        :type alpha: float
+        :param beta: the probability of accepting *elo0* if *elo1* is true
+        :type beta: float
+        :return: ``'H0'`` if *elo0* has been accepted, ``'H1'`` if *elo1*
+                 has been accepted | ``None`` if more games are needed
+        :rtype: str | None
+        """
+
+        if self.decision is None:
+            llr = self.llr(elo0, elo1)
+            if llr >= math.log((1 - beta) / alpha):
+                self.decision = 'H1'
+            elif llr <= math.log(beta / (1 - alpha)):
+                self.decision = 'H0'
+
+        return self.decision
+
+    def _variance(self, score):
+        """Estimate the variance of the score of a game.
+
+        Half a game of each result is added to the observed games, so that
+        the variance is not zero if all games ended alike.
+
+        :param score: the average score
+        :type score: float
+        :rtype: float
+        """
+
+        return ((self.wins + 0.5) * (1 - score) ** 2 +
+                (self.losses + 0.5) * score ** 2 +
+                (self.draws + 0.5) * (0.5 - score) ** 2) / (self.games() + 1.5)
+
+
+def aggregate(results, players):
+    """Aggregate the results of games into tables.
+
+    :param results: the results returned by :func:`run`
+    :type results: iterable[dict]
+    :param players: the names of the AIs
+    :type players: list[str]
+    :return: the table of each AI, a dict mapping ``games``, ``wins``,
+             ``losses``, ``draws``, ``illegal`` (games lost by an illegal
+             move), ``exceptions`` (games lost by an exception) and
+             ``timeouts`` (games lost on time) to their numbers, and the
+             head-to-head table, mapping ``(a, b)`` to the number of wins of
+             ``a`` against ``b``
+    :rtype: tuple(dict[str, dict[str, int]], dict[tuple(str, str), int])
+    """
+
+    table = {player: {'games': 0, 'wins': 0, 'losses': 0, 'draws': 0,
+                      'illegal': 0, 'exceptions': 0, 'timeouts': 0}
+             for player in players}
+    head_to_head = {(a, b): 0 for a in players for b in players if a != b}
+
+    for result in results:
+        black, white = result['black'], result['white']
+        for player in [black, white]:
+            table[player]['games'] = table[player]['games'] + 1
+        if result['winner'] is None:
+            for player in [black, white]:
+                table[player]['draws'] = table[player]['draws'] + 1
+            continue
+
+        winner, loser = ((black, white) if result['winner'] == 1 else
+                         (white, black))
+        table[winner]['wins'] = table[winner]['wins'] + 1
+        table[loser]['losses'] = table[loser]['losses'] + 1
+        if winner != loser:
+            head_to_head[(winner, loser)] = head_to_head[(winner, loser)] + 1
+        forfeit = _forfeit(result['exitReason'])
+        if forfeit is not None:
+            table[loser][forfeit] = table[loser][forfeit] + 1
+
+    return table, head_to_head
+
+
+def _elo(score):
+    """Convert an average score to an Elo difference.
+
+    :param score: the score, from ``0`` to ``1``
+    :type score: float
+    :return: the Elo difference, infinite for a score of ``0`` or ``1``
+    :rtype: float
+    """
+
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+
+    return -400 * math.log10(1 / score - 1)
+
+
+def _expected_score(elo):
+    """Convert an Elo difference to an expected average score.
+
+    :param elo: the Elo difference
+    :type elo: float
+    :return: the score, from ``0`` to ``1``
+    :rtype: float
+    """
+
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def format_statistics(matches, sprt=None):
+    """Format the statistics of the pairings as text.
+
+    :param matches: the statistics of each pairing, see :func:`pairings`
+    :type matches: dict[tuple(str, str), MatchStatistics]
+    :param sprt: the Elo differences of the hypotheses of the SPRT |
+                 ``None`` if no test is run
+    :type sprt: tuple(float, float) | None
+    :return: one line per pairing
+    :rtype: str
+    """
+
+    lines = []
+    for (a, b), match in matches.items():
+        elo, lower, upper = match.elo()
+        line = (f'{a} vs {b}: +{match.wins} -{match.losses} ={match.draws}, '
+                f'Elo {elo:+.1f} [{lower:+.1f}, {upper:+.1f}]')
+        if sprt is not None:
+            line = line + f', LLR {match.llr(*sprt):.2f}'
+            if match.decision is not None:
+                line = line + f' ({match.decision} accepted)'
+        lines.append(line)
+
+    return '\n'.join(lines)
+
+
+def format_tables(table, head_to_head, players):
+    """Format the tables returned by :func:`aggregate` as text.
+
+    :param table: the table of each AI
+    :type table: dict[str, dict[str, int]]
+    :param head_to_head: the head-to-head table
+    :type head_to_head: dict[tuple(str, str), int]
+    :param players: the names of the AIs, in the order of the rows
+    :type players: list[str]
+    :return: the tables
+    :rtype: str
+    """
+
+    width = max(len(player) for player in players)
+    columns = ['games', 'wins', 'losses', 'draws', 'illegal', 'exceptions',
+               'timeouts']
+    lines = [' ' * width + ''.join(f'{column:>11}' for column in columns)]
+    for player in players:
+        lines.append(f'{player:<{width}}' +
+                     ''.join(f'{table[player][column]:>11}'
+                             for column in columns))
+
+    # Each cell holds the wins of the row against the column.
+    lines.append('')
+    lines.append(' ' * width + ''.join(f'{index + 1:>6}'
+                                       for index in range(len(players))))
+    for index, player in enumerate(players):
+        lines.append(f'{player:<{width}}' + ''.join(
+            f'{"-" if other == player else head_to_head[(player, other)]:>6}'
+            for other in players) + f'   ({index + 1})')
+
+    return '\n'.join(lines)
+
+
+def _forfeit(exit_reason):
+    """Find out how a game has been forfeited.
+
+    :param exit_reason: the ``exitReason`` of the course of the game
+    :type exit_reason: str | None
+    :return: ``'illegal'``, ``'exceptions'``, ``'timeouts'`` | ``None`` if
+             the game has not been forfeited
+    :rtype: str | None
+    """
+
+    if exit_reason is None:
+        return None
+    if exit_reason.endswith('illegal move'):
+        return 'illegal'
+    if exit_reason.endswith('exception'):
+        return 'exceptions'
+    if exit_reason.endswith('time limit'):
+        return 'timeouts'
+
+    return None
+
+
+def _initialize():
+    """Discard the output of the AIs in a worker process.
+    """
+
+    sys.stdout = open(os.devnull, 'w')
+
+
+def _load(name, isolate=False, memory_limit=None):
+    """Import an AI once per process.
+
+    :param name: the name of the AI's module inside ``ais``, e. g.
+                 ``alphabeta.main``
+    :type name: str
+    :param isolate: whether to run the AI in a subprocess
+    :type isolate: bool
+    :param memory_limit: the memory limit of the subprocess in bytes, see
+                         :class:`isolation.IsolatedAI`
+    :type memory_limit: int | None
+    :return: the AI
+    :rtype: module | isolation.IsolatedAI
+    """
+
+    if name not in _ais:
+        _ais[name] = (isolation.IsolatedAI(name, memory_limit) if isolate
+                      else importlib.import_module(f'ais.{name}'))
+
+    return _ais[name]
+
+
+def _normal_quantile(probability):
+    """Get a quantile of the standard normal distribution.
+
+    :param probability: the probability, between ``0`` and ``1``
+    :type probability: float
+    :return: the value below which the standard normal distribution falls
+             with the given probability
+    :rtype: float
+    """
+
+    # bisection of the cumulative distribution function, which is monotonic
+    low = -10.0
+    high = 10.0
+    for _ in range(64):
+        middle = (low + high) / 2
+        if (1 + math.erf(middle / math.sqrt(2))) / 2 < probability:
+            low = middle
+        else:
+            high = middle
+
+    return (low + high) / 2
+
+
+def _play(black, white, seed, max_plies, keep_record, time_control=None,
+          isolate=False, memory_limit=None):
+    """Play a game in a worker process.
+
+    :param black: the name of the AI that plays as player 1
+    :type black: str
+    :param white: the name of the AI that plays as player 2
+    :type white: str
+    :param seed: the seed of the game, see :func:`main.play_match`
+    :type seed: int
+    :param max_plies: the number of plies after which the game is a draw
+    :type max_plies: int
+    :param keep_record: whether to return the record of the game
+    :type keep_record: bool
+    :param time_control: see :func:`run`
+    :type time_control: clock.Clock | None
+    :param isolate: see :func:`run`
+    :type isolate: bool
+    :param memory_limit: see :func:`run`
+    :type memory_limit: int | None
+    :return: the result, see :func:`run`
+    :rtype: dict
+    """
+
+    course_of_the_game = main.play_match(
+        _load(black, isolate, memory_limit),
+        _load(white, isolate, memory_limit), seed, max_plies=max_plies,
+        time_control=time_control)
+    result = {'black': black, 'white': white, 'seed': seed,
+              'winner': course_of_the_game['winner'],
+              'exitReason': course_of_the_game['exitReason'],
+              'plies': len(course_of_the_game['moveHistory'])}
+    if keep_record:
+        result['record'] = record.from_course(course_of_the_game,
+                                              (black, white))
+
+    return result
+
+
+def pairings(players, gauntlet=False):
+    """Pair the AIs of a tournament.
+
+    :param players: the names of the AIs' modules inside ``ais``
+    :type players: list[str]
+    :param gauntlet: whether the first AI only plays each of the others
+                     rather than every AI playing every other AI
+    :type gauntlet: bool
+    :return: the pairs of AIs
+    :rtype: list[tuple(str, str)]
+    """
+
+    if gauntlet:
+        return [(players[0], other) for other in players[1:]]
+
+    return [(a, b) for index, a in enumerate(players)
+            for b in players[index + 1:]]
+
+
+def run(schedule, workers=None, seed=0, max_plies=400, keep_records=False,
+        finished=None, time_control=None, isolate=False, memory_limit=None):
+    """Play the games of a schedule on a pool of worker processes.
+
+    :param schedule: the games as returned by :func:`schedule`
+    :type schedule: list[tuple(str, str)]
+    :param workers: the number of worker processes | ``None`` for the number
+                    of CPUs
+    :type workers: int | None
+    :param seed: the seed of the first game, the following games get the
+                 following seeds
+    :type seed: int
+    :param max_plies: the number of plies after which a game is a draw
+    :type max_plies: int
+    :param keep_records: whether to return the records of the games
+    :type keep_records: bool
+    :param finished: a function that is called with the names of the AIs of
+                     each game after its result has been returned and tells
+                     whether their pairing is finished, e. g. because an SPRT
+                     has accepted a hypothesis. The games of a finished
+                     pairing that have not started yet are not played.
+    :type finished: callable | None
+    :param time_control: the time the AIs may think | ``None`` for no limit
+    :type time_control: clock.Clock | None
+    :param isolate: whether to run the AIs in subprocesses of the workers,
+                    see :class:`isolation.IsolatedAI`
+    :type isolate: bool
+    :param memory_limit: the number of bytes each isolated AI may use |
+                         ``None`` for no limit
+    :type memory_limit: int | None
+    :return: the result of each game as soon as it has finished, a dict with
+             the keys ``black`` and ``white`` (the names of the AIs),
+             ``seed``, ``winner`` (``1``, ``2`` | ``None`` for a draw),
+             ``exitReason``, ``plies`` and, if *keep_records* is set,
+             ``record``, the :class:`record.Record` of the game
+    :rtype: generator[dict]
+    """
+
+    with concurrent.futures.ProcessPoolExecutor(
+            workers or os.cpu_count() or 1,
+            initializer=_initialize) as executor:
+        futures = [executor.submit(_play, black, white, seed + game,
+                                   max_plies, keep_records, time_control,
+                                   isolate, memory_limit)
+                   for game, (black, white) in enumerate(schedule)]
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                if future.cancelled():
+                    continue
+                result = future.result()
+                yield result
+                if finished is None or not finished(result['black'],
+                                                    result['white']):
+                    continue
+                pair = {result['black'], result['white']}
+                for other, (black, white) in zip(futures, schedule):
+                    if {black, white} == pair:
+                        other.cancel()
+        finally:
+            # Games that have not started are not played if the caller stops
+            # early.
+            for future in futures:
+                future.cancel()
+
+
+def schedule(players, games, gauntlet=False):
+    """Schedule the games of a tournament.
+
+    The AIs of each pairing take turns at playing black.
+
+    :param players: the names of the AIs' modules inside ``ais``
+    :type players: list[str]
+    :param games: the number of games of each pairing
+    :type games: int
+    :param gauntlet: whether the first AI only plays each of the others
+                     rather than every AI playing every other AI
+    :type gauntlet: bool
+    :return: the AIs playing black and white in each game
+    :rtype: list[tuple(str, str)]
+    """
+
+    # Interleave the pairings, so that an interrupted tournament has played
+    # all of them about equally often.
+    return [(a, b) if game % 2 == 0 else (b, a)
+            for game in range(games) for a, b in pairings(players, gauntlet)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play a tournament of AIs')
+    parser.add_argument('players', nargs='+',
+                        help='python modules of the AIs, e. g. random.main')
+    parser.add_argument('-g', '--games', dest='games', type=int, default=10,
+                        help='number of games of each pairing')
+    parser.add_argument('--gauntlet', dest='gauntlet', action='store_true',
+                        help='let the first AI play each of the others '
+                        'instead of a round robin')
+    parser.add_argument('-w', '--workers', dest='workers', type=int,
+                        default=None,
+                        help='number of worker processes (default: the '
+                        'number of CPUs)')
+    parser.add_argument('-m', '--max-plies', dest='max_plies', type=int,
+                        default=400,
+                        help='number of plies after which a game is a draw')
+    parser.add_argument('-s', '--seed', dest='seed', type=int, default=0,
+                        help='seed of the first game')
+    parser.add_argument('-o', '--output', dest='output', default=None,
+                        help='write the records of the games to this '
+                        'archive, see record.py')
+    parser.add_argument('--sprt', dest='sprt', type=float, nargs=2,
+                        default=None, metavar=('ELO0', 'ELO1'),
+                        help='stop a pairing as soon as an SPRT accepts '
+                        'either Elo difference of the first AI')
+    parser.add_argument('--alpha', dest='alpha', type=float, default=0.05,
+                        help='false positive rate of the SPRT')
+    parser.add_argument('--beta', dest='beta', type=float, default=0.05,
+                        help='false negative rate of the SPRT')
+    main.add_time_control_args(parser)
+    args = parser.parse_args()
+
+    if len(args.players) < 2:
+        parser.error('at least two AIs are needed')
+    if len(set(args.players)) != len(args.players):
+        parser.error('the AIs must be different')
+
+    games = schedule(args.players, args.games, args.gauntlet)
+    matches = {pair: MatchStatistics()
+               for pair in pairings(args.players, args.gauntlet)}
+
+    def finished(black, white):
+        match = matches.get((black, white)) or matches[(white, black)]
+        return (args.sprt is not None and
+                match.sprt(*args.sprt, args.alpha, args.beta) is not None)
+
+    results = []
+    output = open(args.output, 'wb') if args.output else None
+    try:
+        memory_limit = (None if args.memory_limit is None else
+                        args.memory_limit * 1024 * 1024)
+        for result in run(games, args.workers, args.seed, args.max_plies,
+                          output is not None, finished,
+                          main.time_control_from_args(vars(args)),
+                          args.isolate, memory_limit):
+            if output is not None:
+                record.write(output, result.pop('record'))
+            results.append(result)
+            black, white = result['black'], result['white']
+            score = (0.5 if result['winner'] is None else
+                     (1 if result['winner'] == 1 else 0))
+            if (black, white) in matches:
+                matches[(black, white)].add(score)
+            else:
+                matches[(white, black)].add(1 - score)
+            print(f'\r{len(results)}/{len(games)} games', end='', flush=True)
+    except KeyboardInterrupt:
+        print('\nInterrupted', end='')
+    finally:
+        if output is not None:
+            output.close()
+    print()
+
+    table, head_to_head = aggregate(results, args.players)
+    print(format_tables(table, head_to_head, args.players))
+    print()
+    print(format_statistics(matches, args.sprt))
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+
+# Copyright (c) 2018 Scriptim
+# This code is licensed under the MIT License, see LICENSE.md
+
+"""Bounded-memory transposition table.
+
+The table caches search results keyed by the 64 bit Zobrist hash of a
+position (:attr:`abalone.Game.zobrist`). All entries live in one preallocated
+``array('Q')``, so the memory footprint is fixed when the table is created
+and does not grow during a match. :class:`SharedTranspositionTable` places
+the array in shared memory, so that several processes can search with one
+table.
+
+An entry takes two 64 bit words, the checksum and the packed data::
+
+    bits  0-20  best move, see :func:`abalone.encode_move` (0: none)
+    bits 21-27  depth (0 to 127)
+    bits 28-29  bound (``EXACT``, ``LOWER`` or ``UPPER``)
+    bits 30-31  generation, i. e. the search that stored the entry
+    bits 32-63  score + 2 ** 31
+
+The checksum is the key XOR the data word. An entry is only used if the
+checksum matches, hence an entry torn by two processes writing it at the same
+time is not mistaken for a valid entry but ignored like an empty one. Empty
+entries are all zero, which is no valid data word since the score is offset.
+
+The entries are grouped in buckets of two. A position is stored in the first
+entry of its bucket if it is at least as deep as the entry there or if that
+entry is from an older search ("depth-preferred"), and in the second entry
+otherwise ("always-replace").
+"""
+
+import array
+
+# bound types of the score of an entry
+EXACT = 0
+LOWER = 1  # the score is a lower bound (fail high)
+UPPER = 2  # the score is an upper bound (fail low)
+
+# size of an entry in bytes
+ENTRY_SIZE = 16
+
+_MOVE_MASK = (1 << 21) - 1
+_DEPTH_MASK = 127
+_SCORE_OFFSET = 1 << 31
+
+# number of words of the header of a shared table (buckets, workers,
+# generation and one unused word) and of the counters of each worker
+_HEADER = 4
+_COUNTERS = 4
+
+
+class TranspositionTable:
+    """Fixed-size hash table of search results.
+
+    The attributes ``hits``, ``misses``, ``collisions`` and ``stores`` count
+    the probes that found the position, the probes that did not, the stores
+    that overwrote a different position and all stores.
+    """
+
+    def __init__(self, size=16 * 1024 * 1024):
+        """Allocate the table.
+
+        :param size: the maximum memory of the entries in bytes
+        :type size: int
+        :raises ValueError: *size* is smaller than one bucket
+        """
+
+        self.buckets = size // (2 * ENTRY_SIZE)
+        if self.buckets < 1:
+            raise ValueError(f'Size {size} is smaller than one bucket')
+        self.table = array.array('Q', bytes(self.buckets * 2 * ENTRY_SIZE))
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    def clear(self):
+        """Remove all entries and reset the counters.
+        """
+
+        memoryview(self.table).cast('B')[:] = bytes(len(self.table) * 8)
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    def new_search(self):
+        """Start a new generation of entries.
+
+        Entries of older generations are replaced first, so that deep entries
+        of positions that have long left the board do not occupy the
+        depth-preferred entries forever.
+        """
+
+        self.generation = (self.generation + 1) & 3
+
+    def probe(self, key):
+        """Look up a position.
+
+        :param key: the hash of the position
+        :type key: int
+        :return: the depth, the bound, the score and the packed best move of
+                 the position | ``None`` if it is not in the table
+        :rtype: tuple(int, int, int, int) | None
+        """
+
+        table = self.table
+        slot = (key % self.buckets) * 4
+        for slot in (slot, slot + 2):
+            data = table[slot + 1]
+            if data and table[slot] ^ data == key:
+                self.hits = self.hits + 1
+                return ((data >> 21) & _DEPTH_MASK, (data >> 28) & 3,
+                        (data >> 32) - _SCORE_OFFSET, data & _MOVE_MASK)
+
+        self.misses = self.misses + 1
+        return None
+
+    def stats(self):
+        """Summarize the use of the table.
+
+        :return: a dict with the counters, the number of ``entries``, the
+                 number of ``used`` entries and the ``hit_rate`` of the probes
+        :rtype: dict
+        """
+
+        probes = self.hits + self.misses
+        return {
+            'entries': len(self.table) // 2,
+            'used': sum(1 for slot in range(1, len(self.table), 2)
+                        if self.table[slot]),
+            'hits': self.hits,
+            'misses': self.misses,
+            'collisions': self.collisions,
+            'stores': self.stores,
+            'hit_rate': self.hits / probes if probes else 0.0
+        }
+
+    def store(self, key, depth, bound, score, move=0):
+        """Store the result of a search.
+
+        :param key: the hash of the position
+        :type key: int
+        :param depth: the remaining depth the position has been searched to
+        :type depth: int
+        :param bound: ``EXACT``, ``LOWER`` or ``UPPER``
+        :type bound: int
+        :param score: the score, between ``-2 ** 31`` and ``2 ** 31``
+                      (exclusive)
+        :type score: int
+        :param move: the best move packed by :func:`abalone.encode_move` |
+                     ``0`` if there is none
+        :type move: int
+        """
+
+        table = self.table
+        slot = (key % self.buckets) * 4
+        depth = max(0, min(depth, _DEPTH_MASK))
+        data = (move | depth << 21 | bound << 28 | self.generation << 30 |
+                (score + _SCORE_OFFSET) << 32)
+
+        old = table[slot + 1]
+        old_key = table[slot] ^ old
+        if not (old_key == key or not old or
+                (old >> 30) & 3 != self.generation or
+                depth >= (old >> 21) & _DEPTH_MASK):
+            slot = slot + 2
+            old = table[slot + 1]
+            old_key = table[slot] ^ old
+
+        if old_key == key and not move:
+            # Keep the best move of a shallower search of the position.
+            data = data | (old & _MOVE_MASK)
+        if old and old_key != key:
+            self.collisions = self.collisions + 1
+        table[slot] = key ^ data
+        table[slot + 1] = data
+        self.stores = self.stores + 1
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """Transposition table in shared memory.
+
+    The process that creates the table owns the shared memory, other
+    processes attach to it with :func:`attach`. Entries are written without
+    locks, see the module documentation.
+
+    Besides the entries, the shared memory holds a header with the number of
+    buckets, the number of workers, the generation of the entries and one row
+    of counters per worker. The counters of the attached instances are local
+    until they are copied to the worker's row with :func:`publish`.
+    """
+
+    def __init__(self, size=16 * 1024 * 1024, workers=1):
+        """Allocate the table in a new block of shared memory.
+
+        :param size: the maximum memory of the entries in bytes
+        :type size: int
+        :param workers: the number of worker processes that publish counters
+        :type workers: int
+        :raises ValueError: *size* is smaller than one bucket
+        """
+
+        # Shared memory requires Python 3.8, the rest of the module does not.
+        from multiprocessing import shared_memory
+
+        buckets = size // (2 * ENTRY_SIZE)
+        if buckets < 1:
+            raise ValueError(f'Size {size} is smaller than one bucket')
+        header = _HEADER + _COUNTERS * workers
+        memory = shared_memory.SharedMemory(
+            create=True, size=(header + buckets * 4) * 8)
+        words = memory.buf.cast('Q')
+        words[0] = buckets
+        words[1] = workers
+        words.release()
+        self._attach(memory, None, True)
+
+    def _attach(self, memory, worker, owner):
+        """Set up the instance on a block of shared memory.
+
+        :param memory: the shared memory, with the header already written
+        :type memory: multiprocessing.shared_memory.SharedMemory
+        :param worker: the index of the worker | ``None``
+        :type worker: int | None
+        :param owner: whether the instance frees the shared memory on
+                      :func:`close`
+        :type owner: bool
+        """
+
+        self.memory = memory
+        self.name = memory.name
+        self.worker = worker
+        self.owner = owner
+
+        words = memory.buf.cast('Q')
+        self.buckets = words[0]
+        header = _HEADER + _COUNTERS * words[1]
+        self._header = words[:header]
+        self.table = words[header:header + self.buckets * 4]
+        self._words = words
+        self.generation = words[2]
+
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    def close(self):
+        """Detach from the shared memory and free it if this instance owns
+        it.
+        """
+
+        self._header.release()
+        self.table.release()
+        self._words.release()
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+    def new_search(self):
+        """Adopt the generation of the shared table.
+
+        All processes searching with the table have to use the same
+        generation, hence only the owner starts a new one, see
+        :func:`next_generation`.
+        """
+
+        self.generation = self._header[2]
+
+    def next_generation(self):
+        """Start a new generation of entries for all processes.
+
+        .. seealso:: :func:`TranspositionTable.new_search`
+        """
+
+        self._header[2] = (self._header[2] + 1) & 3
+        self.generation = self._header[2]
+
+    def publish(self):
+        """Copy the counters of this instance to the row of its worker.
+        """
+
+        if self.worker is None:
+            return
+        row = _HEADER + _COUNTERS * self.worker
+        self._header[row:row + _COUNTERS] = array.array(
+            'Q', [self.hits, self.misses, self.collisions, self.stores])
+
+    def stats(self):
+        """Summarize the use of the table by all workers.
+
+        :return: a dict like the one returned by
+                 :func:`TranspositionTable.stats` with the counters summed
+                 over the published counters of all workers, and the key
+                 ``workers``, a list of the counters and the ``hit_rate`` of
+                 each worker
+        :rtype: dict
+        """
+
+        workers = []
+        for worker in range(self._header[1]):
+            row = _HEADER + _COUNTERS * worker
+            hits, misses, collisions, stores = self._header[
+                row:row + _COUNTERS]
+            probes = hits + misses
+            workers.append({'hits': hits, 'misses': misses,
+                            'collisions': collisions, 'stores': stores,
+                            'hit_rate': hits / probes if probes else 0.0})
+
+        hits = sum(worker['hits'] for worker in workers)
+        misses = sum(worker['misses'] for worker in workers)
+        return {
+            'entries': len(self.table) // 2,
+            'used': sum(1 for slot in range(1, len(self.table), 2)
+                        if self.table[slot]),
+            'hits': hits,
+            'misses': misses,
+            'collisions': sum(worker['collisions'] for worker in workers),
+            'stores': sum(worker['stores'] for worker in workers),
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'workers': workers
+        }
+
+
+def attach(name, worker=None):
+    """Attach to a :class:`SharedTranspositionTable` created by another
+    process.
+
+    The process has to be a child process of the owner of the table, e. g. a
+    worker of a process pool.
+
+    :param name: the name of the shared memory, i. e. the attribute ``name``
+                 of the table
+    :type name: str
+    :param worker: the index of the worker, which determines the row its
+                   counters are published to | ``None`` to not publish
+    :type worker: int | None
+    :return: the table
+    :rtype: SharedTranspositionTable
+    """
+
+    from multiprocessing import shared_memory
+
+    try:
+        memory = shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching registers the memory with the resource
+        # tracker as well. Child processes share the tracker of their parent,
+        # which forgets the memory again when the owner frees it.
+        memory = shared_memory.SharedMemory(name)
+
+    table = SharedTranspositionTable.__new__(SharedTranspositionTable)
+    table._attach(memory, worker, False)
+
+    return table